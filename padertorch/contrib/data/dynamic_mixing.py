@@ -0,0 +1,433 @@
+"""
+On-the-fly (dynamic) mixing of source utterances for source separation
+training. Reading precomputed mixtures (e.g. wsj0-2mix) reads each sample
+twice (mixture and sources) and fixes the set of mixtures. The
+`DynamicMixer` draws new source combinations, gains and offsets in each
+epoch, reads only the regions of the source files that end up in the
+mixture and sums them.
+
+The planning (which utterances, which regions, which gains) only uses the
+metadata and is cheap, the reading and mixing is done in the (prefetch)
+workers:
+
+    sources = get_source_dataset(db.get_dataset('mix_2_spk_min_tr'))
+    mixer = DynamicMixer(sources, num_speakers=2, length=32000)
+    dataset = mixer.get_dataset()  # New mixtures in each iteration
+    dataset = dataset.map(mixer).prefetch(8, 16)
+    dataset = dataset.batch(4).map(pt.data.utils.collate_fn)
+
+The examples contain `y`, `s` and `num_samples` like the examples of the
+source separation recipes, so the models can be trained without changes.
+With `mixer.read` instead of `mixer`, the workers only read the unscaled
+sources and `mixer.mix` can be applied to the batch (numpy or torch, e.g.
+on the GPU).
+
+Compare the throughput with reading the precomputed mixtures:
+
+    python -m padertorch.contrib.data.dynamic_mixing benchmark \\
+        --json_path wsj0_2mix_8k.json --dataset_name mix_2_spk_min_tr
+"""
+import functools
+import time
+
+import numpy as np
+import lazy_dataset
+import paderbox as pb
+
+__all__ = [
+    'DynamicMixer',
+    'get_source_dataset',
+]
+
+
+def get_source_dataset(mixtures, audio_key='speech_source'):
+    """
+    Extracts the unique source utterances from a dataset of precomputed
+    mixtures, e.g. wsj0-2mix, where the source files have the length of the
+    mixture.
+
+    >>> mixtures = [
+    ...     {'example_id': 'a_b', 'num_samples': 100, 'speaker_id': ['x', 'y'],
+    ...      'audio_path': {'speech_source': ['a.wav', 'b.wav']}},
+    ...     {'example_id': 'a_c', 'num_samples': 100, 'speaker_id': ['x', 'z'],
+    ...      'audio_path': {'speech_source': ['a.wav', 'c.wav']}},
+    ... ]
+    >>> for example in get_source_dataset(mixtures):
+    ...     print(example)
+    {'example_id': 'a.wav', 'audio_path': 'a.wav', 'num_samples': 100, 'speaker_id': 'x'}
+    {'example_id': 'b.wav', 'audio_path': 'b.wav', 'num_samples': 100, 'speaker_id': 'y'}
+    {'example_id': 'c.wav', 'audio_path': 'c.wav', 'num_samples': 100, 'speaker_id': 'z'}
+
+    Args:
+        mixtures: Iterable of mixture examples with the source paths at
+            `example['audio_path'][audio_key]`.
+        audio_key: Key of the source paths.
+
+    Returns:
+        `lazy_dataset.Dataset` of source examples with `audio_path`,
+        `num_samples` and `speaker_id` (if available).
+    """
+    sources = {}
+    for mixture in mixtures:
+        num_samples = mixture['num_samples']
+        if isinstance(num_samples, dict):
+            num_samples = num_samples['observation']
+        for k, path in enumerate(mixture['audio_path'][audio_key]):
+            source = {
+                'example_id': path,
+                'audio_path': path,
+                'num_samples': num_samples,
+            }
+            if 'speaker_id' in mixture:
+                source['speaker_id'] = mixture['speaker_id'][k]
+            sources.setdefault(path, source)
+    return lazy_dataset.new(sources)
+
+
+class _EpochDataset(lazy_dataset.Dataset):
+    """Yields the planned mixtures of a new epoch in each iteration."""
+    def __init__(self, mixer, start_epoch=0):
+        self.mixer = mixer
+        self.epoch = start_epoch
+
+    def copy(self, freeze=False):
+        if freeze:
+            return self.mixer.get_dataset(self.epoch)
+        return self.__class__(self.mixer, self.epoch)
+
+    @property
+    def indexable(self):
+        return False
+
+    @property
+    def ordered(self) -> bool:
+        return False
+
+    def __len__(self):
+        return len(self.mixer)
+
+    def __iter__(self, with_key=False):
+        if with_key:
+            raise lazy_dataset.core.ItemsNotDefined(self.__class__.__name__)
+        epoch = self.epoch
+        self.epoch += 1
+        for index in range(len(self)):
+            yield self.mixer.plan(epoch, index)
+
+
+class DynamicMixer:
+    """
+    Creates mixtures from randomly drawn source utterances. See the module
+    docstring.
+
+    Each mixture is planned with a random number generator that is seeded
+    with `(seed, epoch, index)`, i.e. the mixtures are reproducible and
+    independent of the order in which they are read.
+
+    For each source, a region of `length` samples is cropped at a random
+    position. Shorter sources are read completely and placed at a random
+    offset in the mixture, the remaining samples are zero. When `length` is
+    None, the mixture has the length of the shortest (`mode='min'`) or the
+    longest (`mode='max'`) source.
+
+    >>> sources = [
+    ...     {'example_id': str(i), 'audio_path': f'{i}.wav',
+    ...      'num_samples': 1000 * (i + 1), 'speaker_id': f'spk{i % 3}'}
+    ...     for i in range(6)
+    ... ]
+    >>> mixer = DynamicMixer(sources, num_speakers=2, length=1500)
+    >>> len(mixer)
+    6
+    >>> plan = mixer.plan(epoch=0, index=0)
+    >>> plan['example_id'], plan['num_samples']
+    ('5_3', 1500)
+    >>> for source in plan['sources']:
+    ...     print(source['audio_path'], source['start'], source['stop'], source['offset'])
+    5.wav 2300 3800 0
+    3.wav 674 2174 0
+    >>> mixer.plan(epoch=0, index=1)['sources'][1]
+    {'audio_path': '0.wav', 'start': 0, 'stop': 1000, 'offset': 384}
+    >>> plan == mixer.plan(epoch=0, index=0), plan == mixer.plan(epoch=1, index=0)
+    (True, False)
+
+    Args:
+        sources: Indexable dataset or list of source examples with a single
+            channel audio file at `audio_path` and its length at
+            `num_samples` (see `get_source_dataset`).
+        num_speakers: Number of sources in a mixture.
+        length: Length of the mixtures in samples. None for the length of
+            the sources, see `mode`.
+        mode: 'min' or 'max', the length of the mixture when `length` is
+            None.
+        max_log_weight: Maximum difference of the source gains in dB. The
+            gains are drawn uniformly from `[-max_log_weight / 2,
+            max_log_weight / 2]` and centred.
+        normalize: Whether to normalize each source region to unit power
+            before applying the gain.
+        distinct_speakers: Whether the sources of a mixture must be from
+            different speakers (at `speaker_key`).
+        num_mixtures: Number of mixtures per epoch, defaults to the number
+            of sources.
+        seed: Seed of the mixtures.
+        load_audio: Function with the signature of `paderbox.io.load_audio`
+            to read a region of a file, e.g. a wrapper around
+            `padertorch.contrib.data.packed_audio.PackedAudioReader.read`.
+        speaker_key: Key of the speaker id in the source examples.
+    """
+    def __init__(
+            self,
+            sources,
+            num_speakers=2,
+            length=None,
+            mode='min',
+            max_log_weight=5.,
+            normalize=True,
+            distinct_speakers=True,
+            num_mixtures=None,
+            seed=0,
+            load_audio=pb.io.load_audio,
+            speaker_key='speaker_id',
+    ):
+        assert mode in ['min', 'max'], mode
+        assert length is None or length > 0, length
+        self.sources = sources
+        self.num_speakers = num_speakers
+        self.length = length
+        self.mode = mode
+        self.max_log_weight = max_log_weight
+        self.normalize = normalize
+        self.num_mixtures = num_mixtures
+        self.seed = seed
+        self.load_audio = load_audio
+        self.speaker_key = speaker_key
+
+        # Only the metadata that is needed for the planning
+        self._num_samples = np.array([s['num_samples'] for s in sources])
+        # Each mixture draws distinct sources
+        assert len(sources) >= num_speakers, (
+            f'Need at least {num_speakers} sources to mix, '
+            f'got {len(sources)}.'
+        )
+        if distinct_speakers:
+            speaker_ids = [s[self.speaker_key] for s in sources]
+            _, self._speakers = np.unique(speaker_ids, return_inverse=True)
+            assert self._speakers.max() + 1 >= num_speakers, (
+                f'Need at least {num_speakers} speakers to mix distinct '
+                f'speakers, got {self._speakers.max() + 1}.'
+            )
+        else:
+            self._speakers = None
+
+    def __len__(self):
+        if self.num_mixtures is None:
+            return len(self._num_samples)
+        return self.num_mixtures
+
+    def _draw_sources(self, rng):
+        indices = []
+        speakers = set()
+        while len(indices) < self.num_speakers:
+            index = int(rng.integers(len(self._num_samples)))
+            if self._speakers is None:
+                if index in indices:
+                    continue
+            else:
+                if self._speakers[index] in speakers:
+                    continue
+                speakers.add(self._speakers[index])
+            indices.append(index)
+        return indices
+
+    def plan(self, epoch, index):
+        """
+        Plans mixture `index` of `epoch` from the metadata of the sources.
+
+        Returns:
+            dict with the `example_id`, the `num_samples` of the mixture,
+            the `log_weights` of the sources and for each source the
+            region `start:stop` of the file that is placed at `offset` in
+            the mixture.
+        """
+        rng = np.random.default_rng([self.seed, epoch, index])
+        indices = self._draw_sources(rng)
+        num_samples = self._num_samples[indices]
+        if self.length is not None:
+            length = self.length
+        elif self.mode == 'min':
+            length = int(num_samples.min())
+        else:
+            length = int(num_samples.max())
+
+        sources = []
+        for i, n in zip(indices, num_samples):
+            n = int(n)
+            if n >= length:
+                start = int(rng.integers(n - length + 1))
+                stop, offset = start + length, 0
+            else:
+                start, stop = 0, n
+                offset = int(rng.integers(length - n + 1))
+            sources.append({
+                'audio_path': self.sources[i]['audio_path'],
+                'start': start, 'stop': stop, 'offset': offset,
+            })
+
+        log_weights = rng.uniform(
+            -self.max_log_weight / 2, self.max_log_weight / 2,
+            size=self.num_speakers,
+        )
+        log_weights = log_weights - log_weights.mean()
+
+        plan = {
+            'example_id': '_'.join(
+                [str(self.sources[i]['example_id']) for i in indices]),
+            'num_samples': length,
+            'log_weights': log_weights.tolist(),
+            'sources': sources,
+        }
+        if self._speakers is not None:
+            plan['speaker_id'] = [
+                self.sources[i][self.speaker_key] for i in indices]
+        return plan
+
+    def get_dataset(self, epoch=None, start_epoch=0):
+        """
+        Returns a dataset of planned mixtures, that have to be read with
+        `self` or `self.read`.
+
+        Args:
+            epoch: If given, an indexable dataset with the mixtures of this
+                epoch. Otherwise, a dataset that yields the mixtures of the
+                next epoch in each iteration, starting with `start_epoch`
+                (e.g. the epoch of a resumed training).
+        """
+        if epoch is None:
+            return _EpochDataset(self, start_epoch)
+        return lazy_dataset.new(list(range(len(self)))).map(
+            functools.partial(self.plan, epoch))
+
+    def read(self, example):
+        """
+        Reads the regions of the sources of a planned mixture and places
+        them at their offsets. The sources are not scaled.
+
+        Returns:
+            The planned example without `sources` and with the unscaled
+            `s` (`num_speakers x num_samples`) in float32.
+        """
+        example = example.copy()
+        sources = example.pop('sources')
+        s = np.zeros((len(sources), example['num_samples']), np.float32)
+        for k, source in enumerate(sources):
+            data = self.load_audio(
+                source['audio_path'], start=source['start'],
+                stop=source['stop'],
+            )
+            assert data.ndim == 1, (data.shape, source)
+            offset = source['offset']
+            s[k, offset:offset + data.shape[-1]] = data
+        if self.normalize:
+            power = np.mean(s ** 2, axis=-1, keepdims=True)
+            s /= np.sqrt(np.maximum(power, 1e-10))
+        example['s'] = s
+        return example
+
+    @staticmethod
+    def mix(example):
+        """
+        Scales the sources `s` with `log_weights` and sums them to the
+        mixture `y`. Works for single examples and for batches (leading
+        batch axis) of numpy arrays or torch tensors.
+
+        >>> DynamicMixer.mix({'s': np.ones((2, 3)), 'log_weights': [20, 0]})
+        {'s': array([[10., 10., 10.],
+               [ 1.,  1.,  1.]]), 'log_weights': [20, 0], 'y': array([11., 11., 11.])}
+        """
+        s = example['s']
+        log_weights = example['log_weights']
+        if isinstance(s, np.ndarray):
+            log_weights = np.asarray(log_weights, dtype=s.dtype)
+        elif not hasattr(log_weights, 'device'):
+            import torch
+            log_weights = torch.tensor(
+                log_weights, dtype=s.dtype, device=s.device)
+        else:
+            log_weights = log_weights.to(s.dtype)
+        s = s * 10 ** (log_weights[..., None] / 20)
+        example = dict(example)
+        example['s'] = s
+        example['y'] = s.sum(-2)
+        return example
+
+    def __call__(self, example):
+        """Reads and mixes a planned mixture."""
+        return self.mix(self.read(example))
+
+
+def benchmark(json_path, dataset_name, length=32000, num_examples=200,
+              seed=0):
+    """
+    Compares the throughput of reading the precomputed mixtures and their
+    sources (as in the tasnet recipe) with dynamic mixing of the sources.
+
+    Returns:
+        dict with the throughput in mixtures per second.
+    """
+    from lazy_dataset.database import JsonDatabase
+    from padertorch.data.segment import Segmenter
+    dataset = JsonDatabase(json_path).get_dataset(dataset_name)
+    dataset = dataset.shuffle(rng=np.random.RandomState(seed))[:num_examples]
+
+    segmenter = Segmenter(length, anchor='random')
+
+    def read_mixture(example):
+        examples = []
+        for example in segmenter.plan(example):
+            start = example['audio_start_samples']
+            stop = example['audio_stop_samples']
+            paths = example['audio_path']
+            examples.append({
+                's': np.array([
+                    pb.io.load_audio(p, start=start, stop=stop)
+                    for p in paths['speech_source']
+                ], np.float32),
+                'y': pb.io.load_audio(
+                    paths['observation'], start=start, stop=stop,
+                ).astype(np.float32),
+            })
+        return examples
+
+    sources = get_source_dataset(dataset)
+    mixer = DynamicMixer(
+        sources, num_speakers=len(dataset[0]['audio_path']['speech_source']),
+        length=length, num_mixtures=num_examples, seed=seed,
+    )
+
+    results = {}
+    for name, examples in [
+        ('premixed', dataset.map(read_mixture).catch().unbatch()),
+        ('dynamic', mixer.get_dataset(0).map(mixer)),
+    ]:
+        num_mixtures = 0
+        t = time.perf_counter()
+        for _ in examples:
+            num_mixtures += 1
+        results[name] = num_mixtures / (time.perf_counter() - t)
+    return results
+
+
+def benchmark_command(json_path, dataset_name, length=32000,
+                      num_examples=200):
+    """
+    Compares the throughput of precomputed and dynamic mixtures. Run it with
+    a cold page cache for meaningful numbers on a shared filesystem.
+    """
+    results = benchmark(json_path, dataset_name, length, num_examples)
+    for name, mixtures_per_second in results.items():
+        print(f'{name:>10}: {mixtures_per_second:.1f} mixtures/s')
+    print(f'Speedup: {results["dynamic"] / results["premixed"]:.1f}x')
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire({'benchmark': benchmark_command})
@@ -0,0 +1,330 @@
+"""
+Packs many small audio files into a few large shard files with an index for
+random access. On shared filesystems, the metadata and inode traffic of
+millions of small files (e.g. wsj0-2mix, LibriSpeech, AudioSet) can limit
+the throughput more than the decoding.
+
+Two formats are supported:
+ - 'pcm': The samples are stored as raw PCM and read with `np.memmap`.
+   Reading a sub-range (`start`/`stop`) only touches the requested samples.
+   The PCM subtypes are stored as `int16` (8 and 16 bit) or `int32` (24 and
+   32 bit) and `DOUBLE` as `float64`, i.e. without loss. All other subtypes
+   (e.g. `FLOAT` or compressed formats) are stored as `float32`.
+ - 'encoded': The original file content (e.g. FLAC) is stored and decoded
+   with `soundfile` from memory. This keeps the compression.
+
+Pack the audio files of a database JSON:
+
+    python -m padertorch.contrib.data.packed_audio pack \\
+        --json_path wsj0_2mix_8k.json --output_dir /path/to/packed
+
+Use the packed audio in `padertorch.contrib.je.data.transforms.AudioReader`
+with `AudioReader(..., packed_audio='/path/to/packed/index.json')`. The
+original paths in the database JSON stay valid, they are looked up in the
+index.
+
+Compare the throughput with per-file reads:
+
+    python -m padertorch.contrib.data.packed_audio benchmark \\
+        --index_path /path/to/packed/index.json --segment_length 32000
+"""
+import collections
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import soundfile
+from tqdm import tqdm
+
+_SUBTYPE_DTYPES = {
+    'PCM_S8': np.int16, 'PCM_U8': np.int16, 'PCM_16': np.int16,
+    'PCM_24': np.int32, 'PCM_32': np.int32,
+    'DOUBLE': np.float64,
+}
+
+
+def _find_audio_paths(obj):
+    """
+    >>> _find_audio_paths({'observation': 'a.wav', 'speech_source': ['b.wav', 'c.flac']})
+    ['a.wav', 'b.wav', 'c.flac']
+    """
+    if isinstance(obj, dict):
+        return [p for v in obj.values() for p in _find_audio_paths(v)]
+    elif isinstance(obj, (list, tuple)):
+        return [p for v in obj for p in _find_audio_paths(v)]
+    elif isinstance(obj, (str, Path)):
+        return [str(obj)]
+    else:
+        raise TypeError(type(obj), obj)
+
+
+class PackedAudioWriter:
+    """
+    Writes audio files into shard files and creates the index
+    `<output_dir>/index.json` on `close`.
+
+    Args:
+        output_dir: Directory for the shards and the index.
+        format: 'pcm' or 'encoded', see the module docstring.
+        shard_size: A new shard is started, when a shard exceeds this size
+            in bytes.
+        alignment: Alignment of the entries in bytes.
+    """
+    def __init__(
+            self, output_dir, format='pcm', shard_size=2 ** 31, alignment=64,
+    ):
+        assert format in ['pcm', 'encoded'], format
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.shard_size = shard_size
+        self.alignment = alignment
+        self.shards = []
+        self.entries = {}
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get_fd(self):
+        if self._fd is None or self._fd.tell() >= self.shard_size:
+            if self._fd is not None:
+                self._fd.close()
+            name = f'shard-{len(self.shards):05d}.{self.format}'
+            self.shards.append(name)
+            self._fd = open(self.output_dir / name, 'wb')
+        return self._fd
+
+    def _read(self, path):
+        if self.format == 'pcm':
+            info = soundfile.info(path)
+            dtype = _SUBTYPE_DTYPES.get(info.subtype, np.float32)
+            data, sample_rate = soundfile.read(
+                path, dtype=np.dtype(dtype).name, always_2d=True)
+            return {
+                'num_frames': data.shape[0], 'channels': data.shape[1],
+                'sample_rate': sample_rate, 'dtype': np.dtype(dtype).str,
+            }, memoryview(np.ascontiguousarray(data)).cast('B')
+        else:
+            info = soundfile.info(path)
+            return {
+                'num_frames': info.frames, 'channels': info.channels,
+                'sample_rate': info.samplerate,
+            }, Path(path).read_bytes()
+
+    def _write(self, path, entry, data):
+        fd = self._get_fd()
+        padding = -fd.tell() % self.alignment
+        fd.write(b'\0' * padding)
+        entry.update(
+            shard=len(self.shards) - 1, offset=fd.tell(), nbytes=len(data))
+        fd.write(data)
+        self.entries[str(path)] = entry
+
+    def add(self, path):
+        """Adds the audio file at `path`."""
+        if str(path) not in self.entries:
+            self._write(path, *self._read(path))
+
+    def add_all(self, paths, num_workers=8):
+        """
+        Adds the audio files at `paths`. The files are read in threads. At
+        most `2 * num_workers` files are read ahead of the writer, so the
+        memory stays bounded.
+        """
+        paths = list(dict.fromkeys(
+            str(p) for p in paths if str(p) not in self.entries))
+        with ThreadPoolExecutor(num_workers) as pool:
+            pending = collections.deque()
+            for path in tqdm(paths):
+                pending.append((path, pool.submit(self._read, path)))
+                if len(pending) >= 2 * num_workers:
+                    path, future = pending.popleft()
+                    self._write(path, *future.result())
+            while pending:
+                path, future = pending.popleft()
+                self._write(path, *future.result())
+
+    def close(self):
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        index = {
+            'format': self.format,
+            'shards': self.shards,
+            'entries': self.entries,
+        }
+        tmp_path = self.output_dir / 'index.json.tmp'
+        tmp_path.write_text(json.dumps(index))
+        tmp_path.replace(self.output_dir / 'index.json')
+
+
+class PackedAudioReader:
+    """
+    Random access reader for the audio files that are packed with
+    `PackedAudioWriter`. The interface of `read` follows `soundfile.read`.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp_dir:
+    ...     path = str(Path(tmp_dir) / 'a.wav')
+    ...     soundfile.write(path, np.arange(10) / 8, 8000, subtype='PCM_16')
+    ...     with PackedAudioWriter(tmp_dir) as writer:
+    ...         writer.add(path)
+    ...     reader = PackedAudioReader(Path(tmp_dir) / 'index.json')
+    ...     data, sample_rate = reader.read(path, start=2, stop=5)
+    >>> data, sample_rate
+    (array([0.25 , 0.375, 0.5  ]), 8000)
+    """
+    def __init__(self, index_path):
+        self.index_path = Path(index_path)
+        index = json.loads(self.index_path.read_text())
+        self.format = index['format']
+        self.shards = [self.index_path.parent / s for s in index['shards']]
+        self.entries = index['entries']
+        self._memmaps = {}
+
+    def __getstate__(self):
+        # Do not pickle the memmaps, they would be copied into memory
+        state = self.__dict__.copy()
+        state['_memmaps'] = {}
+        return state
+
+    def __contains__(self, path):
+        return str(path) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _get_memmap(self, shard):
+        if shard not in self._memmaps:
+            self._memmaps[shard] = np.memmap(
+                self.shards[shard], dtype=np.uint8, mode='r')
+        return self._memmaps[shard]
+
+    def read(
+            self, path, start=0, stop=None, dtype='float64', always_2d=False
+    ):
+        """
+        Reads the frames `start:stop` of the audio file at `path`.
+
+        Returns:
+            Tuple of the audio data with shape (frames, channels), or
+            (frames,) for mono files and `always_2d=False`, and the sample
+            rate.
+        """
+        entry = self.entries[str(path)]
+        memmap = self._get_memmap(entry['shard'])
+        offset, nbytes = entry['offset'], entry['nbytes']
+        if self.format == 'pcm':
+            data = np.ndarray(
+                (entry['num_frames'], entry['channels']),
+                dtype=entry['dtype'], buffer=memmap, offset=offset,
+            )[start:stop]
+            if data.dtype != np.dtype(dtype):
+                if np.issubdtype(data.dtype, np.integer) \
+                        and np.issubdtype(np.dtype(dtype), np.floating):
+                    # Same scaling as soundfile
+                    data = data.astype(dtype) / -np.iinfo(data.dtype).min
+                else:
+                    data = data.astype(dtype)
+        else:
+            data, _ = soundfile.read(
+                io.BytesIO(memmap[offset:offset + nbytes]),
+                start=start, stop=stop, dtype=dtype, always_2d=True
+            )
+        if not always_2d and data.shape[1] == 1:
+            data = data[:, 0]
+        return data, entry['sample_rate']
+
+
+def _read_per_file(path, start, stop):
+    return soundfile.read(path, start=start, stop=stop, always_2d=True)[0]
+
+
+def benchmark(index_path, segment_length=None, num_reads=1000, seed=0):
+    """
+    Compares the read throughput of `PackedAudioReader` with per-file
+    `soundfile.read` calls for random files (and random segments of
+    `segment_length` frames).
+
+    Returns:
+        dict with the throughput in frames per second.
+    """
+    reader = PackedAudioReader(index_path)
+    rng = np.random.RandomState(seed)
+    paths = list(reader.entries.keys())
+    reads = []
+    for path in rng.choice(paths, size=num_reads):
+        num_frames = reader.entries[path]['num_frames']
+        if segment_length is None or segment_length >= num_frames:
+            reads.append((path, 0, None))
+        else:
+            start = rng.randint(0, num_frames - segment_length + 1)
+            reads.append((path, start, start + segment_length))
+
+    results = {}
+    for name, read in [
+        ('per_file', _read_per_file),
+        ('packed', lambda *args: reader.read(*args, always_2d=True)[0]),
+    ]:
+        num_frames = 0
+        t = time.perf_counter()
+        for path, start, stop in reads:
+            num_frames += read(path, start, stop).shape[0]
+        results[name] = num_frames / (time.perf_counter() - t)
+    return results
+
+
+def pack_database(
+        json_path, output_dir, dataset_names=None, format='pcm',
+        shard_size=2 ** 31, num_workers=8,
+):
+    """
+    Packs all audio files in the `audio_path` entries of a database JSON.
+
+    Args:
+        json_path: Path to the database JSON.
+        output_dir: Output directory for the shards and the index.
+        dataset_names: Datasets in the JSON to pack. Defaults to all
+            datasets.
+        format: 'pcm' (raw samples for memmap access) or 'encoded'
+            (original files).
+        shard_size: Size of a shard in bytes.
+        num_workers: Number of threads to read the files.
+    """
+    from lazy_dataset.database import JsonDatabase
+    db = JsonDatabase(json_path)
+    if dataset_names is None:
+        dataset_names = db.dataset_names
+    elif isinstance(dataset_names, str):
+        dataset_names = [dataset_names]
+    paths = []
+    for dataset_name in dataset_names:
+        for example in db.get_dataset(dataset_name):
+            paths.extend(_find_audio_paths(example['audio_path']))
+    with PackedAudioWriter(output_dir, format, shard_size) as writer:
+        writer.add_all(paths, num_workers=num_workers)
+    print(f'Packed {len(writer.entries)} files into '
+          f'{len(writer.shards)} shards in {output_dir}')
+
+
+def benchmark_command(index_path, segment_length=None, num_reads=1000):
+    """
+    Compares the throughput of packed and per-file reads. Run it with a cold
+    page cache for meaningful numbers on a shared filesystem.
+    """
+    results = benchmark(index_path, segment_length, num_reads)
+    for name, frames_per_second in results.items():
+        print(f'{name:>10}: {frames_per_second:.3e} frames/s')
+    print(f'Speedup: {results["packed"] / results["per_file"]:.1f}x')
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire({'pack': pack_database, 'benchmark': benchmark_command})
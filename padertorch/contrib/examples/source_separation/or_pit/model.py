@@ -1,3 +1,5 @@
+from functools import partial
+
 import torch
 from torch.nn import functional as F
 from einops import rearrange
@@ -22,14 +24,10 @@ def one_and_rest_permutation_invariant_loss(
     function returns the loss for the target assignment that yields the minimal
      loss.
 
-    TODO: Make this function support a batch dimension and parallelize over
-    this dimension
-
     .. note::
 
-        This function does not support a batch dimension or sequence lengths
-        (yet)! But this is not a problem when training on a chunk level (with
-        constant lengths), like it is done for TasNet or OR-PIT.
+        This function does not support a batch dimension or sequence lengths.
+        Use `batched_one_and_rest_permutation_invariant_loss` for batches.
 
     Args:
         inputs (2x...): The estimated inputs. This are always exactly two
@@ -98,6 +96,88 @@ def one_and_rest_permutation_invariant_loss(
     return loss, perm
 
 
+def batched_one_and_rest_permutation_invariant_loss(
+        inputs: torch.Tensor,
+        targets: torch.Tensor,
+        num_targets: torch.Tensor,
+        loss_fn,
+        fill_missing_with_zeros: bool = False,
+        sequence_lengths: Optional[torch.Tensor] = None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Batched version of `one_and_rest_permutation_invariant_loss`. The losses
+    of all candidates of all examples are computed with two calls of
+    `loss_fn`, where the sums of the remaining targets are obtained by
+    subtracting each target from the sum of all targets.
+
+    Args:
+        inputs (Bx2xT): The estimated inputs, one for the single target and one
+            for the sum of the remaining targets.
+        targets (BxK_maxxT): The targets, padded along the target axis. The
+            padded targets are ignored.
+        num_targets (B): The number of targets of each example.
+        loss_fn: The callable loss function. It is called with two tensors of
+            shape BxK_maxxT and must reduce only the last axis, e.g.
+            `functools.partial(pt.log_mse_loss, reduction=None)`. If
+            `sequence_lengths` is given, it is forwarded as keyword argument.
+        fill_missing_with_zeros: See `one_and_rest_permutation_invariant_loss`.
+        sequence_lengths (B): The number of valid samples of each example.
+
+    Returns:
+        A tuple of the loss (B) and the index of the matched first target (B)
+        of each example.
+
+    >>> import functools
+    >>> targets = torch.tensor([[[1., 2, 3], [4, 5, 6], [0, 1, 0]]] * 2)
+    >>> inputs = torch.stack([targets[:, 1], targets[:, 0] + targets[:, 2]], dim=1)
+    >>> loss_fn = functools.partial(pt.ops.losses.mse_loss, reduction=None)
+    >>> batched_one_and_rest_permutation_invariant_loss(
+    ...     inputs, targets, torch.tensor([3, 2]), loss_fn)
+    (tensor([0.0000, 0.3333]), tensor([1, 1]))
+    """
+    assert inputs.shape[1] == 2, inputs.shape
+    B, K_max = targets.shape[:2]
+    num_targets = torch.as_tensor(num_targets, device=targets.device)
+
+    if K_max == 0:
+        # The zero target for the K == 0 case
+        targets = targets.new_zeros((B, 1, *targets.shape[2:]))
+        K_max = 1
+
+    valid = torch.arange(K_max, device=targets.device) < num_targets[:, None]
+    targets = targets * valid[..., None].to(targets.dtype)
+
+    # [1], eq. 3: The rest for each candidate is total minus the candidate
+    rest = torch.sum(targets, dim=1, keepdim=True) - targets
+
+    kwargs = {}
+    if sequence_lengths is not None:
+        kwargs['sequence_lengths'] = sequence_lengths
+    shape = targets.shape
+    one_losses = loss_fn(inputs[:, :1].expand(shape), targets, **kwargs)
+    rest_losses = loss_fn(inputs[:, 1:].expand(shape), rest, **kwargs)
+
+    # For K <= 1 the first candidate is the only one and its rest is 0.
+    # Without filling, the loss of the rest is ignored.
+    rest_weight = torch.where(
+        num_targets >= 2,
+        1 / (num_targets - 1).clamp(min=1),
+        torch.full_like(num_targets, float(fill_missing_with_zeros),
+                        dtype=torch.float64),
+    ).to(one_losses.dtype)
+    losses = one_losses + rest_weight[:, None] * rest_losses
+    losses = torch.where(
+        valid | (torch.arange(K_max, device=targets.device) == 0),
+        losses, torch.full_like(losses, float('inf'))
+    )
+    loss, perm = torch.min(losses, dim=1)
+
+    if not fill_missing_with_zeros:
+        # There are no targets to compute a loss. Nothing to do
+        loss = torch.where(num_targets == 0, torch.zeros_like(loss), loss)
+    return loss, perm
+
+
 class OneAndRestPIT(pt.Model):
     """
     One-And-Rest PIT model as proposed in [1]. This model recursively extracts
@@ -320,32 +400,34 @@ class OneAndRestPIT(pt.Model):
         scalars = {}
 
         s = inputs['s']
-        sequence_lengths = inputs['num_samples']
         B = len(s)
         K = len(s[0])
+        targets = torch.stack(list(s))
+        T = targets.shape[-1]
+        sequence_lengths = torch.as_tensor(
+            inputs['num_samples'], device=targets.device)
 
         # Compute the permutation invariant loss over the targets and sum
         # of remaining targets
         reconstruction_loss = 0
-        permutations = []
-        for b, (targets, seq_len) in enumerate(
-                zip(s, sequence_lengths)
-        ):
-            indices = list(range(K))
-            _permutations = []
-            for k in range(len(outputs['outs'])):
-                l, perm = one_and_rest_permutation_invariant_loss(
-                    outputs['outs'][k]['out'][b][:seq_len],
-                    targets[:, :seq_len],
-                    pt.log_mse_loss,
-                    fill_missing_with_zeros=True
-                )
-                reconstruction_loss += l
-                _permutations.append(indices[perm])
-                del indices[perm]
-                targets = targets[
-                    [i for i in range(targets.shape[0]) if i != perm]]
-            permutations.append(_permutations)
+        num_targets = torch.full((B,), K, device=targets.device)
+        for k in range(len(outputs['outs'])):
+            l, perm = batched_one_and_rest_permutation_invariant_loss(
+                outputs['outs'][k]['out'],
+                targets,
+                num_targets,
+                partial(pt.log_mse_loss, reduction=None),
+                fill_missing_with_zeros=True,
+                sequence_lengths=sequence_lengths,
+            )
+            reconstruction_loss += torch.sum(l)
+            if targets.shape[1] == 0:
+                continue
+            # Remove the matched target, keep the order of the others
+            matched = torch.arange(targets.shape[1], device=targets.device) == perm[:, None]
+            order = torch.argsort(matched.to(torch.long), dim=1, stable=True)[:, :-1]
+            targets = torch.gather(targets, 1, order[..., None].expand(-1, -1, T))
+            num_targets = num_targets - 1
 
         reconstruction_loss = reconstruction_loss / B
 
@@ -6,21 +6,39 @@ import numpy as np
 import paderbox as pb
 import padertorch as pt
 from paderbox.transform import stft
+from padertorch.contrib.data.dynamic_mixing import (
+    DynamicMixer, get_source_dataset
+)
 
 
 def prepare_dataset(
-        db, dataset_name: str, batch_size, return_keys=None, prefetch=True, shuffle=True
+        db, dataset_name: str, batch_size, return_keys=None, prefetch=True, shuffle=True,
+        dynamic_mixing=False,
 ):
     audio_keys = ['observation', 'speech_source']
     dataset = db.get_dataset(dataset_name)
 
-    dataset = (
-        dataset
-        .map(partial(read_audio, audio_keys=audio_keys))
-        .map(partial(pre_batch_transform, return_keys=return_keys))
-    )
-    if shuffle:
-        dataset = dataset.shuffle(reshuffle=True)
+    if dynamic_mixing:
+        # New mixtures of the sources in each epoch, already in random order
+        mixer = DynamicMixer(
+            get_source_dataset(dataset),
+            num_speakers=len(dataset[0]['audio_path']['speech_source']),
+            num_mixtures=len(dataset),
+        )
+        dataset = (
+            mixer.get_dataset()
+            .map(mixer)
+            .map(dynamic_mixture_to_audio_data)
+            .map(partial(pre_batch_transform, return_keys=return_keys))
+        )
+    else:
+        dataset = (
+            dataset
+            .map(partial(read_audio, audio_keys=audio_keys))
+            .map(partial(pre_batch_transform, return_keys=return_keys))
+        )
+        if shuffle:
+            dataset = dataset.shuffle(reshuffle=True)
     dataset = (
         dataset
         .batch(batch_size)
@@ -46,6 +64,14 @@ def read_audio(example, src_key="audio_path", audio_keys=None):
     return example
 
 
+def dynamic_mixture_to_audio_data(example):
+    example['audio_data'] = {
+        'observation': example.pop('y'),
+        'speech_source': example.pop('s'),
+    }
+    return example
+
+
 def pre_batch_transform(inputs, return_keys=None):
     s = inputs['audio_data']['speech_source']
     y = inputs['audio_data']['observation']
@@ -110,33 +110,35 @@ class PermutationInvariantTrainingModel(pt.Model):
         return pt.ops.unpack_sequence(mask)
 
     def review(self, batch, model_out):
+        # The examples have different lengths. The padded frames do not
+        # contribute to the squared error, hence normalize with the number
+        # of frames of each example, to get the mean of the unpadded frames.
+        num_frames = torch.tensor(
+            [mask.shape[0] for mask in model_out], device=model_out[0].device)
+        mask = pt.pad_sequence(model_out, batch_first=True)
+        observation = pt.pad_sequence(batch['Y_abs'], batch_first=True)
+        target = pt.pad_sequence(batch['X_abs'], batch_first=True)
+        cos_phase_diff = pt.pad_sequence(
+            batch['cos_phase_difference'], batch_first=True)
+
+        # (B, T, K, F) -> (B, K, T, F)
+        estimate = (mask * observation[:, :, None, :]).transpose(1, 2)
+        target = target.transpose(1, 2)
+        cos_phase_diff = cos_phase_diff.transpose(1, 2)
+
+        # batched_pit_loss flattens the time and frequency axis
+        normalization = num_frames[:, None, None] * target.shape[-1]
+
+        def mse_loss(estimate, target):
+            return torch.sum((estimate - target) ** 2, dim=-1) / normalization
 
-        pit_mse_loss = list()
-        pit_ips_loss = list()
-
-        for mask, observation, target, cos_phase_diff in zip(
-                model_out,
-                batch['Y_abs'],
-                batch['X_abs'],
-                batch['cos_phase_difference']
-        ):
+        losses = {
             # MSE loss
-            pit_mse_loss.append(pt.ops.losses.pit_loss(
-                mask * observation[:, None, :],
-                target,
-                axis=-2
-            ))
-
+            'pit_mse_loss': torch.mean(pt.ops.losses.batched_pit_loss(
+                estimate, target, mse_loss)),
             # Ideal Phase Sensitive loss
-            pit_ips_loss.append(pt.ops.losses.pit_loss(
-                mask * observation[:, None, :],
-                target * cos_phase_diff,
-                axis=-2
-            ))
-
-        losses = {
-                'pit_mse_loss': torch.mean(torch.stack(pit_mse_loss)),
-                'pit_ips_loss': torch.mean(torch.stack(pit_ips_loss)),
+            'pit_ips_loss': torch.mean(pt.ops.losses.batched_pit_loss(
+                estimate, target * cos_phase_diff, mse_loss)),
         }
 
         b = 0   # only print image of first example in a batch
@@ -48,6 +48,9 @@ def config():
                                  'database_json')
     train_dataset = "mix_2_spk_min_tr"
     validate_dataset = "mix_2_spk_min_cv"
+    # Mix the sources of train_dataset on the fly instead of reading the
+    # precomputed mixtures
+    dynamic_mixing = False
 
     # Dict describing the model parameters, to allow changing the parameters from the command line.
     # Configurable automatically inserts the default values of not mentioned parameters to the config.json
@@ -81,12 +84,12 @@ def config():
 
 @ex.capture
 def prepare_dataset_captured(
-        database, dataset_name, batch_size, debug
+        database, dataset_name, batch_size, debug, dynamic_mixing=False
 ):
     return_keys = 'X_abs Y_abs cos_phase_difference num_frames Y'.split()
     return prepare_dataset(
         database, dataset_name, batch_size, return_keys,
-        prefetch=not debug,
+        prefetch=not debug, dynamic_mixing=dynamic_mixing,
     )
 
 
@@ -129,10 +132,10 @@ def prepare_and_train(_config, _run, train_dataset, validate_dataset, database_j
 
     trainer.test_run(
         prepare_dataset_captured(db, train_dataset),
-        prepare_dataset_captured(db, validate_dataset),
+        prepare_dataset_captured(db, validate_dataset, dynamic_mixing=False),
     )
     trainer.register_validation_hook(
-        prepare_dataset_captured(db, validate_dataset)
+        prepare_dataset_captured(db, validate_dataset, dynamic_mixing=False)
     )
     trainer.train(
         prepare_dataset_captured(db, train_dataset),
@@ -150,7 +153,7 @@ def test_run(_config, _run, train_dataset, validate_dataset,
 
     trainer.test_run(
         prepare_dataset_captured(db, train_dataset),
-        prepare_dataset_captured(db, validate_dataset),
+        prepare_dataset_captured(db, validate_dataset, dynamic_mixing=False),
     )
 
 
@@ -7,7 +7,8 @@ import padertorch as pt
 from torch.nn.utils.rnn import pad_sequence
 
 from .tas_coders import TasEncoder, TasDecoder
-from padertorch.modules.dual_path_rnn import DPRNN, apply_examplewise
+from padertorch.modules.dual_path_rnn import DPRNN
+from padertorch.modules.normalization import MaskedLayerNorm
 from padertorch.ops.losses.regression import si_sdr_loss, log_mse_loss, \
     log1p_mse_loss
 from padertorch.ops.mappings import ACTIVATION_FN_MAP
@@ -57,7 +58,7 @@ class TasNet(pt.Model):
         self.additional_out_size = additional_out_size
         self.sample_rate = sample_rate
 
-        self.encoded_input_norm = torch.nn.LayerNorm(encoder.feature_size)
+        self.encoded_input_norm = MaskedLayerNorm(encoder.feature_size)
         self.input_proj = torch.nn.Conv1d(
             encoder.feature_size, separator.input_size, 1)
         self.output_prelu = torch.nn.PReLU()
@@ -85,8 +86,7 @@ class TasNet(pt.Model):
 
         # Apply layer norm to the encoded signal
         encoded = rearrange(encoded_raw, 'b n l -> b l n')
-        encoded = apply_examplewise(
-            self.encoded_input_norm, encoded, encoded_sequence_lengths)
+        encoded = self.encoded_input_norm(encoded, encoded_sequence_lengths)
 
         # Apply convolutional layer if set
         if self.input_proj:
@@ -153,27 +153,42 @@ class TasNet(pt.Model):
 
     def loss(self, inputs: dict, outputs: dict) -> dict:
         s = inputs['s']
-        sequence_lengths = inputs['num_samples']
         x = outputs['out']
-
+        sequence_lengths = inputs['num_samples']
+        if not torch.is_tensor(sequence_lengths):
+            sequence_lengths = torch.tensor(sequence_lengths)
+        if (
+                sequence_lengths.device.type == 'cpu'
+                and bool(torch.all(sequence_lengths == x.shape[-1]))
+        ):
+            # No padding (e.g. chunked training), skip the masking
+            sequence_lengths = None
+        else:
+            sequence_lengths = sequence_lengths.to(x.device)
+        if not torch.is_tensor(s):
+            # Examples with different lengths, pad the time axis
+            s = pad_sequence(
+                [torch.movedim(s_, -1, 0) for s_ in s], batch_first=True
+            ).movedim(1, -1)
+        s = s[..., :x.shape[-1]].contiguous()
+
+        # Loss function and the reduction over the speakers, that `pit_loss`
+        # would use
         loss_functions = {
-            'si-sdr': si_sdr_loss,
-            'log-mse': log_mse_loss,
-            'log1p-mse': log1p_mse_loss,
+            'si-sdr': (si_sdr_loss, 'mean'),
+            'log-mse': (log_mse_loss, 'sum'),
+            'log1p-mse': (log1p_mse_loss, 'sum'),
+        }
+
+        return {
+            k: torch.mean(pt.ops.losses.batched_pit_loss(
+                x, s,
+                partial(loss_fn, reduction=None,
+                        sequence_lengths=sequence_lengths),
+                reduction=reduction,
+            ))
+            for k, (loss_fn, reduction) in loss_functions.items()
         }
-        losses = {k: [] for k in loss_functions.keys()}
-
-        for seq_len, estimated, target in zip(sequence_lengths, x, s):
-            for k, loss_fn in loss_functions.items():
-                losses[k].append(
-                    pt.ops.losses.pit_loss(
-                        estimated[..., :seq_len],
-                        target[..., :seq_len],
-                        axis=0, loss_fn=loss_fn,
-                    )
-                )
-
-        return {k: torch.mean(torch.stack(v)) for k, v in losses.items()}
 
     def review(self, inputs: dict, outputs: dict) -> dict:
         # Report audios
@@ -21,6 +21,9 @@ from sacred.utils import InvalidConfigError, MissingConfigError
 import padertorch as pt
 import padertorch.contrib.examples.source_separation.tasnet.model
 from padertorch.data.segment import Segmenter
+from padertorch.contrib.data.dynamic_mixing import (
+    DynamicMixer, get_source_dataset
+)
 
 sacred.SETTINGS.CONFIG.READ_ONLY_CONFIG = False
 experiment_name = "tasnet"
@@ -38,6 +41,9 @@ def config():
     train_dataset = "mix_2_spk_min_tr"
     validate_dataset = "mix_2_spk_min_cv"
     target = 'speech_source'
+    # Mix the sources of train_dataset on the fly instead of reading the
+    # precomputed mixtures
+    dynamic_mixing = False
     lr_scheduler_step = 2
     lr_scheduler_gamma = 0.98
     load_model_from = None
@@ -195,13 +201,18 @@ def on_wsj0_2mix_max():
 
 @ex.capture
 def pre_batch_transform(inputs):
+    # Only read the region that is planned by `Segmenter.plan`
+    start = inputs.get('audio_start_samples', 0)
+    stop = inputs.get('audio_stop_samples', None)
     return {
         's': np.ascontiguousarray([
-            pb.io.load_audio(p)
+            pb.io.load_audio(p, start=start, stop=stop)
             for p in inputs['audio_path']['speech_source']
         ], np.float32),
         'y': np.ascontiguousarray(
-            pb.io.load_audio(inputs['audio_path']['observation']), np.float32),
+            pb.io.load_audio(
+                inputs['audio_path']['observation'], start=start, stop=stop
+            ), np.float32),
         'num_samples': inputs['num_samples'],
         'example_id': inputs['example_id'],
         'audio_path': inputs['audio_path'],
@@ -210,7 +221,7 @@ def pre_batch_transform(inputs):
 
 def prepare_dataset(
         db, dataset: str, batch_size, chunk_size, shuffle=True,
-        prefetch=True, dataset_slice=None,
+        prefetch=True, dataset_slice=None, dynamic_mixing=False,
 ):
     """
     This is re-used in the evaluate script
@@ -220,6 +231,10 @@ def prepare_dataset(
     if dataset_slice is not None:
         dataset = dataset[dataset_slice]
 
+    if dynamic_mixing:
+        return prepare_dynamic_mixing_dataset(
+            dataset, batch_size, chunk_size, prefetch=prefetch)
+
     segmenter = Segmenter(
         chunk_size, include_keys=('y', 's'), axis=-1,
         anchor='random' if shuffle else 'left',
@@ -232,8 +247,10 @@ def prepare_dataset(
     if shuffle:
         dataset = dataset.shuffle(reshuffle=True)
 
-    dataset = dataset.map(pre_batch_transform)
-    dataset = dataset.map(segmenter)
+    # Plan the segments from the metadata, so that only the segments are
+    # read from disk and not the complete utterances.
+    dataset = dataset.map(segmenter.plan)
+    dataset = dataset.batch_map(pre_batch_transform)
 
     # FilterExceptions are only raised inside the chunking code if the
     # example is too short. If chunk_size == -1, no filter exception is raised.
@@ -263,10 +280,35 @@ def prepare_dataset(
     return dataset
 
 
+def prepare_dynamic_mixing_dataset(
+        dataset, batch_size, chunk_size, prefetch=True, seed=0,
+):
+    """
+    Mixes the sources of the precomputed mixtures in `dataset` on the fly.
+    In each epoch, new source combinations, gains and crops are drawn and
+    only the cropped regions of the sources are read.
+    """
+    num_speakers = len(dataset[0]['audio_path']['speech_source'])
+    mixer = DynamicMixer(
+        get_source_dataset(dataset),
+        num_speakers=num_speakers,
+        length=None if chunk_size == -1 else chunk_size,
+        num_mixtures=len(dataset),
+        seed=seed,
+    )
+    dataset = mixer.get_dataset().map(mixer)
+    if prefetch:
+        dataset = dataset.prefetch(8, 16)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(pt.data.batch.Sorter('num_samples'))
+    dataset = dataset.map(pt.data.utils.collate_fn)
+    return dataset
+
+
 @ex.capture
 def prepare_dataset_captured(
         database_obj, dataset, batch_size, debug, chunk_size,
-        shuffle, dataset_slice=None,
+        shuffle, dataset_slice=None, dynamic_mixing=False,
 ):
     if dataset_slice is None:
         if debug:
@@ -277,6 +319,7 @@ def prepare_dataset_captured(
         shuffle=shuffle,
         prefetch=not debug,
         dataset_slice=dataset_slice,
+        dynamic_mixing=dynamic_mixing,
     )
 
 
@@ -334,7 +377,8 @@ def prepare_and_train(_run, _log, trainer, train_dataset, validate_dataset,
 
     train_dataset = prepare_dataset_captured(db, train_dataset, shuffle=True)
     validate_dataset = prepare_dataset_captured(
-        db, validate_dataset, shuffle=False, chunk_size=-1
+        db, validate_dataset, shuffle=False, chunk_size=-1,
+        dynamic_mixing=False,
     )
 
     # Perform a test run to check if everything works
@@ -385,7 +429,8 @@ def test_run(_run, _log, trainer, train_dataset, validate_dataset,
     # Perform a test run to check if everything works
     trainer.test_run(
         prepare_dataset_captured(db, train_dataset, shuffle=True),
-        prepare_dataset_captured(db, validate_dataset, shuffle=True),
+        prepare_dataset_captured(
+            db, validate_dataset, shuffle=True, dynamic_mixing=False),
     )
 
 
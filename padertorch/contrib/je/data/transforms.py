@@ -10,9 +10,9 @@ import soundfile
 from paderbox.transform.module_fbank import MelTransform as BaseMelTransform
 from paderbox.transform.module_stft import STFT as BaseSTFT
 from paderbox.utils.nested import nested_op
-from padertorch.utils import to_list
-from tqdm import tqdm
-from collections import defaultdict
+from padertorch.data.statistics import (
+    collect_statistics, MeanVariance, Maximum, Counts
+)
 from paderbox.transform.module_filter import preemphasis_with_offset_compensation
 
 
@@ -23,6 +23,8 @@ class AudioReader:
     >>> example = {'audio_data': np.arange(16000.)[None], 'labels': ['a', 'b', 'c'], 'labels_start_samples': [0, 4000, 12000], 'labels_stop_samples': [4000, 10000, 16000]}
     """
     source_sample_rate: int = 16000
+    # None keeps the source sample rate, e.g. to resample the collated batch
+    # on the training device with padertorch.ops.resample
     target_sample_rate: int = 16000
     concat_axis: int = None
     average_channels: bool = False
@@ -33,9 +35,27 @@ class AudioReader:
     storage_dir: str = None
     preemphasis_factor: float = 0.
     alignment_keys: list = None
+    packed_audio: str = None  # index of padertorch.contrib.data.packed_audio
 
     def __post_init__(self):
         self.norm = None
+        self._packed_audio_reader = None
+
+    def _read(self, filepath, start_sample, stop_sample):
+        if self.packed_audio is not None:
+            if self._packed_audio_reader is None:
+                from padertorch.contrib.data.packed_audio import \
+                    PackedAudioReader
+                self._packed_audio_reader = PackedAudioReader(
+                    self.packed_audio)
+            if filepath in self._packed_audio_reader:
+                return self._packed_audio_reader.read(
+                    filepath, start=start_sample, stop=stop_sample,
+                    always_2d=True
+                )
+        return soundfile.read(
+            filepath, start=start_sample, stop=stop_sample, always_2d=True
+        )
 
     def _load_source(self, filepath, start_sample=0, stop_sample=None):
         if isinstance(filepath, (list, tuple)):
@@ -57,16 +77,15 @@ class AudioReader:
             return np.concatenate(audio, axis=self.concat_axis), sr[0]
 
         filepath = str(filepath)
-        x, sr = soundfile.read(
-            filepath, start=start_sample, stop=stop_sample, always_2d=True
-        )
+        x, sr = self._read(filepath, start_sample, stop_sample)
         if self.source_sample_rate is not None:
             assert sr == self.source_sample_rate, (self.source_sample_rate, sr)
         return x.T, sr
 
     def load(self, filepath, start_sample=0, stop_sample=None):
         x, sr = self._load_source(filepath, start_sample, stop_sample)
-        if self.target_sample_rate != sr:
+        if self.target_sample_rate is not None \
+                and self.target_sample_rate != sr:
             x = samplerate.resample(
                 x.T, self.target_sample_rate / sr, "sinc_fastest"
             ).T
@@ -114,7 +133,21 @@ class AudioReader:
         else:
             raise ValueError(f'Invalid normalization {self.normalization_type}')
 
-    def initialize_norm(self, dataset=None):
+    def initialize_norm(self, dataset=None, num_workers=0, update=False):
+        """Computes the dataset or global audio norm or restores it from
+        `<storage_dir>/audio_norm.json`.
+
+        Args:
+            dataset: dataset with the examples from the database.
+            num_workers: number of processes that load the audio.
+            update: If True, the norm is updated with the examples in
+                `dataset` that are not yet included in
+                `<storage_dir>/audio_norm_state.json` (e.g. when new data is
+                appended) and `audio_norm.json` is rewritten. The state is
+                discarded, when it was computed with a different
+                normalization config. Without update, the state is neither
+                used nor written.
+        """
         if self.normalization_domain is None \
                 or self.normalization_domain == 'instance' \
                 or self.normalization_type is None:
@@ -122,7 +155,7 @@ class AudioReader:
             return
         filepath = None if self.storage_dir is None \
             else Path(self.storage_dir) / f"audio_norm.json"
-        if filepath is not None and Path(filepath).exists():
+        if filepath is not None and Path(filepath).exists() and not update:
             with filepath.open() as fid:
                 self.norm = {
                     key: np.array(norm) for key, norm in json.load(fid).items()
@@ -131,50 +164,70 @@ class AudioReader:
         else:
             print(f'Initialize audio norm')
             assert dataset is not None
-            count = 0
-            for example in tqdm(dataset):
-                dataset_name = example['dataset']
-                assert dataset_name != 'global_norm'
-                audio_path = example["audio_path"]
-                start_samples = example.get("audio_start_samples", 0)
-                stop_samples = example.get("audio_stop_samples", None)
-                audio = self.load(audio_path, start_samples, stop_samples)
-                audio = self._prenormalize(audio)
-                audio_norm = self._get_audio_norm(audio)
-                n_samples = audio.shape[-1] if self.channelwise_norm else np.prod(audio.shape)
-                if count == 0:
-                    self.norm = defaultdict(lambda: np.zeros_like(audio_norm))
-                    count = defaultdict(lambda: 0)
-                for key in [dataset_name, 'global_norm']:
-                    if self.normalization_type == "power":
-                        self.norm[key] *= count[key] / (count[key] + n_samples)
-                        self.norm[key] += n_samples / (count[key] + n_samples) * audio_norm**2
-                    elif self.normalization_type == "max":
-                        self.norm[key] = np.maximum(self.norm[key], audio_norm)
-                    count[key] += n_samples
+            statistics = collect_statistics(
+                dataset, self._get_norm_statistics, num_workers=num_workers,
+                state_path=None if filepath is None or not update
+                else filepath.with_name('audio_norm_state.json'),
+                config=self._norm_statistics_config(),
+            )
             if self.normalization_type == "power":
-                self.norm = {key: np.sqrt(power) for key, power in self.norm.items()}
+                self.norm = {
+                    key: np.sqrt(stats.power)
+                    for key, stats in statistics.items()
+                }
             elif self.normalization_type == "max":
-                self.norm = {key: norm for key, norm in self.norm.items()}
+                self.norm = {
+                    key: stats.value for key, stats in statistics.items()
+                }
             if filepath is not None:
                 with filepath.open('w') as fid:
                     json.dump(
-                        {key: norm.tolist() for key, norm in self.norm.items()},
+                        {key: np.asarray(norm).tolist() for key, norm in self.norm.items()},
                         fid, sort_keys=True, indent=4
                     )
                 print(f'Saved audio norm to {filepath}')
 
+    def _norm_statistics_config(self):
+        """The fields that change the result of `_get_norm_statistics`."""
+        return {
+            key: getattr(self, key) for key in [
+                'source_sample_rate', 'target_sample_rate', 'concat_axis',
+                'average_channels', 'normalization_type',
+                'normalization_domain', 'channelwise_norm',
+                'preemphasis_factor',
+            ]
+        }
+
+    def _get_norm_statistics(self, example):
+        dataset_name = example['dataset']
+        assert dataset_name != 'global_norm'
+        audio_path = example["audio_path"]
+        start_samples = example.get("audio_start_samples", 0)
+        stop_samples = example.get("audio_stop_samples", None)
+        audio = self.load(audio_path, start_samples, stop_samples)
+        audio = self._prenormalize(audio)
+        axis = -1 if self.channelwise_norm else None
+        if self.normalization_type == "power":
+            stats = MeanVariance(axis).update(audio)
+        elif self.normalization_type == "max":
+            stats = Maximum(axis).update(np.abs(audio))
+        else:
+            raise ValueError(f'Invalid normalization {self.normalization_type}')
+        return {dataset_name: stats, 'global_norm': stats}
+
     def add_start_stop_samples(self, example):
+        sample_rate = self.source_sample_rate \
+            if self.target_sample_rate is None else self.target_sample_rate
         if self.alignment_keys is not None:
             for ali_key in self.alignment_keys:
                 if f'{ali_key}_start_times' in example or f'{ali_key}_stop_times' in example:
                     assert f'{ali_key}_start_times' in example and f'{ali_key}_stop_times' in example, example.keys()
                     example[f'{ali_key}_start_samples'] = [
-                        int(self.target_sample_rate*t)
+                        int(sample_rate*t)
                         for t in example[f'{ali_key}_start_times']
                     ]
                     example[f'{ali_key}_stop_samples'] = [
-                        int(self.target_sample_rate*t)
+                        int(sample_rate*t)
                         for t in example[f'{ali_key}_stop_times']
                     ]
         return example
@@ -363,14 +416,30 @@ class LabelEncoder:
         return example
 
     def initialize_labels(
-            self, labels=None, dataset=None, dataset_name=None, verbose=False
+            self, labels=None, dataset=None, dataset_name=None, verbose=False,
+            num_workers=0, update=False,
     ):
+        """Collects the labels in `dataset` or restores them from
+        `<storage_dir>/<label_key>.json`.
+
+        Args:
+            labels: Optional list of labels. If given, the dataset is not
+                scanned.
+            dataset: dataset with the examples from the database.
+            dataset_name: Optional suffix of the label file.
+            verbose:
+            num_workers: number of processes that scan the dataset.
+            update: If True, the labels of the examples in `dataset` that are
+                not yet included in the state file next to the label file are
+                added. Note that new labels can change the label mapping.
+                Without update, the state is neither used nor written.
+        """
         filename = f"{self.label_key}.json" if dataset_name is None \
             else f"{self.label_key}_{dataset_name}.json"
         filepath = None if self.storage_dir is None \
             else (Path(self.storage_dir) / filename).expanduser().absolute()
 
-        if filepath and Path(filepath).exists():
+        if filepath and Path(filepath).exists() and not update:
             with filepath.open() as fid:
                 labels_ = json.load(fid)
             if verbose:
@@ -380,10 +449,14 @@ class LabelEncoder:
             labels = labels_
         else:
             if labels is None:
-                labels = set()
-                for example in dataset:
-                    labels.update(to_list(example[self.label_key]))
-                labels = sorted(labels)
+                statistics = collect_statistics(
+                    dataset, self._get_label_statistics,
+                    num_workers=num_workers,
+                    state_path=None if filepath is None or not update
+                    else filepath.with_name(f'{filepath.stem}_state.json'),
+                    config={'label_key': self.label_key},
+                )
+                labels = statistics.get('labels', Counts()).keys()
             if filepath:
                 with filepath.open('w') as fid:
                     json.dump(labels, fid, indent=4)
@@ -397,6 +470,9 @@ class LabelEncoder:
             i: label for label, i in self.label_mapping.items()
         }
 
+    def _get_label_statistics(self, example):
+        return {'labels': Counts().update(example[self.label_key])}
+
 
 @dataclasses.dataclass
 class MultiHotEncoder(LabelEncoder):
@@ -473,6 +549,8 @@ class StackArrays:
 
     axis: int = 0
     cut_end: bool = False
+    # e.g. padertorch.data.shared_memory.SharedMemoryTransport.allocate
+    allocator: Callable = None
 
     def __call__(self, example):
         if isinstance(example, dict):
@@ -493,7 +571,8 @@ class StackArrays:
                 axis = len(target_shape) + 1 + axis
             assert -(len(target_shape)+1) <= axis <= len(target_shape), axis
             stack_shape = [*target_shape[:axis].tolist(), len(batch), *target_shape[axis:].tolist()]
-            stacked_arrays = np.zeros(stack_shape, dtype=batch[0].dtype)
+            allocator = np.zeros if self.allocator is None else self.allocator
+            stacked_arrays = allocator(stack_shape, dtype=batch[0].dtype)
             for i, array in enumerate(batch):
                 diff = target_shape - array.shape
                 assert np.argwhere(diff != 0).size <= 1, (
@@ -569,7 +648,7 @@ class Collate:
            [1., 1.],
            [1., 1.]]), 'b': ['0', '1']}
     """
-    leaf_op: callable = StackArrays()
+    leaf_op: callable = dataclasses.field(default_factory=StackArrays)
 
     def __call__(self, example):
         example = nested_op(self.collate, *example, sequence_type=())
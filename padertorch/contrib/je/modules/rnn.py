@@ -1,7 +1,7 @@
 from torch import nn
 import torch
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
-from padertorch.ops.sequence.mask import compute_mask
+from padertorch.ops.sequence.indexing import reverse_sequence as _reverse_sequence
 from einops import rearrange
 from padertorch.contrib.je.modules.conv import CNN1d, CNNTranspose1d
 from padertorch.contrib.je.modules.transformer import TransformerLayerStack
@@ -129,9 +129,15 @@ class TransformerEncoder(RNN):
 
 def reverse_sequence(x, seq_len=None):
     """
-    >>> x, seq_len = (torch.cumsum(torch.ones((3,5,8)), dim=1), [4,5,2])
-    >>> reverse_sequence(x, seq_len)
-    >>> reverse_sequence(reverse_sequence(x, seq_len), seq_len)
+    >>> x, seq_len = (torch.cumsum(torch.ones((3,5,2)), dim=1), [4,5,2])
+    >>> reverse_sequence(x, seq_len)[..., 0]
+    tensor([[4., 3., 2., 1., 0.],
+            [5., 4., 3., 2., 1.],
+            [2., 1., 0., 0., 0.]])
+    >>> reverse_sequence(reverse_sequence(x, seq_len), seq_len)[..., 0]
+    tensor([[1., 2., 3., 4., 0.],
+            [1., 2., 3., 4., 5.],
+            [1., 2., 0., 0., 0.]])
 
     Args:
         x:
@@ -140,15 +146,4 @@ def reverse_sequence(x, seq_len=None):
     Returns:
 
     """
-    if seq_len is None:
-        return x.flip(1)
-    T = x.shape[1]
-    x = torch.cat((x, x), dim=1)
-    x = torch.stack(
-        tuple([
-            x[i, seq_len[i]:seq_len[i] + T].flip(0) for i in range(len(x))
-        ]),
-        dim=0
-    )
-    mask = compute_mask(x, seq_len)
-    return x * mask
+    return _reverse_sequence(x, seq_len)
@@ -1,3 +1,5 @@
+import functools
+
 import torch
 import numpy as np
 from einops import rearrange
@@ -6,10 +8,12 @@ import torch.nn.functional as F
 from padertorch.base import Module
 from padertorch.ops.mappings import ACTIVATION_FN_MAP
 from padertorch.modules.normalization import Normalization
-from padertorch.ops.sequence.mask import compute_mask
 
 
-def scaled_dot_product_attention(q, k, v, seq_len=None, bidirectional=False, mask=None):
+def scaled_dot_product_attention(
+        q, k, v, seq_len=None, bidirectional=False, mask=None,
+        need_weights=True,
+):
     """
     >>> q = torch.zeros((2, 3, 4))
     >>> k = torch.zeros((2, 6, 4))
@@ -24,20 +28,72 @@ def scaled_dot_product_attention(q, k, v, seq_len=None, bidirectional=False, mas
     >>> (torch.abs(x[0,-1] - v[0].mean(0)) < 1e-6).all()
     tensor(True)
     >>> x, _ = scaled_dot_product_attention(q, k, v, seq_len=[6,4], bidirectional=True)
+    >>> x_, w = scaled_dot_product_attention(q, k, v, seq_len=[6,4], bidirectional=True, need_weights=False)
+    >>> w is None, bool(torch.allclose(x, x_, atol=1e-6))
+    (True, True)
+
+    Args:
+        q: queries with shape (..., Tq, D)
+        k: keys with shape (..., Tk, D)
+        v: values with shape (..., Tk, Dv)
+        seq_len: number of valid keys of each example. Only used, when
+            bidirectional, the causal mask already hides padded keys.
+        bidirectional: If False, a query attends to the keys up to its own
+            position, where the last query and key are aligned.
+        mask: additional mask with shape broadcastable to (..., Tq, Tk),
+            values > 0 mark the keys that may be attended.
+        need_weights: If False, the attention weights are not returned and
+            `torch.nn.functional.scaled_dot_product_attention` computes the
+            output without materializing them (flash or memory-efficient
+            kernels, when available).
+
+    Returns:
+        output with shape (..., Tq, Dv) and the attention weights with shape
+        (..., Tq, Tk) or None.
     """
+    attn_mask, is_causal = _attention_mask(q, k, seq_len, bidirectional, mask)
+    if not need_weights:
+        return F.scaled_dot_product_attention(
+            q, k, v, attn_mask=attn_mask, is_causal=is_causal), None
     y = q@k.transpose(-2, -1)/np.sqrt(k.shape[-1])
-    if mask is not None:
-        y = y + torch.log((mask > 0).float())
-    if not bidirectional:
-        mask = get_causal_mask(y)
-        y = y + torch.log((mask > 0).float())
-    elif seq_len is not None:
-        mask = compute_mask(y, seq_len, sequence_axis=-1)
-        y = y + torch.log((mask > 0).float())
+    if is_causal:
+        attn_mask = _causal_mask(y.shape[-2], y.shape[-1], y.device)
+    if attn_mask is not None:
+        y = y.masked_fill(~attn_mask, -float('inf'))
     y = torch.softmax(y, dim=-1)
     return y@v, y
 
 
+def _attention_mask(q, k, seq_len, bidirectional, mask):
+    """Boolean mask (True: attend) that broadcasts to the scores or None and
+    whether the causal mask of square scores is left to the attention
+    kernel."""
+    Tq, Tk = q.shape[-2], k.shape[-2]
+    attn_mask = None if mask is None else mask > 0
+    if not bidirectional:
+        if Tq == 1:
+            # The last query attends to all keys
+            return attn_mask, False
+        if Tq == Tk and attn_mask is None:
+            return None, True
+        causal_mask = _causal_mask(Tq, Tk, q.device)
+        attn_mask = causal_mask if attn_mask is None else attn_mask & causal_mask
+    elif seq_len is not None:
+        seq_len = torch.as_tensor(seq_len, device=k.device)
+        key_mask = torch.arange(Tk, device=k.device) < seq_len[:, None]
+        key_mask = key_mask.reshape(
+            len(seq_len), *(k.dim() - 2) * [1], Tk)
+        attn_mask = key_mask if attn_mask is None else attn_mask & key_mask
+    return attn_mask, False
+
+
+@functools.lru_cache(maxsize=32)
+def _causal_mask(Tq, Tk, device):
+    return torch.ones(
+        (Tq, Tk), dtype=torch.bool, device=device
+    ).tril(diagonal=Tk - Tq)
+
+
 class MultiHeadAttention(Module):
     """
     https://arxiv.org/abs/1706.03762
@@ -45,7 +101,7 @@ class MultiHeadAttention(Module):
     >>> q = torch.randn((2, 3, 4))
     >>> k = torch.randn((2, 6, 6))
     >>> v = torch.randn((2, 6, 8))
-    >>> attn = MultiHeadAttention(4, 6, 8, 4, 4)
+    >>> attn = MultiHeadAttention(4, 6, 8, 4, 4, num_heads=1)
     >>> y, w = attn(q, k, v)
     >>> y.shape
     torch.Size([2, 3, 4])
@@ -53,6 +109,16 @@ class MultiHeadAttention(Module):
     >>> y, w = attn(q, k, v)
     >>> y.shape
     torch.Size([2, 3, 4])
+
+    With a key/value cache, `k` and `v` are only the new keys and values,
+    which are appended to the cache:
+    >>> kv_cache = attn.init_kv_cache(2)
+    >>> y, w, kv_cache = attn(q, k[:, :4], v[:, :4], kv_cache=kv_cache)
+    >>> y, w, kv_cache = attn(q, k[:, 4:], v[:, 4:], kv_cache=kv_cache)
+    >>> kv_cache[0].shape
+    torch.Size([2, 2, 6, 2])
+    >>> bool(torch.allclose(y, attn(q, k, v)[0], atol=1e-6))
+    True
     """
     def __init__(
             self, queue_size, key_size, value_size, d_model, output_size,
@@ -69,7 +135,39 @@ class MultiHeadAttention(Module):
         self.lin_value = torch.nn.Linear(value_size, self.d_model)
         self.out = torch.nn.Linear(self.d_model, self.output_size)
 
-    def forward(self, q, k, v, seq_len=None, mask=None):
+    def init_kv_cache(self, batch_size, device=None, dtype=None):
+        """Empty key/value cache for `forward`, i.e. projected keys and
+        values with shape (batch_size, num_heads, 0, d_model // num_heads).
+        """
+        weight = self.lin_key.weight
+        empty = torch.zeros(
+            (batch_size, self.num_heads, 0, self.d_model // self.num_heads),
+            device=weight.device if device is None else device,
+            dtype=weight.dtype if dtype is None else dtype,
+        )
+        return empty, empty
+
+    def forward(
+            self, q, k, v, seq_len=None, mask=None, need_weights=True,
+            kv_cache=None,
+    ):
+        """
+        Args:
+            q: queries with shape (B, Tq, queue_size)
+            k: keys with shape (B, Tk, key_size)
+            v: values with shape (B, Tk, value_size)
+            seq_len: see `scaled_dot_product_attention`
+            mask: see `scaled_dot_product_attention`
+            need_weights: If False, the attention weights are not computed
+                and None is returned instead.
+            kv_cache: Optional tuple of the projected keys and values of the
+                previous calls, see `init_kv_cache`. `k` and `v` are appended
+                to it.
+
+        Returns:
+            output with shape (B, Tq, output_size), the attention weights
+            and, if `kv_cache` is not None, the updated cache.
+        """
         B, Tq, _ = q.shape
         B, Tk, _ = k.shape
         q = self.lin_queue(q).view(
@@ -81,10 +179,16 @@ class MultiHeadAttention(Module):
         v = self.lin_value(v).view(
             B, Tk, self.num_heads, self.d_model//self.num_heads
         ).transpose(1, 2)
+        if kv_cache is not None:
+            k = torch.cat((kv_cache[0], k), dim=-2)
+            v = torch.cat((kv_cache[1], v), dim=-2)
         x, attention_weights = scaled_dot_product_attention(
-            q, k, v, seq_len=seq_len, bidirectional=self.bidirectional, mask=mask
+            q, k, v, seq_len=seq_len, bidirectional=self.bidirectional,
+            mask=mask, need_weights=need_weights,
         )
         x = x.transpose(1, 2).contiguous().view(B, Tq, self.d_model)
+        if kv_cache is not None:
+            return self.out(x), attention_weights, (k, v)
         return self.out(x), attention_weights
 
 
@@ -141,11 +245,34 @@ class TransformerLayer(Module):
 
     def forward(
             self, x, seq_len, m=None, seq_len_m=None, state=None,
+            kv_cache=None,
     ):
-        if state is not None:
+        """
+        Args:
+            x: input with shape (B, T, d_model)
+            seq_len:
+            m: memory for the cross attention
+            seq_len_m:
+            state: inputs of the previous calls (causal only)
+            kv_cache: projected keys and values of the previous calls (causal
+                only), see `MultiHeadAttention.init_kv_cache`. Replaces
+                `state`.
+
+        Returns:
+            output and the new `state` or, if given, the new `kv_cache`
+        """
+        if state is not None or kv_cache is not None:
             assert self.multi_head_self_attention.bidirectional is False
-        s = x if state is None else torch.cat((state, x), 1)
-        h, _ = self.multi_head_self_attention(x, s, s, seq_len=seq_len)
+        if kv_cache is not None:
+            assert state is None
+            h, _, s = self.multi_head_self_attention(
+                x, x, x, seq_len=seq_len, need_weights=False,
+                kv_cache=kv_cache,
+            )
+        else:
+            s = x if state is None else torch.cat((state, x), 1)
+            h, _ = self.multi_head_self_attention(
+                x, s, s, seq_len=seq_len, need_weights=False)
         if self.training and self.dropout > 0.:
             h = F.dropout(h, self.dropout)
         if self.self_attention_norm is not None and self.norm_first:
@@ -156,7 +283,8 @@ class TransformerLayer(Module):
         if self.cross_attention:
             assert m is not None
             q = h
-            h, _ = self.multi_head_cross_attention(q, m, m, seq_len=seq_len_m)
+            h, _ = self.multi_head_cross_attention(
+                q, m, m, seq_len=seq_len_m, need_weights=False)
             if self.training and self.dropout > 0.:
                 h = F.dropout(h, self.dropout)
             if self.cross_attention_norm is not None and self.norm_first:
@@ -213,6 +341,13 @@ class TransformerLayerStack(Module):
         torch.Size([2, 3, 6])
         >>> attn(x, seq_len=None, state=[torch.zeros((2, 5, 6)), torch.zeros((2, 5, 6))])[0].shape
         torch.Size([2, 3, 6])
+
+        Autoregressive decoding with a key/value cache, see `step`:
+        >>> _ = attn.eval()
+        >>> y, cache = attn.step(x[:, :2])
+        >>> y_, cache = attn.step(x[:, 2:], cache=cache)
+        >>> bool(torch.allclose(torch.cat((y, y_), 1), attn(x, seq_len=None)[0], atol=1e-5))
+        True
         """
         super().__init__()
         self.positional_encoding = positional_encoding
@@ -231,10 +366,10 @@ class TransformerLayerStack(Module):
             )
         self.transformer_layers = torch.nn.ModuleList(transformer_layers)
 
-    def add_positional_encoding(self, x):
+    def add_positional_encoding(self, x, offset=0):
         b, t, d = x.shape
         assert d % 2 == 0, x.shape
-        positions = torch.arange(t, device=x.device)[:, None]
+        positions = torch.arange(offset, offset + t, device=x.device)[:, None]
         dimensions = torch.arange(d//2, device=x.device)
         cos_encodings = torch.cos(positions/(10000**(2*dimensions/d)))
         sin_encodings = torch.sin(positions/(10000**(2*dimensions/d)))
@@ -255,6 +390,41 @@ class TransformerLayerStack(Module):
             )
         return h, state
 
+    def step(self, x, cache=None, m=None, seq_len_m=None):
+        """
+        Incremental (autoregressive) forward of a causal stack. Each call
+        processes the new frames `x` and attends to the cached projected
+        keys and values of all previous frames, i.e. the cost per frame is
+        linear in the number of previous frames, while `forward` with the
+        `state` recomputes the keys and values of all previous frames.
+
+        Args:
+            x: new frames with shape (B, T, input_size), e.g. T = 1
+            cache: list with the key/value cache of each layer, as returned
+                by the previous call. None starts a new sequence.
+            m: memory for the cross attention
+            seq_len_m:
+
+        Returns:
+            output for the new frames and the updated cache
+        """
+        if cache is None:
+            cache = [
+                layer.multi_head_self_attention.init_kv_cache(
+                    x.shape[0], device=x.device)
+                for layer in self.transformer_layers
+            ]
+        h = self.lin(x)
+        if self.positional_encoding:
+            h = self.add_positional_encoding(h, offset=cache[0][0].shape[-2])
+        cache = list(cache)
+        for i, layer in enumerate(self.transformer_layers):
+            h, cache[i] = layer(
+                h, seq_len=None, m=m, seq_len_m=seq_len_m,
+                kv_cache=cache[i],
+            )
+        return h, cache
+
 
 def get_causal_mask(x):
     return torch.tril(torch.ones_like(x), diagonal=(x.shape[-1] - x.shape[-2]))
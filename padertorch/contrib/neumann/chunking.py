@@ -1,4 +1,4 @@
-from copy import deepcopy
+from copy import copy
 
 import lazy_dataset
 import numpy as np
@@ -35,7 +35,8 @@ class Chunk:
     This chunking returns a list of chunked examples that can be unbatched.
     Everything that is not listed in `chunk_keys` is simply copied from the
     input example to the output examples. The key `num_samples` is updated
-    with the `chunk_size`.
+    with the `chunk_size`. The chunks are views of the input arrays and the
+    other values are shared between the chunks (shallow copy).
 
     Examples:
         >>> c = Chunk(chunk_size=32000, chunk_keys=('x', 'y'))
@@ -116,7 +117,7 @@ class Chunk:
                 shift,
         ):
             chunk_end = chunk_beginning + self.chunk_size
-            chunk = deepcopy(example)
+            chunk = copy(example)
             chunk.update({
                 k: _getitem_on_axis(v, slice(chunk_beginning, chunk_end), axis=self.axis)
                 for k, v in to_chunk.items()
@@ -213,7 +214,7 @@ class RandomChunkSingle:
             raise RuntimeError(
                 to_chunk_length, self.min_length, self.chunk_size)
 
-        chunk = deepcopy(example)
+        chunk = copy(example)
         chunk.update({
             k: _getitem_on_axis(v, slice(start, start + self.chunk_size), axis=self.axis).copy()
             for k, v in to_chunk.items()
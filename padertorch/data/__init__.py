@@ -1,5 +1,16 @@
 from . import batch
 from . import utils
 from . import segment
+from . import sampler
+from . import cache
+from . import statistics
+from . import shared_memory
+from . import dataloader
+from . import profiler
 
 from .batch import *
+from .sampler import *
+from .cache import *
+from .shared_memory import *
+from .dataloader import *
+from .profiler import DataProfiler
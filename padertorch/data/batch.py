@@ -56,6 +56,15 @@ def example_to_device(example, device=None, memo=None):
         example on device
 
     """
+    from padertorch.data.shared_memory import SharedBatch
+    from padertorch.ops.sequence.jagged import JaggedTensor
+    if isinstance(example, SharedBatch):
+        # Recycles the slab, see padertorch.data.shared_memory
+        return example.to_device(
+            device,
+            lambda example, device: example_to_device(example, device, memo)
+        )
+
     if memo is None:
         memo = {}
 
@@ -73,7 +82,7 @@ def example_to_device(example, device=None, memo=None):
                 # crash
                 if value.dtype not in [np.complex64, np.complex128]:
                     raise
-        if isinstance(value, torch.Tensor):
+        if isinstance(value, (torch.Tensor, JaggedTensor)):
             value = value.to(device=device)
         memo[id_] = value
         return value
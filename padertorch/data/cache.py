@@ -0,0 +1,433 @@
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import uuid
+from pathlib import Path
+from typing import Union, Optional, Sequence
+
+import numpy as np
+from paderbox.utils.nested import flatten, deflatten
+
+__all__ = [
+    'FeatureCache',
+    'get_transform_config',
+]
+
+
+def _callable_name(obj) -> str:
+    module = getattr(obj, '__module__', None)
+    qualname = getattr(obj, '__qualname__', None)
+    if module is None or qualname is None \
+            or '<lambda>' in qualname or '<locals>' in qualname:
+        raise TypeError(
+            f'Cannot identify the callable {obj!r} by its name, because it '
+            f'is a lambda, a local function or an object without a module '
+            f'and name. Use a module level function or provide the config '
+            f'of the transform explicitly.'
+        )
+    return f'{module}.{qualname}'
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Path):
+        return str(obj)
+    if isinstance(obj, functools.partial):
+        return {
+            'partial': obj.func, 'args': obj.args, 'keywords': obj.keywords}
+    if inspect.ismethod(obj):
+        # The parameters of the bound object are part of the config
+        return {'self': obj.__self__, 'method': obj.__func__.__name__}
+    if isinstance(obj, type) or inspect.isroutine(obj) \
+            or isinstance(obj, np.ufunc):
+        return _callable_name(obj)
+    # Instances with parameters, e.g. a dataclass transform as field of
+    # another transform
+    return get_transform_config(obj)
+
+
+def get_transform_config(transform) -> dict:
+    """
+    Returns a config for `transform` that describes its parameters. It is
+    used by `FeatureCache` to detect changes of a transform.
+
+    For dataclass instances (e.g. the transforms in `contrib.je.data`) the
+    config is created from the fields. For `Configurable` instances, the
+    config is created from the attributes with the names of the arguments
+    of `__init__`. Nested transforms, e.g. the `base_stft` of a
+    `TimeWarpedSTFT`, are described by their config, too. Other transforms
+    need an explicit config.
+
+    >>> @dataclasses.dataclass
+    ... class Scale:
+    ...     factor: float = 2.
+    ...     def __call__(self, example):
+    ...         return example
+    >>> get_transform_config(Scale(3.))  # doctest: +ELLIPSIS
+    {'factory': '...Scale', 'factor': 3.0}
+    >>> _config_hash(Scale(3.)) == _config_hash(Scale(4.))
+    False
+    """
+    from padertorch.configurable import class_to_str, Configurable
+    if dataclasses.is_dataclass(transform) \
+            and not isinstance(transform, type):
+        return {
+            'factory': class_to_str(type(transform)),
+            **{
+                field.name: getattr(transform, field.name)
+                for field in dataclasses.fields(transform)
+                if field.init
+            },
+        }
+    if isinstance(transform, Configurable):
+        parameters = [
+            name for name, parameter in inspect.signature(
+                type(transform).__init__).parameters.items()
+            if name != 'self' and parameter.kind not in (
+                parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)
+        ]
+        missing = [name for name in parameters if not hasattr(transform, name)]
+        if not missing:
+            return {
+                'factory': class_to_str(type(transform)),
+                **{name: getattr(transform, name) for name in parameters},
+            }
+        raise TypeError(
+            f'Cannot infer the config of {transform!r}, because the '
+            f'arguments {missing} are not stored as attributes. Provide the '
+            f'config of the transform explicitly, e.g., the config that was '
+            f'used in `from_config`.'
+        )
+    raise TypeError(
+        f'Cannot infer the config of {transform!r}. Provide the config of '
+        f'the transform explicitly, e.g., from `Configurable.get_config`.'
+    )
+
+
+def _config_hash(config) -> str:
+    config = json.dumps(config, sort_keys=True, default=_json_default)
+    return hashlib.sha256(config.encode()).hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    Wraps a deterministic transform and caches its output on disk, e.g., to
+    avoid the recomputation of the audio reading and feature extraction in
+    each epoch. Entries are identified by the `example_id` (see `key`) and a
+    hash of the config of the transform, so a changed config never hits
+    entries of an old config.
+
+    The cache directory contains one subdirectory per config hash with shard
+    files. Each process (and thread) writes to its own shard, so concurrent
+    writers (e.g. prefetch workers) never write to the same file. Each shard
+    `<name>.bin` has an append-only index `<name>.index` with one JSON line
+    per entry. The arrays in a shard are aligned and read with `np.memmap`,
+    i.e. a hit returns read-only views of the cached arrays without copying
+    them. Non-array values are pickled.
+
+    If `max_size` is given and the total size of all shards in `cache_dir`
+    exceeds it, complete shards are deleted: first the shards of other
+    configs, then the oldest shards.
+
+    >>> import tempfile
+    >>> @dataclasses.dataclass
+    ... class Square:
+    ...     offset: float = 0.
+    ...     def __call__(self, example):
+    ...         example['feature'] = example['signal'] ** 2 + self.offset
+    ...         return example
+    >>> with tempfile.TemporaryDirectory() as cache_dir:
+    ...     cache = FeatureCache(Square(), cache_dir)
+    ...     ex = {'example_id': 'a', 'signal': np.arange(3.)}
+    ...     print(cache(ex)['feature'], cache.statistics)
+    ...     ex = {'example_id': 'a', 'signal': np.arange(3.)}
+    ...     print(cache(ex)['feature'], cache.statistics)
+    ...     cache = FeatureCache(Square(offset=1.), cache_dir)
+    ...     ex = {'example_id': 'a', 'signal': np.arange(3.)}
+    ...     print(cache(ex)['feature'], cache.statistics)
+    [0. 1. 4.] {'hits': 0, 'misses': 1}
+    [0. 1. 4.] {'hits': 1, 'misses': 1}
+    [1. 2. 5.] {'hits': 0, 'misses': 1}
+
+    Args:
+        transform: The deterministic transform to cache. It gets an example
+            and returns the transformed example.
+        cache_dir: Directory for the cache.
+        config: The config of the transform. Defaults to
+            `get_transform_config(transform)`.
+        key: Key in the example (or callable) for the identifier of an entry.
+            When segments of an example are transformed, the key has to
+            include the segment boundaries.
+        cache_keys: The (flattened, `.` separated) keys in the output of the
+            transform that are cached. On a hit, only these values are
+            updated in the input example. If `None`, the complete output is
+            cached.
+        max_size: Upper bound for the size of `cache_dir` in bytes. Since
+            complete shards are deleted, it may be exceeded by one shard per
+            writer.
+        shard_size: Size in bytes after which a writer starts a new shard.
+        alignment: Alignment of the arrays in a shard in bytes.
+    """
+    _index_suffix = '.index'
+    _shard_suffix = '.bin'
+
+    def __init__(
+            self,
+            transform: callable,
+            cache_dir: Union[str, Path],
+            *,
+            config: Optional[dict] = None,
+            key: Union[str, callable] = 'example_id',
+            cache_keys: Optional[Sequence[str]] = None,
+            max_size: Optional[int] = None,
+            shard_size: int = 2 ** 30,
+            alignment: int = 64,
+    ):
+        self.transform = transform
+        if config is None:
+            config = get_transform_config(transform)
+        self.config = config
+        self.config_hash = _config_hash(config)
+        self.cache_dir = Path(cache_dir)
+        self.key = key
+        self.cache_keys = None if cache_keys is None else tuple(cache_keys)
+        self.max_size = max_size
+        self.shard_size = shard_size
+        self.alignment = alignment
+
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        config_file = self.storage_dir / 'config.json'
+        if not config_file.exists():
+            tmp_file = config_file.with_name(f'{uuid.uuid4().hex}.tmp')
+            tmp_file.write_text(json.dumps(
+                config, sort_keys=True, indent=4, default=_json_default))
+            os.replace(tmp_file, config_file)
+
+        self.statistics = {'hits': 0, 'misses': 0}
+        self._init_state()
+
+    @property
+    def storage_dir(self) -> Path:
+        return self.cache_dir / self.config_hash
+
+    def _init_state(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._index_positions = {}
+        self._memmaps = {}
+        self._writers = {}
+
+    def __getstate__(self):
+        # File handles, memmaps and locks cannot be shared between processes.
+        state = self.__dict__.copy()
+        for k in ['_lock', '_entries', '_index_positions', '_memmaps',
+                  '_writers']:
+            del state[k]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}({self.transform!r}, '
+            f'{str(self.storage_dir)!r})'
+        )
+
+    def _get_key(self, example) -> str:
+        if callable(self.key):
+            return str(self.key(example))
+        return str(example[self.key])
+
+    def _refresh_index(self):
+        """Reads the index lines that were appended since the last call."""
+        for index_file in self.storage_dir.glob(f'*{self._index_suffix}'):
+            position = self._index_positions.get(index_file.name, 0)
+            try:
+                with open(index_file, 'rb') as fd:
+                    fd.seek(position)
+                    lines = fd.read()
+            except FileNotFoundError:
+                continue
+            # Ignore an incomplete last line of a concurrent writer
+            end = lines.rfind(b'\n') + 1
+            for line in lines[:end].splitlines():
+                entry = json.loads(line)
+                self._entries[entry['key']] = entry
+            self._index_positions[index_file.name] = position + end
+
+    def _drop_shard(self, shard):
+        self._memmaps.pop(shard, None)
+        self._index_positions.pop(
+            shard[:-len(self._shard_suffix)] + self._index_suffix, None)
+        self._entries = {
+            k: v for k, v in self._entries.items() if v['shard'] != shard
+        }
+
+    def _get_memmap(self, shard, size):
+        memmap = self._memmaps.get(shard)
+        if memmap is None or len(memmap) < size:
+            # The shard may have grown since it was mapped.
+            memmap = np.memmap(self.storage_dir / shard, dtype=np.uint8,
+                               mode='r')
+            self._memmaps[shard] = memmap
+        return memmap
+
+    def _load(self, entry) -> dict:
+        end = max([
+            offset + int(np.prod(shape)) * np.dtype(dtype).itemsize
+            for _, offset, dtype, shape in entry['arrays']
+        ] + [sum(entry['pickle'])])
+        memmap = self._get_memmap(entry['shard'], end)
+        data = {
+            tuple(path): np.ndarray(
+                shape, dtype=dtype, buffer=memmap, offset=offset)
+            for path, offset, dtype, shape in entry['arrays']
+        }
+        offset, size = entry['pickle']
+        data.update(pickle.loads(memmap[offset:offset + size]))
+        return data
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns the flat cached data (keys are tuples) of `key` or `None`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._refresh_index()
+                entry = self._entries.get(key)
+            if entry is None:
+                return None
+            try:
+                return self._load(entry)
+            except FileNotFoundError:
+                # The shard was evicted by another writer
+                self._drop_shard(entry['shard'])
+                return None
+
+    def _get_writer(self):
+        writer_id = (os.getpid(), threading.get_ident())
+        writer = self._writers.get(writer_id)
+        if writer is None or writer['shard_fd'].tell() >= self.shard_size:
+            if writer is not None:
+                writer['shard_fd'].close()
+                writer['index_fd'].close()
+            name = f'shard-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+            writer = {
+                'shard': name + self._shard_suffix,
+                'shard_fd': open(
+                    self.storage_dir / (name + self._shard_suffix), 'ab'),
+                'index_fd': open(
+                    self.storage_dir / (name + self._index_suffix), 'ab'),
+            }
+            self._writers[writer_id] = writer
+            self.evict()
+        return writer
+
+    def _write_aligned(self, fd, data) -> int:
+        padding = -fd.tell() % self.alignment
+        if padding:
+            fd.write(b'\0' * padding)
+        offset = fd.tell()
+        fd.write(data)
+        return offset
+
+    def put(self, key: str, data: dict):
+        """Stores the flat `data` (keys are tuples) for `key`."""
+        arrays = {
+            path: value for path, value in data.items()
+            if isinstance(value, np.ndarray) and value.dtype != object
+        }
+        others = {
+            path: value for path, value in data.items()
+            if path not in arrays
+        }
+        writer = self._get_writer()
+        fd = writer['shard_fd']
+        entry = {'key': key, 'shard': writer['shard'], 'arrays': []}
+        for path, array in arrays.items():
+            offset = self._write_aligned(
+                fd, memoryview(np.ascontiguousarray(array)).cast('B'))
+            entry['arrays'].append(
+                [list(path), offset, array.dtype.str, list(array.shape)])
+        others = pickle.dumps(others, protocol=pickle.HIGHEST_PROTOCOL)
+        entry['pickle'] = [self._write_aligned(fd, others), len(others)]
+        # The data has to be on disk, before the index points to it.
+        fd.flush()
+        writer['index_fd'].write(json.dumps(entry).encode() + b'\n')
+        writer['index_fd'].flush()
+
+    def evict(self):
+        """
+        Deletes complete shards until the size of `cache_dir` is below
+        `max_size`. Shards of other configs are deleted first, then the
+        oldest shards. The shards of the active writers are kept.
+        """
+        if self.max_size is None:
+            return
+        active = {
+            self.storage_dir / writer['shard']
+            for writer in self._writers.values()
+        }
+        shards = []
+        for shard in self.cache_dir.glob(f'*/*{self._shard_suffix}'):
+            try:
+                stat = shard.stat()
+            except FileNotFoundError:
+                continue
+            shards.append((
+                shard.parent.name == self.config_hash, stat.st_mtime,
+                stat.st_size, shard
+            ))
+        total = sum([size for _, _, size, _ in shards])
+        for _, _, size, shard in sorted(shards):
+            if total <= self.max_size:
+                break
+            if shard in active:
+                continue
+            for file in [shard, shard.with_suffix(self._index_suffix)]:
+                try:
+                    file.unlink()
+                except FileNotFoundError:
+                    pass
+            if shard.parent == self.storage_dir:
+                self._drop_shard(shard.name)
+            total -= size
+
+    def _select(self, example) -> dict:
+        flat = flatten(example, sep=None)
+        if self.cache_keys is None:
+            return flat
+        cache_keys = [tuple(k.split('.')) for k in self.cache_keys]
+        return {
+            path: value for path, value in flat.items()
+            if any([path[:len(k)] == k for k in cache_keys])
+        }
+
+    def __call__(self, example):
+        key = self._get_key(example)
+        data = self.get(key)
+        if data is not None:
+            self.statistics['hits'] += 1
+            if self.cache_keys is None:
+                return deflatten(data, sep=None)
+            flat = flatten(example, sep=None)
+            flat.update(data)
+            return deflatten(flat, sep=None)
+
+        self.statistics['misses'] += 1
+        example = self.transform(example)
+        data = self._select(example)
+        with self._lock:
+            self.put(key, data)
+        return example
@@ -0,0 +1,271 @@
+"""
+Bridge from `lazy_dataset` pipelines to `torch.utils.data.DataLoader`, to
+use features like `pin_memory`, persistent workers and `prefetch_factor`
+without hand-rolled wrappers.
+"""
+import copy
+import itertools
+import random
+import warnings
+
+import numpy as np
+import torch
+from lazy_dataset import FilterException
+
+from padertorch.data.batch import example_to_device
+
+__all__ = [
+    'as_dataloader',
+]
+
+
+class _Filtered:
+    """Marker for an example that raised a `FilterException`."""
+    def __repr__(self):
+        return '<filtered>'
+
+    def __reduce__(self):
+        # Unpickles to the singleton, e.g. when sent from a worker
+        return '_FILTERED'
+
+
+_FILTERED = _Filtered()
+
+
+class _MapDataset(torch.utils.data.Dataset):
+    def __init__(self, dataset, catch_filter_exception):
+        self.dataset = dataset
+        self.catch_filter_exception = catch_filter_exception
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        try:
+            return self.dataset[index]
+        except FilterException:
+            if self.catch_filter_exception:
+                return _FILTERED
+            raise
+
+
+def _shard(dataset, num_shards, shard_index):
+    """
+    Shards the outermost indexable dataset in the pipeline of `dataset` and
+    applies the following non-indexable steps (e.g. `filter` or `unbatch`)
+    to the shard. Returns None, when the pipeline has no indexable prefix
+    or a step has multiple inputs.
+
+    >>> import lazy_dataset
+    >>> ds = lazy_dataset.new(list(range(10))).map(lambda x: [x, x]).unbatch()
+    >>> list(_shard(ds, 3, 1))
+    [1, 1, 4, 4, 7, 7]
+    """
+    if dataset.indexable:
+        return dataset[shard_index::num_shards]
+    input_dataset = getattr(dataset, 'input_dataset', None)
+    if input_dataset is None:
+        return None
+    sharded = _shard(input_dataset, num_shards, shard_index)
+    if sharded is None:
+        return None
+    dataset = copy.copy(dataset)
+    dataset.input_dataset = sharded
+    return dataset
+
+
+class _IterableDataset(torch.utils.data.IterableDataset):
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.shardable = _shard(dataset, 1, 0) is not None
+
+    def __iter__(self):
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is None:
+            return iter(self.dataset)
+        if self.shardable:
+            # Each worker only computes the transforms of its own examples
+            return iter(_shard(
+                self.dataset, worker_info.num_workers, worker_info.id))
+        # Each worker iterates over the whole dataset and yields every
+        # num_workers-th example. The skipped examples are only computed,
+        # when the dataset cannot skip them.
+        return itertools.islice(
+            self.dataset, worker_info.id, None, worker_info.num_workers)
+
+
+class _Collate:
+    def __init__(self, collate_fn, batched, to_tensor):
+        self.collate_fn = collate_fn
+        self.batched = batched
+        self.to_tensor = to_tensor
+
+    def __call__(self, batch):
+        if self.batched:
+            batch = [example for example in batch if example is not _FILTERED]
+            if len(batch) == 0:
+                return _FILTERED
+        elif batch is _FILTERED:
+            return _FILTERED
+        if self.collate_fn is not None:
+            batch = self.collate_fn(batch)
+        if self.to_tensor:
+            # Only tensors can be pinned
+            batch = example_to_device(batch)
+        return batch
+
+
+def _seed(seed):
+    seed = seed % 2 ** 32
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+class _SeedWorker:
+    """Seeds the worker and calls the `worker_init_fn` of the user."""
+    def __init__(self, worker_init_fn=None):
+        self.worker_init_fn = worker_init_fn
+
+    def __call__(self, worker_id):
+        # torch seeds each worker with base_seed + worker_id, where base_seed
+        # is drawn from the generator of the DataLoader.
+        _seed(torch.initial_seed())
+        if self.worker_init_fn is not None:
+            self.worker_init_fn(worker_id)
+
+
+class _DataLoader(torch.utils.data.DataLoader):
+    def __iter__(self):
+        if self.num_workers == 0 and self.generator is not None:
+            # Without workers, the main process is seeded for each epoch
+            _seed(int(torch.empty((), dtype=torch.int64).random_(
+                generator=self.generator)))
+        for batch in super().__iter__():
+            if batch is not _FILTERED:
+                yield batch
+
+
+def as_dataloader(
+        dataset,
+        batch_size=None,
+        *,
+        shuffle=False,
+        collate_fn=None,
+        num_workers=0,
+        pin_memory=False,
+        persistent_workers=False,
+        prefetch_factor=None,
+        drop_last=False,
+        seed=None,
+        catch_filter_exception=True,
+        **kwargs,
+):
+    """
+    Wraps a `lazy_dataset.Dataset` into a `torch.utils.data.DataLoader`.
+
+    Indexable datasets become a map-style `torch.utils.data.Dataset`, so the
+    DataLoader distributes the indices to the workers and can shuffle and
+    batch. Other datasets become a `torch.utils.data.IterableDataset`, where
+    worker `i` of `n` processes every `n`-th example of the outermost
+    indexable dataset in the pipeline, i.e. the steps that make the dataset
+    non-indexable (e.g. `filter`, `unbatch` or `shuffle(reshuffle=True)`)
+    are applied to the shard of each worker. When the pipeline has no
+    indexable prefix, each worker iterates over the whole dataset and
+    yields every `n`-th example. In that case, the dataset must iterate in
+    the same order in all workers and each worker computes the transforms
+    of all examples, hence a warning is raised. Prefer to batch with the
+    DataLoader, so that the dataset stays indexable.
+
+    The workers seed `numpy.random` and `random` with the seed that torch
+    draws for each worker, i.e. the random transforms are different in each
+    worker and epoch and reproducible with `seed`. Without workers and with
+    `seed`, the main process is seeded in each epoch.
+
+    Examples of indexable datasets that raise a `lazy_dataset.FilterException`
+    (e.g. in `Segmenter`) are dropped, so batches can be smaller than
+    `batch_size`. A `FilterException` stops the iteration of other datasets,
+    use `dataset.catch()` before the dataset loses the ability to index.
+
+    >>> import lazy_dataset
+    >>> def transform(example):
+    ...     if example % 3 == 0:
+    ...         raise FilterException()
+    ...     return np.array([example])
+    >>> dataset = lazy_dataset.new(list(range(8))).map(transform)
+    >>> for batch in as_dataloader(dataset, batch_size=3, collate_fn=np.concatenate):
+    ...     print(batch)
+    [1 2]
+    [4 5]
+    [7]
+
+    Args:
+        dataset: `lazy_dataset.Dataset`
+        batch_size: If not None, the DataLoader creates lists of
+            `batch_size` examples. Only supported for indexable datasets.
+            With `None`, each element of `dataset` is one batch.
+        shuffle: Shuffle the indices in each epoch. Only supported for
+            indexable datasets.
+        collate_fn: Applied in the workers to each element (batch_size=None)
+            or each list of examples. The default is no collation, in
+            contrast to the DataLoader which converts to tensors.
+        num_workers: See `torch.utils.data.DataLoader`.
+        pin_memory: See `torch.utils.data.DataLoader`. The numpy arrays in a
+            batch are converted to tensors in the workers, because only
+            tensors can be pinned.
+        persistent_workers: See `torch.utils.data.DataLoader`.
+        prefetch_factor: See `torch.utils.data.DataLoader`.
+        drop_last: See `torch.utils.data.DataLoader`.
+        seed: Seed for the shuffling and the worker seeds.
+        catch_filter_exception: Whether to drop examples of indexable
+            datasets that raise a `FilterException`.
+        **kwargs: Forwarded to `torch.utils.data.DataLoader`, e.g. a
+            `batch_sampler` like `padertorch.data.LengthBucketBatchSampler`.
+            A `worker_init_fn` is called after the worker is seeded.
+
+    Returns:
+        `torch.utils.data.DataLoader`
+    """
+    batched = batch_size is not None or 'batch_sampler' in kwargs
+    if dataset.indexable:
+        torch_dataset = _MapDataset(dataset, catch_filter_exception)
+    else:
+        assert not batched and not shuffle, (
+            'Batching and shuffling with the DataLoader requires an '
+            'indexable dataset. Use dataset.batch and dataset.shuffle.',
+            batch_size, shuffle, dataset,
+        )
+        torch_dataset = _IterableDataset(dataset)
+        if num_workers > 0 and not torch_dataset.shardable:
+            warnings.warn(
+                f'The pipeline of {dataset!r} has no indexable prefix that '
+                f'can be sharded, so each of the {num_workers} workers '
+                f'computes the transforms of all examples. Start the pipeline '
+                f'with an indexable dataset, e.g. from lazy_dataset.new.'
+            )
+
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+
+    if 'batch_sampler' in kwargs:
+        # Mutually exclusive with batch_size in the DataLoader
+        batch_size = 1
+
+    if num_workers > 0:
+        kwargs['persistent_workers'] = persistent_workers
+        if prefetch_factor is not None:
+            kwargs['prefetch_factor'] = prefetch_factor
+
+    return _DataLoader(
+        torch_dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        collate_fn=_Collate(collate_fn, batched, to_tensor=pin_memory),
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        drop_last=drop_last,
+        worker_init_fn=_SeedWorker(kwargs.pop('worker_init_fn', None)),
+        generator=generator,
+        **kwargs,
+    )
@@ -0,0 +1,225 @@
+"""
+Per-stage profiling of data pipelines. `time_per_data_loading` of the
+trainer only shows that the data loading is slow, the `DataProfiler` shows
+which stage (e.g. audio decoding, resampling, STFT, segmentation, collate)
+is responsible:
+
+    profiler = DataProfiler()
+    dataset = dataset.map(profiler('audio_reader', audio_reader))
+    dataset = dataset.map(profiler('stft', stft))
+    dataset = dataset.batch(8).map(profiler('collate', collate_fn))
+    dataset = dataset.prefetch(4, 8, backend='concurrent_mp')
+
+The durations are recorded in the process that executes the stage. Forked
+worker processes send them to the main process, where the `SummaryHook`
+collects them and reports the call count, the mean and some percentiles
+under `training_timings/data/<stage>`. The pending durations of a worker
+are sent, when the worker exits. Workers that are not forked from the
+process that created the profiler (e.g. the 'spawn' start method) do not
+report.
+
+Use a profiler with `name='validation'` for the validation pipeline. Its
+durations are reported by the `ValidationHook` under
+`validation_timings/data/<stage>` and do not mix with the training
+durations.
+"""
+import atexit
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+import uuid
+import weakref
+from collections import defaultdict
+
+import numpy as np
+
+__all__ = [
+    'DataProfiler',
+    'pop_timings',
+    'summarize_timings',
+]
+
+# Profilers of this process (and of the parent, when forked), by id.
+_PROFILERS = {}
+# Process, where the flush at exit is registered
+_FLUSH_AT_EXIT_PID = None
+
+
+class _ProfilerState:
+    def __init__(self, name):
+        self.name = name
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.last_flush = time.perf_counter()
+        # Sends the durations from forked workers to the main process
+        self.queue = multiprocessing.Queue()
+
+    def flush(self):
+        """Sends the durations of a worker to the main process."""
+        with self.lock:
+            if self.pid != os.getpid() and self.durations:
+                self.queue.put(dict(self.durations))
+                self.durations.clear()
+            self.last_flush = time.perf_counter()
+
+    def pop(self):
+        with self.lock:
+            durations = dict(self.durations)
+            self.durations = defaultdict(list)
+        while True:
+            try:
+                worker_durations = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            for stage, values in worker_durations.items():
+                durations[stage] = durations.get(stage, []) + values
+        return durations
+
+
+def _after_fork_in_child():
+    # Do not send the durations of the parent again
+    for state in _PROFILERS.values():
+        state.lock = threading.Lock()
+        state.durations = defaultdict(list)
+        state.last_flush = time.perf_counter()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _flush_all():
+    for state in list(_PROFILERS.values()):
+        state.flush()
+
+
+def _register_flush_at_exit():
+    global _FLUSH_AT_EXIT_PID
+    if _FLUSH_AT_EXIT_PID != os.getpid():
+        _FLUSH_AT_EXIT_PID = os.getpid()
+        # multiprocessing workers leave with os._exit and only run the
+        # finalizers of multiprocessing, other processes run atexit. The
+        # priority is higher than the one of the join of the queue thread.
+        multiprocessing.util.Finalize(None, _flush_all, exitpriority=10)
+        atexit.register(_flush_all)
+
+
+class _ProfiledFunction:
+    def __init__(self, profiler, stage, fn):
+        self.profiler = profiler
+        self.stage = stage
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            self.profiler.record(self.stage, time.perf_counter() - start)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.stage!r}, {self.fn!r})'
+
+
+class DataProfiler:
+    """
+    Records the durations of the stages of a data pipeline.
+
+    >>> profiler = DataProfiler()
+    >>> fn = profiler('double', lambda x: 2 * x)
+    >>> [fn(i) for i in range(3)]
+    [0, 2, 4]
+    >>> timings = profiler.pop_timings()
+    >>> timings['double'].shape
+    (3,)
+    >>> sorted(summarize_timings(timings).keys())
+    ['data/double/count', 'data/double/mean', 'data/double/p50', 'data/double/p90', 'data/double/p99']
+
+    Args:
+        flush_interval: Minimum time in seconds between two transfers of
+            the durations from a worker process to the main process.
+        name: Name of the pipeline, e.g. 'training' or 'validation'. The
+            hooks only report the durations of the profilers with their
+            `summary_prefix` as name.
+    """
+    def __init__(self, flush_interval=1., name='training'):
+        self.id = uuid.uuid4().hex
+        self.flush_interval = flush_interval
+        self.name = name
+        _PROFILERS[self.id] = _ProfilerState(name)
+        weakref.finalize(self, _PROFILERS.pop, self.id, None)
+
+    def __getstate__(self):
+        # Forked workers find the queue in `_PROFILERS`
+        return {
+            'id': self.id, 'flush_interval': self.flush_interval,
+            'name': self.name,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __call__(self, stage, fn):
+        """Wraps `fn`, so that the duration of each call is recorded."""
+        return _ProfiledFunction(self, stage, fn)
+
+    def record(self, stage, duration):
+        state = _PROFILERS.get(self.id)
+        if state is None:
+            return
+        with state.lock:
+            state.durations[stage].append(duration)
+            in_worker = state.pid != os.getpid()
+            flush = in_worker and (
+                time.perf_counter() - state.last_flush > self.flush_interval)
+        if in_worker:
+            _register_flush_at_exit()
+        if flush:
+            state.flush()
+
+    def pop_timings(self):
+        """
+        Returns the durations that were recorded since the last call, as a
+        dict from the stage to an array of durations in seconds.
+        """
+        state = _PROFILERS.get(self.id)
+        if state is None:
+            return {}
+        return {
+            stage: np.array(values) for stage, values in state.pop().items()
+        }
+
+
+def pop_timings(name=None):
+    """
+    Calls `pop_timings` of all `DataProfiler`s of this process, or of the
+    profilers with the `name`, e.g. 'training'.
+    """
+    timings = defaultdict(list)
+    for state in list(_PROFILERS.values()):
+        if name is not None and state.name != name:
+            continue
+        for stage, durations in state.pop().items():
+            timings[stage].extend(durations)
+    return {
+        stage: np.array(durations) for stage, durations in timings.items()
+    }
+
+
+def summarize_timings(timings, prefix='data'):
+    """
+    Computes the call count, the mean and the 50th, 90th and 99th
+    percentile of the durations of each stage.
+    """
+    summary = {}
+    for stage, durations in timings.items():
+        if len(durations) == 0:
+            continue
+        summary[f'{prefix}/{stage}/count'] = np.float64(len(durations))
+        summary[f'{prefix}/{stage}/mean'] = np.mean(durations)
+        for p in [50, 90, 99]:
+            summary[f'{prefix}/{stage}/p{p}'] = np.percentile(durations, p)
+    return summary
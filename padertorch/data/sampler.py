@@ -0,0 +1,263 @@
+import copy
+from dataclasses import dataclass, field
+from typing import Union, Optional, Sequence
+
+import numpy as np
+import lazy_dataset
+
+__all__ = [
+    'LengthBucketBatchSampler',
+]
+
+
+class _GatherBatch:
+    """Maps a list of indices to the list of examples of `dataset`."""
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __call__(self, indices):
+        return [self.dataset[int(index)] for index in indices]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.dataset!r})'
+
+
+@dataclass
+class LengthBucketBatchSampler:
+    """
+    Forms batches from a precomputed length index, such that the size of the
+    padded batch (i.e. `batch_size * max(lengths)`) does not exceed
+    `max_total_length`. In contrast to `Sorter`, which sorts within an
+    already formed batch, this sampler decides which examples form a batch.
+
+    The examples are sorted by their length and split into `num_buckets`
+    buckets with (nearly) the same number of examples. Each bucket is
+    greedily split into batches. Each time new batches are requested (i.e.
+    each epoch), the examples within a bucket and the order of all batches
+    are shuffled, if enabled.
+
+    The sampler can be applied lazily to an indexable `lazy_dataset`, before
+    the expensive transforms are mapped:
+        `dataset.apply(sampler, lazy=True).map(transform).map(collate_fn)`
+    Alternatively, iterating over the sampler yields lists of indices, hence
+    it can be used as `batch_sampler` of a `torch.utils.data.DataLoader`.
+    In that case, the sampler does not see the dataset, so `dataset` has to
+    be given, when `lengths` is a key, callable or dict.
+
+    Examples:
+        >>> lengths = [5, 1, 9, 3, 4, 2, 8, 7]
+        >>> sampler = LengthBucketBatchSampler(
+        ...     lengths, max_total_length=16, num_buckets=1,
+        ...     shuffle_within_buckets=False, shuffle_batches=False)
+        >>> [[lengths[i] for i in b] for b in sampler.batches()]
+        [[1, 2, 3, 4], [5, 7], [8], [9]]
+        >>> print(f'{sampler.padding_ratio:.3f}')
+        0.170
+
+        >>> import lazy_dataset
+        >>> ds = lazy_dataset.new({
+        ...     f'ex{i}': {'num_samples': n} for i, n in enumerate(lengths)})
+        >>> sampler = LengthBucketBatchSampler(
+        ...     'num_samples', max_total_length=16, num_buckets=1,
+        ...     shuffle_within_buckets=False, seed=0)
+        >>> batched = ds.apply(sampler, lazy=True)
+        >>> sorted([[ex['num_samples'] for ex in b] for b in batched])
+        [[1, 2, 3, 4], [5, 7], [8], [9]]
+
+    Attributes:
+        lengths: The length index. Either a sequence of lengths that is
+            aligned with the indices of the dataset, a dict that maps the
+            `example_id` (i.e. the keys of the dataset) to the length, or a
+            key or callable that is used to read the length from each
+            example. The latter reads the length from the (not yet
+            transformed) examples, e.g., `num_samples` from the database
+            JSON, once at the first call and caches it.
+        max_total_length: Budget of a batch in samples or frames (the unit
+            of `lengths`). A batch is closed, when adding the next example
+            would let `batch_size * max(lengths)` exceed this value. Examples
+            that are longer than the budget form a batch of size one.
+        max_batch_size: Optional upper bound for the number of examples in a
+            batch.
+        min_batch_size: Batches with less examples are dropped.
+        num_buckets: Number of buckets with (nearly) equal number of
+            examples. Examples are only batched with examples from the same
+            bucket. More buckets mean less padding, but less randomness.
+        shuffle_within_buckets: Whether to shuffle the examples within each
+            bucket before they are split into batches. If `False`, the
+            examples in each bucket are sorted by length, which minimizes
+            the padding.
+        shuffle_batches: Whether to shuffle the order of the batches
+            across all buckets.
+        seed: Seed for the random number generator. Each call of `batches`
+            draws from the same generator, so consecutive epochs differ, but
+            are reproducible.
+        dataset: Optional dataset to resolve `lengths` at construction,
+            e.g. for the use as `batch_sampler`.
+    """
+    lengths: Union[Sequence[int], dict, str, callable]
+    max_total_length: int
+    max_batch_size: Optional[int] = None
+    min_batch_size: int = 1
+    num_buckets: int = 10
+    shuffle_within_buckets: bool = True
+    shuffle_batches: bool = True
+    seed: Optional[int] = None
+    dataset: Optional[Sequence] = field(default=None, repr=False)
+
+    statistics: dict = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        assert self.max_total_length > 0, self.max_total_length
+        assert self.num_buckets >= 1, self.num_buckets
+        assert self.min_batch_size >= 1, self.min_batch_size
+        if self.max_batch_size is not None:
+            assert self.max_batch_size >= self.min_batch_size, (
+                self.max_batch_size, self.min_batch_size)
+        self._rng = np.random.RandomState(self.seed)
+        self._length_index = None
+        if self.dataset is not None:
+            self._get_length_index(self.dataset)
+
+    @property
+    def padding_ratio(self) -> float:
+        """
+        Fraction of padded values in the batches of the last call of
+        `batches`, i.e. `1 - sum(lengths) / sum(batch_size * max(lengths))`.
+        """
+        return self.statistics['padding_ratio']
+
+    def _get_length_index(self, dataset=None) -> np.ndarray:
+        if self._length_index is not None:
+            if dataset is not None:
+                assert len(self._length_index) == len(dataset), (
+                    'The dataset changed after the length index was '
+                    'computed.', len(self._length_index), len(dataset)
+                )
+            return self._length_index
+
+        lengths = self.lengths
+        if dataset is None and (
+                isinstance(lengths, (dict, str)) or callable(lengths)):
+            raise ValueError(
+                f'A dataset is required to resolve the lengths {lengths!r}. '
+                f'Apply the sampler to the dataset or pass `dataset` to the '
+                f'sampler, e.g., when it is used as batch_sampler of a '
+                f'torch DataLoader.'
+            )
+        if isinstance(lengths, dict):
+            lengths = [lengths[key] for key in dataset.keys()]
+        elif isinstance(lengths, str) or callable(lengths):
+            if isinstance(lengths, str):
+                key = lengths
+
+                def lengths(example):
+                    return example[key]
+
+            lengths = [lengths(example) for example in dataset]
+
+        lengths = np.asarray(lengths)
+        assert lengths.ndim == 1, lengths.shape
+        assert np.issubdtype(lengths.dtype, np.integer), lengths.dtype
+        self._length_index = lengths
+        return lengths
+
+    def _split_bucket(self, bucket, lengths):
+        batches = []
+        batch = []
+        batch_max_length = 0
+        for index, length in zip(bucket.tolist(), lengths[bucket].tolist()):
+            max_length = max(batch_max_length, length)
+            if batch and (
+                    (len(batch) + 1) * max_length > self.max_total_length
+                    or len(batch) == self.max_batch_size
+            ):
+                batches.append(batch)
+                batch = []
+                max_length = length
+            batch.append(index)
+            batch_max_length = max_length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def batches(self, dataset=None) -> list:
+        """
+        Forms the batches for one epoch.
+
+        Args:
+            dataset: The dataset that the indices refer to. Only required,
+                if `lengths` has to be resolved with the dataset.
+
+        Returns:
+            List of lists of indices.
+        """
+        lengths = self._get_length_index(dataset)
+        batches = self._form_batches(lengths, self._rng)
+        self.statistics = self._get_statistics(batches)
+        return batches
+
+    def _form_batches(self, lengths, rng):
+        # Sorting a random permutation with a stable sort breaks ties
+        # randomly.
+        if self.shuffle_within_buckets or self.shuffle_batches:
+            order = rng.permutation(len(lengths))
+        else:
+            order = np.arange(len(lengths))
+        order = order[np.argsort(lengths[order], kind='stable')]
+
+        batches = []
+        for bucket in np.array_split(order, self.num_buckets):
+            if self.shuffle_within_buckets:
+                bucket = rng.permutation(bucket)
+            batches.extend(self._split_bucket(bucket, lengths))
+
+        batches = [b for b in batches if len(b) >= self.min_batch_size]
+
+        if self.shuffle_batches:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        return batches
+
+    def _get_statistics(self, batches):
+        lengths = self._length_index
+        num_values = sum([lengths[b].sum() for b in batches])
+        num_padded_values = sum([len(b) * lengths[b].max() for b in batches])
+        return {
+            'num_batches': len(batches),
+            'num_examples': sum([len(b) for b in batches]),
+            'mean_batch_size': (
+                np.mean([len(b) for b in batches]) if batches else 0.
+            ),
+            'padding_ratio': (
+                1 - num_values / num_padded_values
+                if num_padded_values > 0 else 0.
+            ),
+        }
+
+    def __iter__(self):
+        return iter(self.batches())
+
+    def __len__(self):
+        """
+        Number of batches of the last epoch. The number may change between
+        epochs, when `shuffle_within_buckets` is enabled. Before the first
+        epoch, it is the number of batches of the first epoch, which is
+        computed from a copy of the random state, so `len` does not change
+        the batches.
+        """
+        if not self.statistics:
+            return len(self._form_batches(
+                self._get_length_index(self.dataset), copy.deepcopy(self._rng)
+            ))
+        return self.statistics['num_batches']
+
+    def __call__(self, dataset):
+        """
+        Creates a dataset of batches (lists of examples) from the indexable
+        `dataset`. Use it with `dataset.apply(sampler, lazy=True)`, to form
+        new batches for each iteration over the dataset.
+        """
+        batches = self.batches(dataset)
+        return lazy_dataset.from_list(
+            batches, immutable_warranty='copy'
+        ).map(_GatherBatch(dataset))
@@ -96,7 +96,18 @@ class Segmenter:
             choice for evaluation.
             If `False` the residual values are disgarded.
         flatten_separator: specifies the separator used to separate the keys
-            in the flattened dictionary. Defaults to `.`
+            in the flattened dictionary. Defaults to `.`. The output examples
+            are deflattened with the same separator.
+        batched: If `True`, a single example is returned instead of a list,
+            where each segmented value has the shape
+            `(num_segments, ..., length, ...)` and `segment_start` and
+            `segment_stop` are arrays. Without `padding` the segmented values
+            are strided views of the input arrays.
+
+    The segments are views (basic slices) of the input arrays, only the
+    zero padded tail segments (`padding=True`) are copies. The values that
+    are not segmented are shared between all output examples, i.e. they are
+    not copied. Hence, do not modify them inplace.
     """
 
     def __init__(self, length: int = -1, shift: int = None,
@@ -107,7 +118,8 @@ class Segmenter:
                  anchor: Union[int, str] = 'left',
                  mode: 'str' = 'constant',
                  padding: bool = False,
-                 flatten_separator: str = '.'):
+                 flatten_separator: str = '.',
+                 batched: bool = False):
 
         self.include = None if include_keys is None else to_list(include_keys)
         self.exclude = [] if exclude_keys is None else to_list(exclude_keys)
@@ -151,8 +163,11 @@ class Segmenter:
             assert anchor in [0, 'left'], (padding, anchor)
         self.padding = padding
         self.flatten_separator = flatten_separator
+        self.batched = batched
 
-    def __call__(self, example: dict, rng=np.random) -> List[dict]:
+    def __call__(
+            self, example: dict, rng=np.random
+    ) -> Union[List[dict], dict]:
         """
 
         Args:
@@ -161,6 +176,8 @@ class Segmenter:
                 paderbox.utils.random_utils.str_to_random_state
 
         Returns:
+            List of segmented examples or, if `batched` is `True`, a single
+            example with all segments stacked along the first axis.
         """
 
         example = flatten(example, sep=self.flatten_separator)
@@ -212,23 +229,168 @@ class Segmenter:
 
         # Shortcut if segmentation is disabled
         if self.length == -1:
+            if self.batched:
+                # A single segment, stacked like the segments of `length > 0`
+                to_copy.update({
+                    key: value[None] for key, value in to_segment.items()})
+                to_copy.update(
+                    segment_start=np.array([0]),
+                    segment_stop=np.array([to_segment_length]),
+                )
+                return deflatten(to_copy, sep=self.flatten_separator)
             to_copy.update(to_segment)
             to_copy.update(segment_start=0, segment_stop=to_segment_length)
-            return [deflatten(to_copy)]
+            return [deflatten(to_copy, sep=self.flatten_separator)]
+
+        # The part of the example that is not segmented is deflattened once
+        # and shared between all segments.
+        shared = deflatten(to_copy, sep=self.flatten_separator)
+        to_segment_paths = [
+            tuple(key.split(self.flatten_separator)) for key in to_segment
+        ]
+
+        if self.batched:
+            boundaries, segmented = self.segment(
+                to_segment, to_segment_length, axis=axis, rng=rng)
+            return _nested_update(shared, {
+                **dict(zip(to_segment_paths, segmented.values())),
+                ('segment_start',): boundaries[:, 0],
+                ('segment_stop',): boundaries[:, 1],
+            })
 
-        boundaries, segmented = self.segment(to_segment, to_segment_length,
-                                             axis=axis, rng=rng)
+        boundaries = self.get_boundaries(to_segment_length, rng=rng)
 
         segmented_examples = list()
-
-        for idx, (start, stop) in enumerate(boundaries):
-            example_copy = copy(to_copy)
-            example_copy.update({key: value[idx]
-                                 for key, value in segmented.items()})
-            example_copy.update(segment_start=start, segment_stop=stop)
-            segmented_examples.append(deflatten(example_copy))
+        for start, stop in boundaries.tolist():
+            segmented_examples.append(_nested_update(shared, {
+                **{
+                    path: _slice_segment(signal, start, stop, axis[i])
+                    for i, (path, signal) in enumerate(
+                        zip(to_segment_paths, to_segment.values()))
+                },
+                ('segment_start',): start,
+                ('segment_stop',): stop,
+            }))
         return segmented_examples
 
+    def plan(
+            self, example: dict, rng=np.random,
+            num_samples_key: str = 'num_samples',
+            start_key: str = 'audio_start_samples',
+            stop_key: str = 'audio_stop_samples',
+    ) -> List[dict]:
+        """
+        Plans the segmentation from the metadata of an example, before the
+        audio is read. The boundaries are calculated with `get_boundaries`
+        from the length at `num_samples_key`, so the random number generator
+        is used in the same way as in `__call__`. Each planned example
+        contains `segment_start` and `segment_stop` and the region that has to
+        be read from disk at `start_key` and `stop_key` (in `AudioReader`
+        style). An offset that is already present at `start_key` is
+        respected.
+
+        Since all keys of an example are read with the same region, e.g.,
+        the observation and the speech sources, they get consistent crops.
+
+        >>> segmenter = Segmenter(length=32000, shift=16000)
+        >>> ex = {'audio_path': {'observation': 'obs.wav'},
+        ...       'num_samples': 65000, 'gender': 'm'}
+        >>> for entry in segmenter.plan(ex):
+        ...     print(entry['audio_start_samples'], entry['audio_stop_samples'])
+        0 32000
+        16000 48000
+        32000 64000
+        >>> ex['audio_start_samples'] = 100
+        >>> segmenter.plan(ex)[0]
+        {'audio_path': {'observation': 'obs.wav'}, 'num_samples': 65000, \
+'gender': 'm', 'audio_start_samples': 100, 'segment_start': 0, \
+'segment_stop': 32000, 'audio_stop_samples': 32100}
+
+        Args:
+            example: dictionary with the metadata of an example.
+            rng: random number generator, see `__call__`.
+            num_samples_key: Key of the length of the signals. Nested keys
+                are separated by `flatten_separator`.
+            start_key: Key for the first sample that should be read.
+            stop_key: Key for the (exclusive) last sample that should be read.
+
+        Returns:
+            List of planned examples. The values are shared with `example`.
+        """
+        assert not self.padding, (
+            'Padding is not supported, when the segmentation is planned. '
+            'Pad the signals after reading them.'
+        )
+        num_samples = flatten(example, sep=self.flatten_separator)[
+            num_samples_key]
+
+        # Discard examples that are shorter than `length`
+        if not self.mode == 'max' and num_samples < self.length:
+            import lazy_dataset
+            raise lazy_dataset.FilterException()
+
+        if self.length == -1:
+            boundaries = [[0, num_samples]]
+        else:
+            boundaries = self.get_boundaries(num_samples, rng=rng).tolist()
+
+        offset = example.get(start_key, 0)
+
+        def add_offset(value):
+            if isinstance(offset, (list, tuple)):
+                return [o + value for o in offset]
+            return offset + value
+
+        planned_examples = list()
+        for start, stop in boundaries:
+            planned = copy(example)
+            planned.update({
+                'segment_start': start,
+                'segment_stop': stop,
+                start_key: add_offset(start),
+                stop_key: add_offset(stop),
+            })
+            planned_examples.append(planned)
+        return planned_examples
+
+    def get_boundaries(self, to_segment_length: int, rng=np.random):
+        """
+        Calculates the segment boundaries for a signal with
+        `to_segment_length` samples. The boundaries only depend on the length
+        of the signal and not on its content, e.g., they can be computed from
+        the `num_samples` in the metadata of an example.
+
+        >>> Segmenter(length=10, shift=5).get_boundaries(24)
+        array([[ 0, 10],
+               [ 5, 15],
+               [10, 20]])
+        >>> Segmenter(length=10, shift=5, padding=True).get_boundaries(24)
+        array([[ 0, 10],
+               [ 5, 15],
+               [10, 20],
+               [15, 25]])
+
+        Returns:
+            Bx2 numpy array with start and end values for B boundaries
+        """
+        length, shift, to_segment_length = _get_segment_length_for_mode(
+            to_segment_length, self.length, self.shift,
+            self.mode, self.padding
+        )
+
+        if isinstance(self.anchor, str):
+            anchor = get_anchor(
+                to_segment_length, length, shift,
+                mode=self.anchor, rng=rng
+            )
+        else:
+            assert isinstance(self.anchor, int), self.anchor
+            anchor = self.anchor
+        return get_segment_boundaries(
+            to_segment_length, length, shift, anchor=anchor,
+            mode='constant', rng=rng
+        )
+
     def segment(self, to_segment: dict, to_segment_length: int,
                 axis: Union[int, list, tuple, dict] = -1, rng=np.random):
         """
@@ -244,6 +406,8 @@ class Segmenter:
         >>> boundaries, segmented = segmenter.segment(ex, 16000, [0, 0])
         >>> len(boundaries), len(segmented['x'])
         (17, 17)
+        >>> np.shares_memory(segmented['x'], ex['x'])
+        True
         >>> ex = {'x': np.arange(16000), 'y': np.arange(16000)}
         >>> segmenter = Segmenter(length=950, include_keys='x',
         ...                       mode='min', padding=True)
@@ -261,27 +425,18 @@ class Segmenter:
         >>> len(boundaries), len(segmented['x'])
         (61, 61)
         """
-        length, shift, to_segment_length = _get_segment_length_for_mode(
-            to_segment_length, self.length, self.shift,
-            self.mode, self.padding
-        )
-
-        if isinstance(self.anchor, str):
-            anchor = get_anchor(
-                to_segment_length, length, shift,
-                mode=self.anchor, rng=rng
-            )
+        if isinstance(axis, int):
+            axis = [axis] * len(to_segment)
+        boundaries = self.get_boundaries(to_segment_length, rng=rng)
+        start, length = boundaries[0, 0], boundaries[0, 1] - boundaries[0, 0]
+        if len(boundaries) > 1:
+            shift = boundaries[1, 0] - start
         else:
-            assert isinstance(self.anchor, int), self.anchor
-            anchor = self.anchor
-        boundaries = get_segment_boundaries(
-            to_segment_length, length, shift, anchor=anchor,
-            mode='constant', rng=rng
-        )
+            shift = length
 
         segmented = {key: segment(
-            signal, length=length, shift=shift, rng=rng, axis=axis[i],
-            anchor=anchor, padding=self.padding, mode='constant'
+            signal, length=int(length), shift=int(shift), axis=axis[i],
+            anchor=int(start), padding=self.padding, mode='constant'
         ) for i, (key, signal) in enumerate(to_segment.items())}
         return boundaries, segmented
 
@@ -333,6 +488,75 @@ class Segmenter:
             raise TypeError('This should never be reached', self.axis)
 
 
+def _nested_update(shared: dict, updates: dict) -> dict:
+    """
+    Returns a shallow copy of the nested dict `shared`, where the values in
+    `updates` are inserted. The keys of `updates` are tuples describing the
+    path in the nested dict. Only the dicts along these paths are copied, all
+    other values are shared with `shared`. Existing values are overwritten,
+    e.g. the `segment_start` of an example that is segmented again, but a
+    nested dict is never replaced by a value or vice versa.
+
+    >>> shared = {'a': {'b': 1}, 'c': [2]}
+    >>> new = _nested_update(shared, {('a', 'd'): 3, ('e',): 4})
+    >>> new
+    {'a': {'b': 1, 'd': 3}, 'c': [2], 'e': 4}
+    >>> shared
+    {'a': {'b': 1}, 'c': [2]}
+    >>> new['c'] is shared['c']
+    True
+    >>> _nested_update(shared, {('a', 'b'): 5})
+    {'a': {'b': 5}, 'c': [2]}
+    """
+    new = copy(shared)
+    copied = {(): new}
+    for path, value in updates.items():
+        for i in range(1, len(path)):
+            if path[:i] not in copied:
+                parent = copied[path[:i - 1]]
+                child = parent.get(path[i - 1], {})
+                assert isinstance(child, dict), f'Conflicting keys! {path}'
+                parent[path[i - 1]] = copied[path[:i]] = copy(child)
+        parent = copied[path[:-1]]
+        assert not isinstance(parent.get(path[-1]), dict), \
+            f'Conflicting keys! {path}'
+        parent[path[-1]] = value
+    return new
+
+
+def _slice_segment(signal, start: int, stop: int, axis: int):
+    """
+    Returns `signal[..., start:stop, ...]` as a view along `axis`. If `stop`
+    exceeds the signal, the segment is zero padded at the end, which creates
+    a copy of the segment.
+
+    >>> _slice_segment(np.arange(10), 2, 5, -1)
+    array([2, 3, 4])
+    >>> _slice_segment(np.arange(6).reshape(3, 2), 1, 4, 0)
+    array([[2, 3],
+           [4, 5],
+           [0, 0]])
+    >>> _slice_segment(torch.arange(4), 2, 6, 0)
+    tensor([2, 3, 0, 0])
+    """
+    ndim = signal.ndim
+    axis = axis % ndim
+    slc = [slice(None)] * ndim
+    slc[axis] = slice(start, stop)
+    segment = signal[tuple(slc)]
+    missing = stop - start - segment.shape[axis]
+    if missing > 0:
+        if isinstance(segment, np.ndarray):
+            pad_width = [(0, 0)] * ndim
+            pad_width[axis] = (0, missing)
+            segment = np.pad(segment, pad_width, mode='constant')
+        else:
+            shape = list(segment.shape)
+            shape[axis] = missing
+            segment = torch.cat([segment, segment.new_zeros(shape)], dim=axis)
+    return segment
+
+
 def _get_rand_int(rng, *args, **kwargs):
     if hasattr(rng, 'randint'):
         return rng.randint(*args, **kwargs)
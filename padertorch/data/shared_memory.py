@@ -0,0 +1,303 @@
+"""
+Shared-memory transport for batches from process-based prefetching (e.g.
+`dataset.prefetch(..., backend='concurrent_mp')`). Without it, every batch
+is pickled in the worker, copied through a pipe and unpickled in the main
+process.
+
+The `SharedMemoryTransport` allocates a pool of shared-memory slabs in the
+main process. Forked workers inherit the slabs, write the arrays of a batch
+into a free slab and return a lightweight `SharedBatch` handle. In the main
+process, the handle becomes numpy views of the slab. The slab is recycled
+after `example_to_device`:
+
+    transport = SharedMemoryTransport(num_slabs=16, slab_size=2**26)
+    dataset = dataset.batch(8).map(collate_fn).map(transport).prefetch(
+        num_workers=4, buffer_size=8, backend='concurrent_mp')
+    for batch in dataset:
+        batch = batch.to_device(device)  # or `example_to_device(batch, device)`
+
+To avoid the copy into the slab, a collate function can allocate the
+stacked arrays directly in the slab with `transport.allocate`, e.g.
+`Collate(leaf_op=StackArrays(allocator=transport.allocate))` from
+`padertorch.contrib.je.data.transforms`.
+
+When no slab is free, a batch does not fit into a slab, or the worker was
+not forked from the process that created the transport (e.g. the 'spawn'
+start method), the batch is returned unchanged and pickled as usual.
+"""
+import multiprocessing
+import os
+import threading
+import uuid
+import weakref
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import torch
+import paderbox as pb
+
+from padertorch.data.batch import example_to_device
+
+__all__ = [
+    'SharedMemoryTransport',
+    'SharedBatch',
+]
+
+# Transports of this process (and of the parent, when forked), by id.
+_TRANSPORTS = {}
+
+
+class _TransportState:
+    def __init__(self, num_slabs, slab_size):
+        self.pid = os.getpid()
+        self.slabs = [
+            SharedMemory(create=True, size=slab_size) for _ in range(num_slabs)
+        ]
+        self.buffers = [
+            np.ndarray(slab_size, dtype=np.uint8, buffer=slab.buf)
+            for slab in self.slabs
+        ]
+        # 1 for slabs that hold a batch in flight
+        self.in_use = multiprocessing.Array('B', num_slabs)
+        self.local = threading.local()
+
+    def acquire(self):
+        with self.in_use.get_lock():
+            for i, in_use in enumerate(self.in_use):
+                if not in_use:
+                    self.in_use[i] = 1
+                    return i
+        return None
+
+    def release(self, slab):
+        with self.in_use.get_lock():
+            self.in_use[slab] = 0
+
+    def address_range(self, slab):
+        start = self.buffers[slab].ctypes.data
+        return start, start + self.buffers[slab].nbytes
+
+
+def _close(transport_id):
+    state = _TRANSPORTS.pop(transport_id, None)
+    if state is not None and state.pid == os.getpid():
+        # Only the creator unlinks the slabs, not the forked workers
+        state.buffers.clear()
+        for slab in state.slabs:
+            try:
+                slab.close()
+            except BufferError:
+                # Views of the slab are still alive, they keep the mapping
+                pass
+            slab.unlink()
+
+
+class _SharedArray:
+    # Not a dataclass or tuple, so that nested_op treats it as leaf
+    def __init__(self, offset, shape, strides, dtype):
+        self.offset = offset
+        self.shape = shape
+        self.strides = strides
+        self.dtype = dtype
+
+
+@dataclass
+class SharedBatch:
+    """
+    Handle of a batch in a slab of a `SharedMemoryTransport`. The arrays of
+    the batch are replaced by offsets into the slab, so pickling the handle
+    is cheap.
+
+    Use it as a context manager or call `release` to recycle the slab.
+    Views of the slab must not be used after the release.
+    """
+    transport_id: str
+    slab: int
+    structure: object
+
+    def _state(self):
+        try:
+            return _TRANSPORTS[self.transport_id]
+        except KeyError:
+            raise RuntimeError(
+                f'The SharedMemoryTransport of this batch is not available '
+                f'in this process (pid {os.getpid()}). Was it closed?'
+            )
+
+    def open(self):
+        """Returns the batch with numpy views of the slab."""
+        buffer = self._state().buffers[self.slab]
+
+        def to_view(value):
+            if isinstance(value, _SharedArray):
+                return np.ndarray(
+                    value.shape, dtype=value.dtype, buffer=buffer,
+                    offset=value.offset, strides=value.strides,
+                )
+            return value
+
+        return pb.utils.nested.nested_op(
+            to_view, self.structure, handle_dataclass=True)
+
+    def release(self):
+        """Returns the slab to the pool of free slabs."""
+        if self.slab is not None:
+            self._state().release(self.slab)
+            self.slab = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def to_device(self, device=None, example_to_device=example_to_device):
+        """
+        Moves the batch to `device` and recycles the slab. Arrays and CPU
+        tensors that still share memory with the slab are copied.
+
+        Args:
+            device: See `padertorch.data.example_to_device`.
+            example_to_device: Function that does the transfer, e.g.
+                `model.example_to_device`.
+        """
+        start, stop = self._state().address_range(self.slab)
+
+        def copy(value):
+            if isinstance(value, torch.Tensor) and value.device.type == 'cpu':
+                if start <= value.data_ptr() < stop:
+                    return value.clone()
+            elif isinstance(value, np.ndarray):
+                if start <= value.__array_interface__['data'][0] < stop:
+                    return value.copy()
+            return value
+
+        with self as example:
+            example = example_to_device(example, device)
+            return pb.utils.nested.nested_op(
+                copy, example, handle_dataclass=True)
+
+
+class SharedMemoryTransport:
+    """
+    Moves the numpy arrays of a batch into a pool of shared-memory slabs
+    and returns a `SharedBatch` handle. See the module docstring.
+
+    >>> transport = SharedMemoryTransport(num_slabs=2, slab_size=2**10)
+    >>> batch = transport({'x': np.arange(4.), 'id': ['a', 'b']})
+    >>> batch.structure['id'], batch.structure['x'].shape
+    (['a', 'b'], (4,))
+    >>> batch.to_device()
+    {'x': tensor([0., 1., 2., 3.], dtype=torch.float64), 'id': ['a', 'b']}
+    >>> transport.close()
+
+    Args:
+        num_slabs: Number of slabs. Should be larger than the number of
+            batches in flight, i.e. the `buffer_size` of the prefetch plus
+            the number of workers. A batch that finds no free slab is
+            returned unchanged.
+        slab_size: Size of a slab in bytes, i.e. the maximum size of the
+            arrays in a batch.
+        alignment: Alignment of the arrays in a slab in bytes.
+    """
+    def __init__(self, num_slabs=16, slab_size=2**26, alignment=64):
+        self.id = uuid.uuid4().hex
+        self.num_slabs = num_slabs
+        self.slab_size = slab_size
+        self.alignment = alignment
+        _TRANSPORTS[self.id] = _TransportState(num_slabs, slab_size)
+        weakref.finalize(self, _close, self.id)
+
+    def __getstate__(self):
+        # Forked workers find the slabs in `_TRANSPORTS`
+        return {
+            'id': self.id, 'num_slabs': self.num_slabs,
+            'slab_size': self.slab_size, 'alignment': self.alignment,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def close(self):
+        """Unlinks the slabs. Only has an effect in the creating process."""
+        _close(self.id)
+
+    def _acquire(self):
+        """Returns the state and the slab of the current batch in this
+        thread or (None, None).
+        """
+        state = _TRANSPORTS.get(self.id)
+        if state is None:
+            return None, None
+        local = state.local
+        if not hasattr(local, 'slab'):
+            local.slab = state.acquire()
+            local.offset = 0
+        return state, local.slab
+
+    def _reserve(self, state, nbytes):
+        local = state.local
+        offset = local.offset + (-local.offset % self.alignment)
+        if offset + nbytes > self.slab_size:
+            return None
+        local.offset = offset + nbytes
+        return offset
+
+    def allocate(self, shape, dtype=np.float64):
+        """
+        Drop-in replacement for `np.zeros` that allocates in the slab of the
+        next batch of this thread. Falls back to `np.zeros`.
+        """
+        state, slab = self._acquire()
+        if slab is not None:
+            dtype = np.dtype(dtype)
+            offset = self._reserve(state, int(np.prod(shape)) * dtype.itemsize)
+            if offset is not None:
+                array = np.ndarray(
+                    shape, dtype=dtype, buffer=state.buffers[slab],
+                    offset=offset,
+                )
+                array[...] = 0
+                return array
+        return np.zeros(shape, dtype=dtype)
+
+    def __call__(self, batch):
+        state, slab = self._acquire()
+        if state is None:
+            return batch
+        del state.local.slab
+        if slab is None:
+            return batch
+        buffer = state.buffers[slab]
+        start, stop = state.address_range(slab)
+        num_shared = 0
+
+        def share(value):
+            nonlocal num_shared
+            if not isinstance(value, np.ndarray) or value.dtype.hasobject:
+                return value
+            address = value.__array_interface__['data'][0]
+            if start <= address < stop:
+                # Allocated with `self.allocate`
+                offset = address - start
+            else:
+                offset = self._reserve(state, value.nbytes)
+                if offset is None:
+                    return value
+                view = np.ndarray(
+                    value.shape, dtype=value.dtype, buffer=buffer,
+                    offset=offset,
+                )
+                view[...] = value
+                value = view
+            num_shared += 1
+            return _SharedArray(
+                offset, value.shape, value.strides, value.dtype.str)
+
+        structure = pb.utils.nested.nested_op(
+            share, batch, handle_dataclass=True)
+        if num_shared == 0:
+            state.release(slab)
+            return batch
+        return SharedBatch(self.id, slab, structure)
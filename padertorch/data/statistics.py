@@ -0,0 +1,328 @@
+"""
+Mergeable accumulators for dataset statistics (e.g. normalization statistics
+or label vocabularies) and a map-reduce pass that computes them over a
+process pool.
+
+>>> examples = [{'example_id': str(i), 'x': np.arange(i + 1.)} for i in range(5)]
+>>> def fn(example):
+...     return {'x': MeanVariance().update(example['x'])}
+>>> statistics = collect_statistics(examples, fn)
+>>> statistics['x'].count, float(statistics['x'].mean)
+(15, 1.3333333333333333)
+"""
+import copy
+import json
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from padertorch.utils import to_list
+
+__all__ = [
+    'MeanVariance',
+    'Maximum',
+    'Counts',
+    'collect_statistics',
+    'load_statistics',
+    'dump_statistics',
+]
+
+
+class _Accumulator:
+    def update(self, value):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError
+
+    def to_json(self):
+        return {
+            'type': self.__class__.__name__,
+            **{
+                k: v.tolist() if isinstance(v, (np.ndarray, np.generic)) else v
+                for k, v in self.__dict__.items()
+            }
+        }
+
+    @classmethod
+    def from_json(cls, state):
+        state = dict(state)
+        assert state.pop('type') == cls.__name__, (cls, state)
+        accumulator = cls()
+        for k, v in state.items():
+            setattr(accumulator, k, np.array(v) if isinstance(v, list) else v)
+        if isinstance(accumulator.axis, np.ndarray):
+            accumulator.axis = tuple(accumulator.axis.tolist())
+        return accumulator
+
+
+class MeanVariance(_Accumulator):
+    """
+    Mean and variance along `axis`. Accumulators of different shards can be
+    merged with the parallel algorithm of Chan et al., a generalization of
+    Welford's algorithm. In contrast to a running sum of squares, this is
+    numerically stable for many values.
+
+    >>> x = np.random.RandomState(0).randn(2, 100)
+    >>> a = MeanVariance(axis=-1).update(x[:, :30])
+    >>> b = MeanVariance(axis=-1).update(x[:, 30:])
+    >>> a = a.merge(b)
+    >>> a.count
+    100
+    >>> np.allclose(a.mean, x.mean(-1, keepdims=True))
+    True
+    >>> np.allclose(a.var, x.var(-1, keepdims=True))
+    True
+    >>> np.allclose(a.power, (x ** 2).mean(-1, keepdims=True))
+    True
+    """
+    def __init__(self, axis=None):
+        self.axis = axis
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    @property
+    def var(self):
+        return self.m2 / max(self.count, 1)
+
+    @property
+    def power(self):
+        """Mean of the squared values."""
+        return self.var + self.mean ** 2
+
+    def update(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        other = MeanVariance(self.axis)
+        keepdims = self.axis is not None
+        other.mean = value.mean(self.axis, keepdims=keepdims)
+        other.count = value.size // np.size(other.mean)
+        other.m2 = ((value - other.mean) ** 2).sum(
+            self.axis, keepdims=keepdims)
+        return self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 \
+            + delta ** 2 * (self.count * other.count / count)
+        self.count = count
+        return self
+
+
+class Maximum(_Accumulator):
+    """
+    Maximum along `axis`.
+
+    >>> int(Maximum().update([1, 3]).merge(Maximum().update([2])).value)
+    3
+    """
+    def __init__(self, axis=None):
+        self.axis = axis
+        self.value = None
+
+    def update(self, value):
+        other = Maximum(self.axis)
+        other.value = np.max(
+            value, axis=self.axis, keepdims=self.axis is not None)
+        return self.merge(other)
+
+    def merge(self, other):
+        if self.value is None:
+            self.value = other.value
+        elif other.value is not None:
+            self.value = np.maximum(self.value, other.value)
+        return self
+
+
+class Counts(_Accumulator):
+    """
+    Counts of hashable values, e.g. labels. A single value or a list of
+    values can be added with `update`. The values are stored as pairs in
+    JSON, so int labels remain int labels. Values that JSON cannot represent
+    (e.g. tuples) are rejected by `to_json`.
+
+    >>> counts = Counts().update(['a', 'b']).merge(Counts().update('a'))
+    >>> counts.value
+    {'a': 2, 'b': 1}
+    >>> counts.keys()
+    ['a', 'b']
+    """
+    axis = None
+
+    def __init__(self):
+        self.value = {}
+
+    def keys(self):
+        """The sorted values, e.g. the label vocabulary."""
+        return sorted(self.value)
+
+    def update(self, value):
+        counter = Counter(self.value)
+        counter.update(to_list(value))
+        self.value = dict(counter)
+        return self
+
+    def merge(self, other):
+        counter = Counter(self.value)
+        counter.update(other.value)
+        self.value = dict(counter)
+        return self
+
+    def to_json(self):
+        for value in self.value:
+            if not isinstance(value, (str, int, float, bool, type(None))):
+                raise TypeError(
+                    f'Cannot store the value {value!r} of type '
+                    f'{type(value).__name__} as JSON without changing its '
+                    f'type. Supported types are str, int, float, bool and '
+                    f'None.'
+                )
+        return {
+            'type': self.__class__.__name__,
+            'value': [[value, count] for value, count in self.value.items()],
+        }
+
+    @classmethod
+    def from_json(cls, state):
+        assert state['type'] == cls.__name__, (cls, state)
+        accumulator = cls()
+        accumulator.value = {value: count for value, count in state['value']}
+        return accumulator
+
+
+_ACCUMULATORS = {
+    cls.__name__: cls for cls in [MeanVariance, Maximum, Counts]
+}
+
+
+def _merge_into(statistics, other):
+    for name, accumulator in other.items():
+        if name in statistics:
+            statistics[name].merge(accumulator)
+        else:
+            # Copy, because an accumulator may be used for multiple names
+            statistics[name] = copy.deepcopy(accumulator)
+    return statistics
+
+
+def _reduce(dataset, fn, key, skip):
+    statistics, keys = {}, []
+    for example in dataset:
+        if key is not None:
+            if example[key] in skip:
+                continue
+            keys.append(example[key])
+        _merge_into(statistics, fn(example))
+    return statistics, keys
+
+
+def dump_statistics(statistics, path, keys=None, config=None):
+    """Writes the accumulators, the keys of the processed examples and the
+    `config` that was used to compute the accumulators."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps({
+        'statistics': {
+            name: accumulator.to_json()
+            for name, accumulator in statistics.items()
+        },
+        'keys': keys,
+        'config': config,
+    }))
+    tmp_path.replace(path)
+
+
+def load_statistics(path, config=None):
+    """
+    Inverse of `dump_statistics`. Returns the accumulators and the keys.
+    When the stored config differs from `config`, the stored accumulators
+    are stale and a ValueError is raised.
+    """
+    state = json.loads(Path(path).read_text())
+    stored_config = state.get('config')
+    if stored_config != json.loads(json.dumps(config)):
+        raise ValueError(
+            f'The statistics in {path} were computed with the config\n'
+            f'{stored_config}\nand not with\n{config}'
+        )
+    return {
+        name: _ACCUMULATORS[accumulator['type']].from_json(accumulator)
+        for name, accumulator in state['statistics'].items()
+    }, state['keys']
+
+
+def collect_statistics(
+        dataset, fn, num_workers=0, state_path=None, key='example_id',
+        num_shards=None, config=None,
+):
+    """
+    Map-reduce pass over `dataset`. `fn` maps each example to a dict of
+    accumulators, the accumulators are merged by name.
+
+    The dataset is split into shards that are reduced in `num_workers`
+    processes, so `dataset` and `fn` have to be picklable in that case.
+    The examples should be cheap to load (e.g. the examples from the
+    database), the expensive work (e.g. loading the audio) belongs in `fn`.
+
+    Args:
+        dataset: Indexable dataset, e.g. `lazy_dataset.Dataset` or list.
+        fn: Callable that maps an example to a dict of accumulators, e.g.
+            `{'global': MeanVariance().update(x)}`.
+        num_workers: Number of processes. 0 reduces in the main process.
+        state_path: Optional JSON file, where the accumulators and the `key`
+            of the processed examples are stored. When it exists, only the
+            examples with a new `key` are processed and merged with the
+            stored accumulators. This allows incremental updates, when new
+            data is appended to the dataset.
+        key: Key that identifies an example for incremental updates.
+        num_shards: Number of shards. Defaults to `4 * num_workers`.
+        config: JSON serializable description of `fn`, e.g. the
+            normalization type. It is stored in the state and a state with
+            a different config is discarded, because its accumulators were
+            computed by a different `fn`.
+
+    Returns:
+        dict of the merged accumulators.
+    """
+    statistics, keys = {}, []
+    if state_path is not None and Path(state_path).exists():
+        try:
+            statistics, keys = load_statistics(state_path, config)
+        except ValueError as e:
+            warnings.warn(f'Discarding the stale state. {e}')
+    if state_path is None:
+        key = None
+    skip = set(keys)
+
+    if num_workers == 0:
+        shard_statistics, shard_keys = _reduce(tqdm(dataset), fn, key, skip)
+        _merge_into(statistics, shard_statistics)
+        keys.extend(shard_keys)
+    else:
+        if num_shards is None:
+            num_shards = 4 * num_workers
+        num_shards = max(min(num_shards, len(dataset)), 1)
+        with ProcessPoolExecutor(num_workers) as pool:
+            futures = [
+                pool.submit(_reduce, dataset[i::num_shards], fn, key, skip)
+                for i in range(num_shards)
+            ]
+            for future in tqdm(as_completed(futures), total=num_shards):
+                shard_statistics, shard_keys = future.result()
+                _merge_into(statistics, shard_statistics)
+                keys.extend(shard_keys)
+
+    if state_path is not None:
+        dump_statistics(statistics, state_path, keys, config)
+    return statistics
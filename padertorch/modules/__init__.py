@@ -1,5 +1,5 @@
 from .fully_connected import fully_connected_stack
-from .normalization import Normalization
+from .normalization import Normalization, MaskedLayerNorm, MaskedGroupNorm
 from .recurrent import StatefulLSTM
 from .wavenet.wavenet import WaveNet
 from . import dual_path_rnn
@@ -16,10 +16,15 @@ from einops import rearrange
 from einops.layers.torch import Rearrange
 from torch.nn import functional as F
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence, \
-    PackedSequence, pad_sequence
+    PackedSequence
 
 import paderbox as pb
 
+from padertorch.modules.normalization import MaskedLayerNorm
+from padertorch.ops.sequence.indexing import (
+    pack_index, pack_batch, unpack_batch
+)
+
 
 def segment(
         signal: torch.Tensor, hop_size: int, window_size: int,
@@ -222,7 +227,7 @@ def pack(x: torch.Tensor, sequence_lengths: torch.Tensor):
         interleave the time steps and does not return a `PackedSequence`.
     """
     assert len(sequence_lengths) == len(x)
-    return torch.cat([x_[:l] for x_, l in zip(x, sequence_lengths)])
+    return pack_batch(x, sequence_lengths)
 
 
 def unpack(x: torch.Tensor, sequence_lengths: torch.Tensor):
@@ -247,12 +252,7 @@ def unpack(x: torch.Tensor, sequence_lengths: torch.Tensor):
         >>> bool(torch.all(unpacked == a))
         True
     """
-    segments = []
-    start = 0
-    for l in sequence_lengths:
-        segments.append(x[start:start + l])
-        start += l
-    return pad_sequence(segments, batch_first=True)
+    return unpack_batch(x, sequence_lengths)
 
 
 def apply_examplewise(fn, x: torch.Tensor, sequence_lengths, time_axis=1):
@@ -421,7 +421,7 @@ class _ChunkRNN(torch.nn.Module):
             out_features=feat_size
         )
 
-        self.norm = torch.nn.LayerNorm((feat_size,))
+        self.norm = MaskedLayerNorm((feat_size,))
         self.lstm_reshape_to = lstm_reshape_to
         self.feat_size = feat_size
 
@@ -457,8 +457,11 @@ class _ChunkRNN(torch.nn.Module):
         if sequence_lengths is not None:
             # TODO: don't hardcode this
             if 's' in self.lstm_reshape_to[:4]:
-                packed = pack(rearrange(sequence, 'b n k s -> b s k n'),
-                              sequence_lengths)
+                # Shared by pack and unpack
+                index = pack_index(
+                    sequence_lengths, S, device=sequence.device)
+                packed = pack_batch(
+                    rearrange(sequence, 'b n k s -> b s k n'), index=index)
             else:
                 assert self.lstm_reshape_to[1] == 'b'
                 packed_sequence_lengths = rearrange(
@@ -485,11 +488,12 @@ class _ChunkRNN(torch.nn.Module):
         if sequence_lengths is not None and 's' in self.lstm_reshape_to[:4]:
             out = self.norm(out)
             out = rearrange(
-                unpack(out, sequence_lengths),
+                unpack_batch(
+                    out, sequence_lengths, index=index, total_length=S),
                 'b s k n -> b n k s'
             )
         else:
-            out = apply_examplewise(self.norm, out, packed_sequence_lengths)
+            out = self.norm(out, packed_sequence_lengths)
             out = rearrange(out, f'{self.lstm_reshape_to} -> b n k s', b=B, s=S,
                             n=self.feat_size, k=K)
 
@@ -169,6 +169,37 @@ class Normalization(Module):
             if self.scale:
                 self.running_power.fill_(1)
 
+    def initialize_running_stats(self, statistics):
+        """Initializes the running statistics from dataset statistics, e.g.
+        a `padertorch.data.statistics.MeanVariance` accumulator that is
+        computed with `padertorch.data.statistics.collect_statistics`.
+
+        >>> from padertorch.data.statistics import MeanVariance
+        >>> stats = MeanVariance(axis=-1).update(torch.randn(10, 100).numpy())
+        >>> norm = InputNormalization(data_format='bct', shape=(None, 10, None), statistics_axis='bt')
+        >>> norm.initialize_running_stats(stats)
+        >>> norm.num_tracked_values.flatten()
+        tensor([100., 100., 100., 100., 100., 100., 100., 100., 100., 100.])
+
+        Args:
+            statistics: object with `count`, `mean` and `power` (mean of the
+                squared values) attributes. `mean` and `power` are reshaped
+                to the shape of the running statistics.
+        """
+        assert self.track_running_stats
+        with torch.no_grad():
+            for buffer, value in [
+                (self.num_tracked_values, statistics.count),
+                (self.running_mean, statistics.mean),
+                (self.running_power, statistics.power),
+            ]:
+                if buffer is None:
+                    continue
+                value = torch.as_tensor(value, dtype=buffer.dtype)
+                if value.numel() > 1:
+                    value = value.reshape(buffer.shape)
+                buffer.copy_(value)
+
     def reset_parameters(self):
         self.reset_running_stats()
         if self.gamma is not None:
@@ -216,17 +247,31 @@ class Normalization(Module):
             self.running_power += (1 - momentum) * power.detach()
 
     def _running_norm(self, x, sequence_lengths):
-        if self.shift:
-            x = x - self.running_mean.detach()
+        # y = x * weight + bias
+        weight = bias = None
         if self.scale:
-            x = x / torch.sqrt(self.running_var.detach() + self.eps)
+            weight = torch.rsqrt(self.running_var.detach() + self.eps)
+        if self.shift:
+            bias = -self.running_mean.detach()
+            if weight is not None:
+                bias = bias * weight
         if self.gamma is not None:
-            x = x * self.gamma
+            weight = self.gamma if weight is None else weight * self.gamma
+            if bias is not None:
+                bias = bias * self.gamma
         if self.beta is not None:
-            x = x + self.beta
-        return x * compute_mask(
-            x, sequence_lengths, self.batch_axis, self.sequence_axis
-        )
+            bias = self.beta if bias is None else bias + self.beta
+        if weight is not None and bias is not None:
+            x = torch.addcmul(bias, x, weight)
+        elif weight is not None:
+            x = x * weight
+        elif bias is not None:
+            x = x + bias
+        mask = _sequence_mask(
+            x, sequence_lengths, self.batch_axis, self.sequence_axis)
+        if mask is not None:
+            x = torch.where(mask, x, x.new_zeros(()))
+        return x
 
     def inverse(self, x, sequence_lengths=None):
         if not self.track_running_stats:
@@ -307,11 +352,13 @@ class InputNormalization(Normalization):
         if self.track_running_stats:
             if self.training:
                 with torch.no_grad():
-                    _, _, mean, power, n_values = mask_and_compute_stats(
-                        x, sequence_lengths,
-                        self.statistics_axis, self.batch_axis,
+                    mask = _sequence_mask(
+                        x, sequence_lengths, self.batch_axis,
                         self.sequence_axis
                     )
+                    mean, var, n_values = _masked_moments(
+                        x, mask, self.statistics_axis)
+                    power = var + mean ** 2
                     self._update_running_stats(mean, power, n_values)
             x = self._running_norm(x, sequence_lengths)
         else:
@@ -319,11 +366,88 @@ class InputNormalization(Normalization):
         return x
 
 
+def _sequence_mask(x, sequence_lengths, batch_axis, sequence_axis):
+    """Boolean mask that broadcasts to `x`, i.e. with singleton dimensions
+    except for the batch and the sequence axis. None, if nothing is padded.
+    """
+    if sequence_lengths is None:
+        return None
+    batch_axis = batch_axis % x.dim()
+    sequence_axis = sequence_axis % x.dim()
+    sequence_lengths = torch.as_tensor(sequence_lengths, device=x.device)
+    mask = (
+        torch.arange(x.shape[sequence_axis], device=x.device)
+        < sequence_lengths[:, None]
+    )
+    if batch_axis > sequence_axis:
+        mask = mask.transpose(0, 1)
+    shape = [1] * x.dim()
+    shape[batch_axis] = x.shape[batch_axis]
+    shape[sequence_axis] = x.shape[sequence_axis]
+    return mask.reshape(shape)
+
+
+def _masked_moments(x, mask, statistics_axis):
+    """
+    Mean, variance and number of the values of `x` along `statistics_axis`
+    where `mask` is True, computed in a single pass with `torch.var_mean`.
+
+    The padded values are zero in the pass, their contribution is removed
+    with the formula for combining the moments of two sets
+    (Chan et al., "Updating formulae and a pairwise algorithm for computing
+    sample variances"). To keep this correction small, `x` is shifted by a
+    value of each set before.
+    """
+    statistics_axis = tuple(statistics_axis)
+    reduced_shape = [
+        1 if ax in statistics_axis else size for ax, size in enumerate(x.shape)
+    ]
+    if mask is None:
+        var, mean = torch.var_mean(
+            x, dim=statistics_axis, correction=0, keepdim=True)
+        n_values = x.new_full(
+            reduced_shape, x.numel() / max(1, mean.numel()))
+        return mean, var, n_values
+
+    mask_axis = tuple(ax for ax in statistics_axis if mask.shape[ax] > 1)
+    n_total = x.new_tensor(
+        float(x.numel() / max(1, torch.Size(reduced_shape).numel())))
+    if mask_axis:
+        n_values = mask.sum(dim=mask_axis, keepdim=True).to(x.dtype) * (
+            n_total / torch.Size([mask.shape[ax] for ax in mask_axis]).numel()
+        )
+    else:
+        # The statistics do not reduce the batch or the sequence axis, so
+        # each frame is either completely valid or completely padded.
+        # Note: sum(dim=()) would reduce all axes.
+        n_values = mask.to(x.dtype) * n_total
+    n_values = n_values.expand(reduced_shape).contiguous()
+
+    shift = x[tuple(
+        slice(0, 1) if ax in statistics_axis else slice(None)
+        for ax in range(x.dim())
+    )].detach()
+    var, mean = torch.var_mean(
+        (x - shift).masked_fill_(~mask, 0.),
+        dim=statistics_axis, correction=0, keepdim=True,
+    )
+    n = torch.clamp(n_values, min=1)
+    mean = mean * (n_total / n)
+    var = (
+        var * n_total - mean ** 2 * n * (n_total - n_values) / n_total
+    ) / n
+    valid = n_values > 0
+    mean = torch.where(valid, mean + shift, torch.zeros_like(mean))
+    var = torch.where(valid, torch.clamp(var, min=0.), torch.zeros_like(var))
+    return mean, var, n_values
+
+
 class _Normalize(Function):
     """
     Normalization function incl. backward computation.
-    The implementation of the backward step saves memory compared to simply
-    using autograd of the forward operations.
+    The statistics are computed in a single pass, see `_masked_moments`.
+    The backward step recomputes the normalized input instead of saving it,
+    so apart from the input only the statistics are stored.
     """
     @staticmethod
     def forward(
@@ -331,52 +455,58 @@ class _Normalize(Function):
             sequence_lengths, shift, scale, eps
     ):
         ctx.statistics_axis = statistics_axis
-        ctx.batch_axis = batch_axis
-        ctx.sequence_axis = sequence_axis
-        ctx.seq_len = sequence_lengths
         ctx.shift = shift
         ctx.scale = scale
-        ctx.eps = eps
 
-        x, mask, mean, power, n_values = mask_and_compute_stats(
-            x, sequence_lengths, statistics_axis, batch_axis, sequence_axis
-        )
-        y = x
-        if shift:
-            y = y - mean
-            power_scale = power - mean**2
-        else:
-            power_scale = power
-        power_scale = torch.clamp(power_scale, min=0.)
+        mask = _sequence_mask(x, sequence_lengths, batch_axis, sequence_axis)
+        mean, var, n_values = _masked_moments(x, mask, statistics_axis)
+        power = var + mean ** 2
+        # y = x * weight + bias
         if scale:
-            y = y / torch.sqrt(power_scale + eps)
-        ctx.save_for_backward(x, gamma, beta, mean, power_scale)
-
+            inv_std = torch.rsqrt((var if shift else power) + eps)
+            weight = inv_std
+        else:
+            inv_std = None
+            weight = torch.ones_like(mean)
+        bias = -mean * weight if shift else torch.zeros_like(mean)
         if gamma is not None:
             assert gamma.dim() == x.dim(), gamma.shape
-            y = y * gamma
+            weight = weight * gamma
+            bias = bias * gamma
         if beta is not None:
             assert beta.dim() == x.dim(), beta.shape
-            y = y + beta
-        return y*mask, mean, power, n_values
+            bias = bias + beta
+        y = torch.addcmul(bias, x, weight)
+        if mask is not None:
+            y.masked_fill_(~mask, 0.)
+
+        ctx.mask = mask
+        ctx.save_for_backward(x, gamma, beta, mean, inv_std, n_values)
+        ctx.mark_non_differentiable(mean, power, n_values)
+        ctx.set_materialize_grads(False)
+        return y, mean, power, n_values
 
     @staticmethod
-    def backward(ctx, grad_y, grad_mean, grad_power, _):
+    def backward(ctx, grad_y, *_):
         # equations from https://arxiv.org/abs/1502.03167
-        if (grad_mean != 0).any() or (grad_power != 0).any():
-            raise NotImplementedError
-        x, gamma, beta, mean, power_scale = ctx.saved_tensors
-        # compute mask
-        mask = compute_mask(x, ctx.seq_len, ctx.batch_axis, ctx.sequence_axis)
-        n_values = torch.clamp(mask.sum(dim=ctx.statistics_axis, keepdim=True), min=1)
-
-        grad_y = grad_y * mask
-        x_hat = x
-        scale = torch.sqrt(power_scale + ctx.eps)
-        if ctx.shift:
-            x_hat = x_hat - mean
+        x, gamma, beta, mean, inv_std, n_values = ctx.saved_tensors
+        if grad_y is None:
+            return (None,) * 10
+        mask = ctx.mask
+        statistics_axis = ctx.statistics_axis
+        n_values = torch.clamp(n_values, min=1)
+
+        def masked(value):
+            if mask is None:
+                return value
+            return torch.where(mask, value, value.new_zeros(()))
+
+        grad_y = masked(grad_y)
+        x_hat = x - mean if ctx.shift else x
         if ctx.scale:
-            x_hat = x_hat / scale
+            x_hat = x_hat * inv_std
+        x_hat = masked(x_hat)
+
         if beta is None:
             grad_beta = None
         else:
@@ -389,26 +519,19 @@ class _Normalize(Function):
             reduce_axis = [i for i in range(gamma.dim()) if gamma.shape[i] == 1]
             grad_gamma = (grad_y * x_hat).sum(reduce_axis, keepdim=True)
             grad_x_hat = grad_y * gamma
-        if ctx.shift:
-            x = (x - mean) * mask
-            grad_mean_ = -grad_x_hat.sum(ctx.statistics_axis, keepdim=True)
-        if ctx.scale:
-            grad_power_ = (
-                (grad_x_hat * x).sum(ctx.statistics_axis, keepdim=True)
-                * (-1 / 2) * (power_scale + ctx.eps) ** (-3 / 2)
-            )
-            if ctx.shift:
-                grad_mean_ = (
-                    grad_mean_ / scale
-                    - 2 * grad_power_ * x.sum(ctx.statistics_axis, keepdim=True) / n_values
-                )
 
         grad_x = grad_x_hat
-        if ctx.scale:
-            grad_x = grad_x / scale + grad_power_ * 2 * x / n_values
         if ctx.shift:
-            grad_x = grad_x + grad_mean_ / n_values
-        return grad_x * mask, grad_gamma, grad_beta, None, None, None, None, None, None, None
+            grad_x = grad_x - grad_x_hat.sum(
+                statistics_axis, keepdim=True) / n_values
+        if ctx.scale:
+            projection = (grad_x_hat * x_hat).sum(
+                statistics_axis, keepdim=True) / n_values
+            grad_x = (grad_x - x_hat * projection) * inv_std
+        return (
+            masked(grad_x), grad_gamma, grad_beta,
+            None, None, None, None, None, None, None,
+        )
 
 
 def normalize(
@@ -470,3 +593,88 @@ def mask_and_compute_stats(
     mean = x.sum(dim=statistics_axis, keepdim=True) / torch.clamp(n_values, min=1)
     power = (x ** 2).sum(dim=statistics_axis, keepdim=True) / torch.clamp(n_values, min=1)
     return x, mask, mean, power, n_values
+
+
+class MaskedLayerNorm(nn.LayerNorm):
+    """
+    `torch.nn.LayerNorm` that sets the padded frames to zero. The statistics
+    of a layer norm are computed for each frame, hence the padded frames do
+    not influence the valid frames. This replaces
+    `padertorch.modules.dual_path_rnn.apply_examplewise` with a layer norm
+    and yields the same output, but with one call for the whole batch.
+    The parameters are the same as for `torch.nn.LayerNorm`.
+
+    >>> norm = MaskedLayerNorm(3)
+    >>> x = torch.arange(24.).reshape(2, 4, 3)
+    >>> norm(x, [4, 2])[:, :, 0]
+    tensor([[-1.2247, -1.2247, -1.2247, -1.2247],
+            [-1.2247, -1.2247,  0.0000,  0.0000]], grad_fn=<SelectBackward0>)
+
+    Args:
+        normalized_shape: See `torch.nn.LayerNorm`.
+        eps: See `torch.nn.LayerNorm`.
+        elementwise_affine: See `torch.nn.LayerNorm`.
+        sequence_axis: Axis of the input that may contain padding. The first
+            axis is the batch axis.
+    """
+    def __init__(
+            self, normalized_shape, eps=1e-5, elementwise_affine=True,
+            sequence_axis=1,
+    ):
+        super().__init__(normalized_shape, eps, elementwise_affine)
+        self.sequence_axis = sequence_axis
+
+    def forward(self, x, sequence_lengths=None):
+        x = super().forward(x)
+        if sequence_lengths is not None:
+            mask = compute_mask(
+                x, sequence_lengths, batch_axis=0,
+                sequence_axis=self.sequence_axis,
+            )
+            x = torch.where(mask > 0, x, torch.zeros_like(x))
+        return x
+
+
+class MaskedGroupNorm(nn.GroupNorm):
+    """
+    `torch.nn.GroupNorm` that computes the statistics only from the valid
+    frames of each example and sets the padded frames to zero. With
+    `num_groups=1`, this is the global layer norm (gLN) of Conv-TasNet.
+    The input has the shape (B, C, ..., T).
+
+    The output for the valid frames is the same as that of
+    `torch.nn.GroupNorm` applied to each unpadded example.
+
+    >>> norm = MaskedGroupNorm(1, 2)
+    >>> x = torch.tensor([[[1., 2, 3, 4], [5, 6, 7, 8]]] * 2)
+    >>> norm(x, [4, 2])
+    tensor([[[-1.5275, -1.0911, -0.6547, -0.2182],
+             [ 0.2182,  0.6547,  1.0911,  1.5275]],
+    <BLANKLINE>
+            [[-1.2127, -0.7276,  0.0000,  0.0000],
+             [ 0.7276,  1.2127,  0.0000,  0.0000]]], grad_fn=<ViewBackward0>)
+
+    Args:
+        num_groups: See `torch.nn.GroupNorm`.
+        num_channels: See `torch.nn.GroupNorm`.
+        eps: See `torch.nn.GroupNorm`.
+        affine: See `torch.nn.GroupNorm`.
+    """
+    def forward(self, x, sequence_lengths=None):
+        if sequence_lengths is None:
+            return super().forward(x)
+
+        shape = x.shape
+        # (B, G, C // G, ..., T)
+        x = x.reshape(shape[0], self.num_groups, -1, *shape[2:])
+        gamma = beta = None
+        if self.affine:
+            affine_shape = (1, *x.shape[1:3]) + (1,) * (len(shape) - 2)
+            gamma = self.weight.reshape(affine_shape)
+            beta = self.bias.reshape(affine_shape)
+        x, *_ = normalize(
+            x, gamma, beta, statistics_axis=tuple(range(2, x.dim())),
+            batch_axis=0, sequence_axis=-1, sequence_lengths=sequence_lengths,
+            shift=True, scale=True, eps=self.eps,
+        )
+        return x.reshape(shape)
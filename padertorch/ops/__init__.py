@@ -4,8 +4,9 @@ from . import sequence
 from . import mappings
 from . import tensor
 
-from ._stft import STFT
+from ._stft import STFT, StreamingSTFT
 from .einsum import *
 from .sequence import *
 from .tensor import *
 from .mu_law import *
+from ._resample import *
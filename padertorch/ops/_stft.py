@@ -2,6 +2,7 @@ import numpy as np
 import torch
 from einops import rearrange
 import paderbox as pb
+import functools
 import typing
 from math import ceil
 
@@ -10,16 +11,13 @@ from torch.nn import functional as F
 
 def get_stft_kernel(size, window):
     length = len(window)
-    real = np.array([
-        [np.cos(-1 * n * 2 * np.pi / size * k) * window[k]
-         for k in range(length)] for n in range(size // 2 + 1)
-    ])
-    imag = np.array([
-        [np.sin(-1 * n * 2 * np.pi / size * k) * window[k]
-         for k in range(length)] for n in range(size // 2 + 1)
-    ])
+    n = np.arange(size // 2 + 1)[:, None]
+    k = np.arange(length)
+    # Same order of the floating point operations as in the loop version
+    angle = -1 * n * 2 * np.pi / size * k
+    real = np.cos(angle) * window
+    imag = np.sin(angle) * window
     kernel = np.concatenate([real, imag], axis=0)
-    # print(kernel.shape)
     return torch.from_numpy(kernel).unsqueeze(dim=1)
 
 
@@ -27,22 +25,42 @@ def get_istft_kernel(size, shift, window):
     window = pb.transform.module_stft._biorthogonal_window_fastest(
         window, shift) / size
     length = len(window)
-    kernel_numpy = np.array([
-        [np.cos(1 * f * 2 * np.pi / size * n) * window[n]
-         for n in range(length)] for f in range(size)
-    ])
-    kernel_real = torch.from_numpy(kernel_numpy)
+    f = np.arange(size)[:, None]
+    n = np.arange(length)
+    kernel_real = torch.from_numpy(np.cos(1 * f * 2 * np.pi / size * n) * window)
     kernel_real = torch.unsqueeze(kernel_real, dim=1)
-
-    kernel_numpy = np.array([
-        [np.sin(-1 * f * 2 * np.pi / size * n) * window[n]
-         for n in range(length)] for f in range(size)
-    ])
-    kernel_imag = torch.from_numpy(kernel_numpy)
+    kernel_imag = torch.from_numpy(np.sin(-1 * f * 2 * np.pi / size * n) * window)
     kernel_imag = torch.unsqueeze(kernel_imag, dim=1)
     return kernel_real, kernel_imag
 
 
+@functools.lru_cache(maxsize=None)
+def _get_window(window, symmetric_window, window_length):
+    return pb.transform.module_stft._get_window(
+        window=window,
+        symmetric_window=symmetric_window,
+        window_length=window_length,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_synthesis_window(shift, window, symmetric_window, window_length):
+    return pb.transform.module_stft._biorthogonal_window_fastest(
+        _get_window(window, symmetric_window, window_length), shift)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_stft_kernel(size, window, symmetric_window, window_length):
+    return get_stft_kernel(
+        size, _get_window(window, symmetric_window, window_length))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_istft_kernel(size, shift, window, symmetric_window, window_length):
+    return get_istft_kernel(
+        size, shift, _get_window(window, symmetric_window, window_length))
+
+
 class STFT:
     def __init__(
             self,
@@ -54,7 +72,8 @@ class STFT:
             fading: typing.Optional[typing.Union[bool, str]] = 'full',
             pad: bool = True,
             symmetric_window: bool = False,
-            complex_representation: str = 'complex'
+            complex_representation: str = 'complex',
+            backend: str = 'conv',
     ):
         """
         This is a torch stft implementation which mirrors the behavior of
@@ -74,6 +93,12 @@ class STFT:
                 imaginary part of the complex stft signal:
                                 either complex, concat or stacked
                                 complex is not supported at the moment
+            backend: How the STFT is computed:
+                'conv': Convolution with a DFT kernel, O(size) per
+                    frequency bin and frame. Use it for export targets
+                    without FFT support (e.g. ONNX).
+                'fft': Frames the signal and uses `torch.fft.rfft`. The
+                    inverse uses `torch.fft.irfft` and overlap-add.
         """
 
         self.possible_out_types = ['concat', 'stacked', 'complex']
@@ -82,23 +107,66 @@ class STFT:
             f' {self.possible_out_types}, not {complex_representation}'
         )
         self.complex_representation = complex_representation
+        assert backend in ['conv', 'fft'], backend
+        self.backend = backend
         assert size % 2 == 0, 'At the moment we only support even FFT sizes'
         self.size = size
         self.shift = shift
         self.window_length = window_length if window_length is not None \
             else size
-
-        window = pb.transform.module_stft._get_window(
-            window=window,
-            symmetric_window=symmetric_window,
-            window_length=self.window_length,
+        assert backend == 'conv' or self.window_length <= size, (
+            'The fft backend requires window_length <= size',
+            self.window_length, size,
         )
+
         assert fading in [None, True, False, 'full', 'half'], fading
         self.fading = fading
         self.pad = pad
-        self.stft_kernel = get_stft_kernel(size, window)
-        self.istft_kernel_real, self.istft_kernel_imag = get_istft_kernel(
-            size, shift, window)
+        # The windows and kernels are built on first use and shared by all
+        # instances with the same parameters.
+        self._kernel_args = (window, symmetric_window, self.window_length)
+        self._device_kernels = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Copies on a device are rebuilt on demand (e.g. in a worker)
+        state['_device_kernels'] = {}
+        return state
+
+    @property
+    def window(self):
+        return torch.from_numpy(_get_window(*self._kernel_args))
+
+    @property
+    def synthesis_window(self):
+        return torch.from_numpy(
+            _get_synthesis_window(self.shift, *self._kernel_args))
+
+    @property
+    def stft_kernel(self):
+        return _get_stft_kernel(self.size, *self._kernel_args)
+
+    @property
+    def istft_kernel_real(self):
+        return _get_istft_kernel(self.size, self.shift, *self._kernel_args)[0]
+
+    @property
+    def istft_kernel_imag(self):
+        return _get_istft_kernel(self.size, self.shift, *self._kernel_args)[1]
+
+    def _get_kernel(self, name, reference):
+        """
+        Returns the kernel `name` with the device and dtype of `reference`.
+        The copies are cached, so that repeated calls do not transfer the
+        kernels again.
+        """
+        key = (name, reference.device, reference.dtype)
+        try:
+            return self._device_kernels[key]
+        except KeyError:
+            kernel = getattr(self, name).to(reference)
+            self._device_kernels[key] = kernel
+            return kernel
 
     def __call__(self, inputs):
         """
@@ -127,6 +195,18 @@ class STFT:
         >>> stft_out = stft(mixture.numpy(), 512, 20, window_length=40)
         >>> np.testing.assert_allclose(torch_stft_out.numpy(), stft_out, atol=1e-5)
 
+        The 'fft' backend gives the same result for all representations:
+        >>> for complex_representation in ['complex', 'concat', 'stacked']:
+        ...     for fading in ['full', 'half', False]:
+        ...         kwargs = dict(window_length=40, fading=fading,
+        ...                       complex_representation=complex_representation)
+        ...         conv_out = STFT(512, 20, **kwargs)(mixture)
+        ...         fft_out = STFT(512, 20, backend='fft', **kwargs)(mixture)
+        ...         assert fft_out.shape == conv_out.shape, (fft_out.shape, conv_out.shape)
+        ...         np.testing.assert_allclose(fft_out, conv_out, atol=1e-5)
+        >>> stft_out = stft(mixture.numpy(), 512, 128, fading='half')
+        >>> fft_out = STFT(512, 128, fading='half', backend='fft')(mixture)
+        >>> np.testing.assert_allclose(fft_out.numpy(), stft_out, atol=1e-5)
         """
         org_shape = inputs.shape
         stride = self.shift
@@ -135,15 +215,7 @@ class STFT:
         # Pad with zeros to have enough samples for the window function to fade.
         assert self.fading in [None, True, False, 'full', 'half'], self.fading
         if self.fading not in [False, None]:
-            if self.fading == 'half':
-                pad_width= (
-                    (self.window_length - self.shift) // 2,
-                    ceil((self.window_length - self.shift) / 2)
-                )
-            else:
-                pad_width = self.window_length - self.shift
-                pad_width = (pad_width, pad_width)
-            x = F.pad(x, pad_width, mode='constant')
+            x = F.pad(x, self._fading_pad_width(), mode='constant')
 
         if self.pad:
             if x.shape[-1] < length:
@@ -153,13 +225,30 @@ class STFT:
                 pad_size = stride - ((x.shape[-1] + stride - length) % stride)
                 x = F.pad(x, (0, pad_size))
 
-        x = torch.unsqueeze(x, 1) # [..., 1, T]
-        weights = self.stft_kernel.to(x)
-        encoded = F.conv1d(x, weight=weights, stride=stride)
+        return self._encode(x, org_shape[:-1])
 
-        encoded = encoded.view(*org_shape[:-1], *encoded.shape[-2:])
-        encoded = rearrange(encoded, '... feat frames -> ... frames feat')
-        encoded = torch.chunk(encoded, 2, dim=-1)
+    def _encode(self, x, batch_shape):
+        """
+        Computes the STFT of the padded signal `x` with shape [B, T] and
+        returns it with shape [*batch_shape, frames, ...].
+        """
+        if self.backend == 'fft':
+            # [..., frames, length]
+            frames = x.unfold(-1, self.window_length, self.shift)
+            encoded = torch.fft.rfft(
+                frames * self._get_kernel('window', x), n=self.size)
+            encoded = encoded.view(*batch_shape, *encoded.shape[-2:])
+            if self.complex_representation == 'complex':
+                return encoded
+            encoded = encoded.real, encoded.imag
+        else:
+            x = torch.unsqueeze(x, 1)  # [..., 1, T]
+            weights = self._get_kernel('stft_kernel', x)
+            encoded = F.conv1d(x, weight=weights, stride=self.shift)
+
+            encoded = encoded.view(*batch_shape, *encoded.shape[-2:])
+            encoded = rearrange(encoded, '... feat frames -> ... frames feat')
+            encoded = torch.chunk(encoded, 2, dim=-1)
         if self.complex_representation == 'stacked':
             encoded = torch.stack(encoded, dim=-1)
         elif self.complex_representation == 'concat':
@@ -221,7 +310,18 @@ class STFT:
         >>> signal_np = stft_signal.numpy()
         >>> time_signal = istft(signal_np, 512, 20, window_length=40)
         >>> np.testing.assert_allclose(torch_signal, time_signal, atol=1e-5)
+
+        The 'fft' backend gives the same result:
+        >>> for fading in ['full', 'half', False]:
+        ...     torch_stft = STFT(512, 20, window_length=40, fading=fading,
+        ...                       backend='fft')
+        ...     torch_signal = torch_stft.inverse(stft_signal)
+        ...     time_signal = istft(signal_np, 512, 20, window_length=40,
+        ...                         fading=fading)
+        ...     np.testing.assert_allclose(torch_signal, time_signal, atol=1e-10)
         """
+        if self.backend == 'fft':
+            return self._inverse_fft(stft_signal)
 
         if self.complex_representation == 'stacked':
             signal_real, signal_imag = rearrange(stft_signal, '... s -> s ...')
@@ -248,9 +348,11 @@ class STFT:
             return F.conv_transpose1d(signal, weight=kernel, stride=self.shift)
 
         decoded_real = _apply_kernel(
-            signal_real, self.istft_kernel_real.to(signal_real), reflect=False)
+            signal_real, self._get_kernel('istft_kernel_real', signal_real),
+            reflect=False)
         decoded_imag = _apply_kernel(
-            signal_imag, self.istft_kernel_imag.to(signal_imag), reflect=True)
+            signal_imag, self._get_kernel('istft_kernel_imag', signal_imag),
+            reflect=True)
 
         time_signal = decoded_real + decoded_imag
         time_signal = time_signal.view(*org_shape[:-2], time_signal.shape[-1])
@@ -262,6 +364,78 @@ class STFT:
             time_signal = time_signal[..., int(pad_width): cut_off]
         return time_signal
 
+    def _synthesis_frames(self, stft_signal):
+        """
+        Returns the windowed time frames [..., frames, window_length] of
+        the STFT, that have to be overlap-added.
+        """
+        if self.complex_representation == 'stacked':
+            stft_signal = torch.complex(stft_signal[..., 0], stft_signal[..., 1])
+        elif self.complex_representation == 'concat':
+            stft_signal = torch.complex(*torch.chunk(stft_signal, 2, dim=-1))
+        elif self.complex_representation != 'complex':
+            raise ValueError(
+                f'Please choose one of the predefined output_types'
+                f'{self.possible_out_types} not {self.complex_representation}'
+            )
+        frames = torch.fft.irfft(stft_signal, n=self.size)
+        # The [..., :window_length] is the inverse of the window padding in rfft.
+        frames = frames[..., :self.window_length]
+        return frames * self._get_kernel('synthesis_window', frames)
+
+    def _fading_pad_width(self):
+        """Returns the number of samples that are padded by the fading."""
+        if self.fading in [None, False]:
+            return 0, 0
+        elif self.fading == 'half':
+            return (
+                (self.window_length - self.shift) // 2,
+                ceil((self.window_length - self.shift) / 2)
+            )
+        else:
+            return (self.window_length - self.shift,) * 2
+
+    def _split_frames(self, frames):
+        """
+        Splits the frames [..., frames, window_length] into
+        ceil(window_length / shift) blocks of `shift` samples.
+        """
+        num_blocks = ceil(self.window_length / self.shift)
+        frames = F.pad(
+            frames, (0, num_blocks * self.shift - self.window_length))
+        return frames.view(*frames.shape[:-1], num_blocks, self.shift)
+
+    def _overlap_add(self, frames):
+        """
+        Overlap-adds the frames [..., frames, window_length]. The frames
+        are summed in ascending order (like `paderbox.transform.istft`),
+        so `StreamingSTFT` gives bit-identical results.
+        """
+        num_frames = frames.shape[-2]
+        blocks = self._split_frames(frames)
+        num_blocks = blocks.shape[-2]
+        time_signal = None
+        # Block j of frame l ends up in output block l + j. Start with the
+        # last block, that belongs to the oldest frame.
+        for j in reversed(range(num_blocks)):
+            block = F.pad(blocks[..., j, :], (0, 0, j, num_blocks - 1 - j))
+            time_signal = block if time_signal is None else time_signal + block
+        time_signal = time_signal.reshape(*time_signal.shape[:-2], -1)
+        return time_signal[
+            ..., :(num_frames - 1) * self.shift + self.window_length]
+
+    def _inverse_fft(self, stft_signal):
+        time_signal = self._overlap_add(self._synthesis_frames(stft_signal))
+        start, stop = self._fading_pad_width()
+        return time_signal[..., start:time_signal.shape[-1] - stop]
+
+    def streaming(self):
+        """
+        Returns a `StreamingSTFT` for frame-by-frame processing with the
+        parameters of this STFT.
+        """
+        return StreamingSTFT(self)
+
     def samples_to_frames(self, samples):
         """
         Calculates number of STFT frames from number of samples in time domain.
@@ -305,3 +479,151 @@ class STFT:
         return pb.transform.module_stft._stft_frames_to_samples(
             frames, self.window_length, self.shift, fading=self.fading
         )
+
+
+class StreamingSTFT:
+    """
+    Stateful STFT and inverse STFT for block-wise processing, e.g. for
+    real-time enhancement: Push `shift` samples and get a frame, push the
+    processed frame and get `shift` samples.
+
+    The results are bit-identical to the offline transform of an
+    `STFT(..., backend='fft')` with the same parameters, when the remaining
+    frames and samples are flushed at the end. With the conv backend, the
+    results differ by the numerical precision.
+
+    >>> stft = STFT(512, 128, backend='fft')
+    >>> streaming = stft.streaming()
+    >>> x = torch.randn(2, 1000)
+    >>> X = torch.cat([streaming(block) for block in x.split(128, dim=-1)]
+    ...               + [streaming.flush()], dim=-2)
+    >>> X.shape
+    torch.Size([2, 11, 257])
+    >>> torch.equal(X, stft(x))
+    True
+    >>> x_hat = torch.cat([streaming.inverse(frame) for frame in X.split(1, dim=-2)]
+    ...                   + [streaming.flush_inverse()], dim=-1)
+    >>> x_hat.shape
+    torch.Size([2, 1024])
+    >>> torch.equal(x_hat, stft.inverse(X))
+    True
+
+    The algorithmic latency is at most `window_length` samples: an output
+    sample is complete, when the last frame that overlaps it is processed.
+
+    Args:
+        stft: `STFT` that defines the parameters of the transform.
+    """
+    def __init__(self, stft: STFT):
+        self.stft = stft
+        self.reset()
+
+    def reset(self):
+        """Resets the buffers, e.g. to process new streams."""
+        self.reset_analysis()
+        self.reset_synthesis()
+
+    def reset_analysis(self):
+        # Samples that are not completely consumed by the emitted frames
+        self._analysis_buffer = None
+        # Number of samples (incl. the fading) that were removed from the
+        # analysis buffer
+        self._num_consumed = 0
+
+    def reset_synthesis(self):
+        # Partial sums of the next output blocks [..., blocks - 1, shift]
+        self._synthesis_buffer = None
+        # Number of samples that are dropped due to the fading
+        self._num_skip = self.stft._fading_pad_width()[0]
+
+    def _encode(self, x):
+        num_frames = (x.shape[-1] - self.stft.window_length) \
+            // self.stft.shift + 1
+        if num_frames <= 0:
+            # Not enough samples for a frame, return an empty STFT
+            encoded = self.stft._encode(
+                x.new_zeros(1, self.stft.window_length), (1,))
+            return encoded.new_zeros(*x.shape[:-1], 0, *encoded.shape[2:])
+        frames = self.stft._encode(
+            x.reshape(-1, x.shape[-1]), x.shape[:-1])
+        self._analysis_buffer = x[..., num_frames * self.stft.shift:]
+        self._num_consumed += num_frames * self.stft.shift
+        return frames
+
+    def __call__(self, samples):
+        """
+        Appends `samples` [..., T] to the stream and returns the frames
+        [..., frames, ...] that are complete.
+        """
+        if self._analysis_buffer is None:
+            self._analysis_buffer = samples.new_zeros(
+                (*samples.shape[:-1], self.stft._fading_pad_width()[0]))
+        self._analysis_buffer = torch.cat([self._analysis_buffer, samples], -1)
+        return self._encode(self._analysis_buffer)
+
+    def flush(self):
+        """
+        Returns the remaining frames of the stream (with the fading and
+        padding of the offline transform) and resets the analysis.
+        """
+        assert self._analysis_buffer is not None, 'Nothing to flush.'
+        x = F.pad(self._analysis_buffer, (0, self.stft._fading_pad_width()[1]))
+        length, stride = self.stft.window_length, self.stft.shift
+        num_samples = self._num_consumed + x.shape[-1]
+        if self.stft.pad:
+            if num_samples < length:
+                x = F.pad(x, (0, length - num_samples))
+            elif stride != 1 and (num_samples + stride - length) % stride != 0:
+                x = F.pad(x, (
+                    0, stride - ((num_samples + stride - length) % stride)))
+        frames = self._encode(x)
+        self.reset_analysis()
+        return frames
+
+    def _emit(self, block):
+        if self._num_skip > 0:
+            num_skip = min(self._num_skip, block.shape[-1])
+            self._num_skip -= num_skip
+            block = block[..., num_skip:]
+        return block
+
+    def inverse(self, frames):
+        """
+        Appends the STFT `frames` [..., frames, ...] to the stream and
+        returns the samples [..., T] that are complete, i.e. `shift`
+        samples per frame.
+        """
+        frame_axis = -3 if self.stft.complex_representation == 'stacked' else -2
+        if frames.shape[frame_axis] == 0:
+            dtype = frames.real.dtype if frames.is_complex() else frames.dtype
+            return frames.new_zeros(
+                *frames.shape[:frame_axis], 0, dtype=dtype)
+        blocks = self.stft._split_frames(self.stft._synthesis_frames(frames))
+        if self._synthesis_buffer is None:
+            self._synthesis_buffer = blocks.new_zeros(
+                *blocks.shape[:-3], blocks.shape[-2] - 1, blocks.shape[-1])
+        output = []
+        for frame_blocks in blocks.unbind(-3):
+            buffer = torch.cat([
+                self._synthesis_buffer,
+                torch.zeros_like(frame_blocks[..., :1, :])
+            ], dim=-2) + frame_blocks
+            output.append(buffer[..., 0, :])
+            self._synthesis_buffer = buffer[..., 1:, :]
+        return self._emit(torch.cat(output, dim=-1))
+
+    def flush_inverse(self):
+        """
+        Returns the remaining samples of the stream (without the fading of
+        the offline transform) and resets the synthesis.
+        """
+        assert self._synthesis_buffer is not None, 'Nothing to flush.'
+        stft = self.stft
+        time_signal = self._synthesis_buffer.reshape(
+            *self._synthesis_buffer.shape[:-2], -1)
+        # The blocks are zero padded to a multiple of shift
+        num_samples = stft.window_length - stft.shift
+        num_samples -= stft._fading_pad_width()[1]
+        time_signal = self._emit(time_signal[..., :max(num_samples, 0)])
+        self.reset_synthesis()
+        return time_signal
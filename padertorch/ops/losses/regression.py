@@ -10,14 +10,39 @@ def _sqnorm(x, dim=None, keepdim=False):
         return torch.sum(x * x, dim=dim, keepdim=keepdim)
 
 
-def _mse(estimate, target, dim=None):
+def _mse(estimate, target, dim=None, sequence_lengths=None):
     error = torch.abs(estimate - target)
+    if sequence_lengths is not None:
+        assert dim == -1, dim
+        error = _mask(error, sequence_lengths)
+        return torch.sum(error * error, dim=dim) / _lengths(
+            error, sequence_lengths)
     if dim is None:
         return torch.mean(error * error)
     else:
         return torch.mean(error * error, dim=dim)
 
 
+def _lengths(x, sequence_lengths):
+    """
+    Aligns the sequence lengths with the leading axes of `x` (e.g. (B,) with
+    (B, K, T)) and returns them with shape broadcastable to x.shape[:-1].
+    """
+    sequence_lengths = torch.as_tensor(sequence_lengths, device=x.device)
+    assert sequence_lengths.ndim < x.ndim, (sequence_lengths.shape, x.shape)
+    return sequence_lengths.reshape(
+        sequence_lengths.shape
+        + (1,) * (x.ndim - 1 - sequence_lengths.ndim)
+    )
+
+
+def _mask(x, sequence_lengths):
+    """Sets the padded samples of the last axis of `x` to zero."""
+    mask = torch.arange(x.shape[-1], device=x.device) < _lengths(
+        x, sequence_lengths)[..., None]
+    return torch.where(mask, x, torch.zeros_like(x))
+
+
 def _get_scaling_factor(target, estimate):
     return torch.unsqueeze(torch.einsum(
         '...t,...t->...', estimate, target
@@ -45,7 +70,7 @@ def _get_threshold(soft_sdr_max):
 
 
 def mse_loss(estimate: torch.Tensor, target: torch.Tensor,
-             reduction: str = 'sum'):
+             reduction: str = 'sum', sequence_lengths=None):
     """
     Computes the mse loss.
     The `reduction` only affects the speaker dimension; the time dimension is always
@@ -55,6 +80,9 @@ def mse_loss(estimate: torch.Tensor, target: torch.Tensor,
         estimate (... x T): The estimated signal
         target (... x T, same as estimate): The target signal
         reduction: 'mean', 'sum' or 'none'/None for batch dimensions
+        sequence_lengths: The number of valid samples along the last axis.
+            The shape is a prefix of the leading axes, e.g. (B,) for
+            estimate and target (B x K x T). The padded samples are ignored.
 
     Returns:
 
@@ -64,12 +92,19 @@ def mse_loss(estimate: torch.Tensor, target: torch.Tensor,
     tensor(9.3333)
     >>> mse_loss(torch.tensor(estimate), torch.tensor(target), reduction=None)
     tensor([1.0000, 8.3333])
+    >>> mse_loss(torch.tensor(estimate), torch.tensor(target), reduction=None,
+    ...          sequence_lengths=[3, 2])
+    tensor([ 1.0000, 12.5000])
     """
-    return _reduce(_mse(estimate, target, dim=-1), reduction=reduction)
+    return _reduce(
+        _mse(estimate, target, dim=-1, sequence_lengths=sequence_lengths),
+        reduction=reduction
+    )
 
 
 def log_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
-                 reduction: str = 'sum', soft_sdr_max: float = None):
+                 reduction: str = 'sum', soft_sdr_max: float = None,
+                 sequence_lengths=None):
     """
     Computes the log-mse loss between `x` and `y` as defined in [1], eq. 11.
     The `reduction` only affects the speaker dimension; the time dimension is always
@@ -87,6 +122,9 @@ def log_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
         target (... x T, same as estimate): The target signal
         reduction: 'mean', 'sum' or 'none'/None for batch dimensions
         soft_sdr_max: Soft limit for the SDR loss value, see [2] and [3]
+        sequence_lengths: The number of valid samples along the last axis.
+            The shape is a prefix of the leading axes, e.g. (B,) for
+            estimate and target (B x K x T). The padded samples are ignored.
 
     Returns:
         The log-mse error between `estimate` and `target`
@@ -120,16 +158,22 @@ def log_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
     tensor(-1.7758)
     """
     # Use the PyTorch implementation for MSE, should be the fastest
-    loss = _mse(estimate, target, dim=-1)
+    loss = _mse(estimate, target, dim=-1, sequence_lengths=sequence_lengths)
     if soft_sdr_max:
-        loss = loss + _get_threshold(soft_sdr_max) * torch.mean(
-            target*target, dim=-1
-        )
+        if sequence_lengths is None:
+            target_power = torch.mean(target*target, dim=-1)
+        else:
+            target_power = _mse(
+                target, torch.zeros_like(target), dim=-1,
+                sequence_lengths=sequence_lengths,
+            )
+        loss = loss + _get_threshold(soft_sdr_max) * target_power
     return _reduce(torch.log10(loss), reduction=reduction)
 
 
 def sdr_loss(estimate: torch.Tensor, target: torch.Tensor,
-             reduction: str = 'mean', soft_sdr_max: float = None):
+             reduction: str = 'mean', soft_sdr_max: float = None,
+             sequence_lengths=None):
     """
     The (scale dependent) SDR or SNR loss.
 
@@ -138,6 +182,9 @@ def sdr_loss(estimate: torch.Tensor, target: torch.Tensor,
         target (... x T, same as estimate): The target signal
         reduction: 'mean', 'sum' or 'none'/None for batch dimensions
         soft_sdr_max: Soft limit for the SDR loss value as proposed in [1]
+        sequence_lengths: The number of valid samples along the last axis.
+            The shape is a prefix of the leading axes, e.g. (B,) for
+            estimate and target (B x K x T). The padded samples are ignored.
 
     Returns:
 
@@ -162,6 +209,10 @@ def sdr_loss(estimate: torch.Tensor, target: torch.Tensor,
             https://openreview.net/forum?id=qMMzJGRPT2d.
 
     """
+    if sequence_lengths is not None:
+        estimate = _mask(estimate, sequence_lengths)
+        target = _mask(target, sequence_lengths)
+
     # Calculate the SNR. The square in the power computation is moved to the
     # front, thus the 20 in front of the log
     target_norm = _sqnorm(target, dim=-1)
@@ -176,7 +227,8 @@ def sdr_loss(estimate: torch.Tensor, target: torch.Tensor,
 
 
 def si_sdr_loss(estimate, target, reduction='mean', offset_invariant=False,
-                grad_stop=False, soft_sdr_max: float = None):
+                grad_stop=False, soft_sdr_max: float = None,
+                sequence_lengths=None):
     """
     Scale Invariant SDR (SI-SDR) or Scale Invariant SNR (SI-SNR) loss as defined in [1], section 2.2.4.
 
@@ -189,6 +241,9 @@ def si_sdr_loss(estimate, target, reduction='mean', offset_invariant=False,
         grad_stop: If `True`, the gradient is not propagated through the
             calculation of the scaling factor.
         soft_sdr_max: Soft limit for the SDR loss value as proposed in [2]
+        sequence_lengths: The number of valid samples along the last axis.
+            The shape is a prefix of the leading axes, e.g. (B,) for
+            estimate and target (B x K x T). The padded samples are ignored.
 
     References:
         [1] TASNET: TIME-DOMAIN AUDIO SEPARATION NETWORK FOR REAL-TIME,
@@ -276,10 +331,23 @@ def si_sdr_loss(estimate, target, reduction='mean', offset_invariant=False,
         f'Number of speakers should be small (<10, not {estimate.shape[-2]})!'
     )
 
+    if sequence_lengths is not None:
+        # The padded samples are zero, hence they do not contribute to the
+        # energies and the projection
+        estimate = _mask(estimate, sequence_lengths)
+        target = _mask(target, sequence_lengths)
+
     # Remove mean to ensure scale-invariance
     if offset_invariant:
-        estimate = estimate - torch.mean(estimate, dim=(-1,), keepdim=True)
-        target = target - torch.mean(target, dim=(-1,), keepdim=True)
+        if sequence_lengths is None:
+            estimate = estimate - torch.mean(estimate, dim=(-1,), keepdim=True)
+            target = target - torch.mean(target, dim=(-1,), keepdim=True)
+        else:
+            lengths = _lengths(estimate, sequence_lengths)[..., None]
+            estimate = _mask(estimate - torch.sum(
+                estimate, dim=-1, keepdim=True) / lengths, sequence_lengths)
+            target = _mask(target - torch.sum(
+                target, dim=-1, keepdim=True) / lengths, sequence_lengths)
 
     # Compute the scaling factor (alpha)
     scaling_factor = _get_scaling_factor(target, estimate)
@@ -297,7 +365,7 @@ def si_sdr_loss(estimate, target, reduction='mean', offset_invariant=False,
 
 
 def log1p_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
-                   reduction: str = 'sum'):
+                   reduction: str = 'sum', sequence_lengths=None):
     """
     Computes the log1p-mse loss between `x` and `y` as defined in [1], eq. 4.
     The `reduction` only affects the speaker dimension; the time dimension is
@@ -316,6 +384,9 @@ def log1p_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
         estimate (... x T): The estimated signal
         target (... x T, same as estimate): The target signal
         reduction: 'mean', 'sum' or 'none'/None for batch dimensions
+        sequence_lengths: The number of valid samples along the last axis.
+            The shape is a prefix of the leading axes, e.g. (B,) for
+            estimate and target (B x K x T). The padded samples are ignored.
 
     Returns:
         The log1p-mse error between `estimate` and `target`
@@ -336,7 +407,8 @@ def log1p_mse_loss(estimate: torch.Tensor, target: torch.Tensor,
     tensor([0.3010, 0.9700])
     """
     return _reduce(
-        torch.log10(1 + _mse(estimate, target, dim=-1)),
+        torch.log10(1 + _mse(
+            estimate, target, dim=-1, sequence_lengths=sequence_lengths)),
         reduction=reduction
     )
 
@@ -1,12 +1,20 @@
+import functools
+
+import numpy as np
 import torch
 import torch.nn.functional
 import itertools
 import padertorch as pt
+from padertorch.ops.losses.regression import (
+    _mse, _sqnorm, mse_loss, log_mse_loss, log1p_mse_loss, sdr_loss,
+    si_sdr_loss,
+)
 
 
 __all__ = [
     'deep_clustering_loss',
     'pit_loss',
+    'batched_pit_loss',
 ]
 
 
@@ -124,6 +132,86 @@ def pit_loss(
         return min_loss
 
 
+@functools.lru_cache(maxsize=None)
+def _get_permutations(sources, device):
+    """Returns all permutations of `sources` as tensor (sources!, sources)."""
+    return torch.tensor(
+        list(itertools.permutations(range(sources))), device=device)
+
+
+def batched_pit_loss(
+        estimate: torch.Tensor,
+        target: torch.Tensor,
+        loss_fn=functools.partial(mse_loss, reduction=None),
+        *,
+        reduction: str = 'mean',
+        return_permutation: bool = False,
+):
+    """
+    Permutation invariant loss function with a batch axis. In contrast to
+    `pit_loss`, the losses of all pairs of estimates and targets are
+    computed once and all permutations are evaluated by indexing this
+    (B, K, K) loss matrix. There is no Python loop over the examples or the
+    permutations.
+
+    The trailing axes of `estimate` and `target` are flattened, so that
+    `loss_fn` is called once with tensors of shape (B, K, K, N) and must
+    reduce the last axis, e.g. `padertorch.ops.losses.si_sdr_loss` with
+    `reduction=None`.
+
+    Args:
+        estimate: Shape (B, K, ...)
+        target: Same shape as `estimate`
+        loss_fn: Loss function that reduces the last axis.
+        reduction: How the losses of the K speakers are combined, 'mean' or
+            'sum'. Use the reduction that `loss_fn` would use for the
+            speaker axis in `pit_loss`.
+        return_permutation: If `True`, additionally returns the permutation
+            (B, K) that minimizes the loss, i.e. `estimate[b, permutation[b]]`
+            matches `target[b]`.
+
+    Returns:
+        The minimum loss for each example (B,)
+
+    >>> B, K, T = 3, 2, 10
+    >>> target = torch.arange(B * K * T, dtype=torch.float32).reshape(B, K, T)
+    >>> estimate = target.clone()
+    >>> estimate[1] = estimate[1].flip(0)
+    >>> estimate[2, 0] += 1
+    >>> batched_pit_loss(estimate, target, return_permutation=True)
+    (tensor([0.0000, 0.0000, 0.5000]), tensor([[0, 1],
+            [1, 0],
+            [0, 1]]))
+    >>> from padertorch.ops.losses.regression import si_sdr_loss
+    >>> loss = batched_pit_loss(
+    ...     estimate, target, functools.partial(si_sdr_loss, reduction=None))
+    >>> loss.shape
+    torch.Size([3])
+    >>> torch.allclose(loss[2], pit_loss(estimate[2], target[2], 0, si_sdr_loss))
+    True
+    """
+    assert estimate.shape == target.shape, (estimate.shape, target.shape)
+    assert estimate.ndim >= 2, estimate.shape
+    batch_size, sources = estimate.shape[:2]
+    assert sources < 30, f'Are you sure? sources={sources}, estimate.shape={estimate.shape}'
+    shape = (batch_size, sources, sources, -1)
+    pairwise_losses = loss_fn(
+        estimate.reshape(batch_size, sources, 1, -1).expand(shape),
+        target.reshape(batch_size, 1, sources, -1).expand(shape),
+    )
+    assert pairwise_losses.shape == shape[:-1], (
+        'loss_fn has to reduce the last axis', pairwise_losses.shape, shape)
+    # Transpose, so that the permutation maps the targets to the estimates
+    min_loss, permutation = pit_loss_from_loss_matrix(
+        pairwise_losses.transpose(-2, -1), reduction=reduction,
+        return_permutation=True)
+
+    if return_permutation:
+        return min_loss, permutation
+    else:
+        return min_loss
+
+
 def compute_pairwise_losses(
         estimate: torch.Tensor,
         target: torch.Tensor,
@@ -134,6 +222,10 @@ def compute_pairwise_losses(
     The function pit_loss can be more efficient implemented, when the
     loss allows to calculate a pair wise loss. The pair wise losses are
     then written to a matrix (each estimated signal vs each target signal).
+    For the loss functions in `PAIRWISE_LOSS_FN_MAP` (e.g. `si_sdr_loss`,
+    `log_mse_loss` and `torch.nn.functional.cross_entropy`), the matrix is
+    computed in one vectorized pass, otherwise `loss_fn` is called for each
+    pair.
     On the matrix with the pair wise losses the function
     `scipy.optimize.linear_sum_assignment` (Hungarian algorithm) can find the
     best permutation.
@@ -147,7 +239,7 @@ def compute_pairwise_losses(
     Limitation:
         Not every loss function can be factorized in pair_wise losses.
         And sometimes it is difficult to implement the pair wise loss
-        (See the special implementation in this function for cross_entropy).
+        (See the special implementation for cross_entropy).
         One good point is, that most used loss functions can be factorized.
 
     Does not support batch dimension. Does not support PackedSequence.
@@ -200,65 +292,285 @@ def compute_pairwise_losses(
     """
     sources = estimate.size()[axis]
     assert sources < 30, f'Are you sure? sources={sources}'
-    if loss_fn in [torch.nn.functional.cross_entropy]:
-        import einops
 
-        assert axis % estimate.ndimension() == 1, axis
-        estimate_shape = list(estimate.shape)
-        del estimate_shape[1]
-        assert estimate_shape == list(target.shape), (
-            f'{estimate.shape} (N, K, ...) does not match {target.shape} (N, ...)'
-        )
+    if loss_fn in PAIRWISE_LOSS_FN_MAP:
+        return PAIRWISE_LOSS_FN_MAP[loss_fn](estimate, target, axis)
 
-        assert loss_fn == torch.nn.functional.cross_entropy, loss_fn
-        assert axis == 1, axis
+    assert estimate.size() == target.size(), (
+        f'{estimate.size()} != {target.size()}'
+    )
 
-        # torch.einsum does not support reduction of ...
-        return einops.reduce(torch.einsum(
-            'nc...,n...k->n...ck',
-            -torch.nn.LogSoftmax(dim=1)(estimate),
-            torch.nn.functional.one_hot(target, num_classes=sources).to(estimate.dtype)
-        ), 'n ... c k -> c k', reduction='mean')
+    assert estimate.shape == target.shape, (estimate.shape, target.shape)
+
+    indexer_e = [slice(None), ] * estimate.ndim
+    indexer_t = [slice(None), ] * target.ndim
+    pair_wise_loss_matrix = []
+    for i in range(sources):
+        indexer_e[axis] = i
+        for j in range(0, sources):
+            indexer_t[axis] = j
+            pair_wise_loss_matrix.append(loss_fn(
+                estimate[tuple(indexer_e)],
+                target[tuple(indexer_t)],
+            ))
+    return torch.stack(pair_wise_loss_matrix, 0).reshape(sources, sources)
+
+
+def _pairwise_cross_entropy(estimate, target, axis):
+    import einops
+
+    sources = estimate.size()[axis]
+    assert axis % estimate.ndimension() == 1, axis
+    estimate_shape = list(estimate.shape)
+    del estimate_shape[1]
+    assert estimate_shape == list(target.shape), (
+        f'{estimate.shape} (N, K, ...) does not match {target.shape} (N, ...)'
+    )
+
+    # torch.einsum does not support reduction of ...
+    return einops.reduce(torch.einsum(
+        'nc...,n...k->n...ck',
+        -torch.nn.LogSoftmax(dim=1)(estimate),
+        torch.nn.functional.one_hot(target, num_classes=sources).to(estimate.dtype)
+    ), 'n ... c k -> c k', reduction='mean')
+
+
+def _pairwise_squared_error(estimate, target):
+    return torch.abs(estimate[:, None] - target[None, :]) ** 2
+
+
+def _pairwise_mse(estimate, target):
+    return _mse(estimate[:, None], target[None, :], dim=-1)
+
+
+def _pairwise_log_mse(estimate, target):
+    return torch.log10(_pairwise_mse(estimate, target))
 
-    else:
-        assert estimate.size() == target.size(), (
-            f'{estimate.size()} != {target.size()}'
-        )
 
+def _pairwise_log1p_mse(estimate, target):
+    return torch.log10(1 + _pairwise_mse(estimate, target))
+
+
+def _pairwise_sdr(estimate, target):
+    target_norm = _sqnorm(target, dim=-1)[None, :]
+    denominator = _sqnorm(estimate[:, None] - target[None, :], dim=-1)
+    return -10 * torch.log10(target_norm / denominator)
+
+
+def _pairwise_si_sdr(estimate, target):
+    # The scaling factors of all pairs with one einsum, see
+    # `regression._get_scaling_factor`
+    scaling_factor = torch.einsum(
+        'k...t,l...t->kl...', estimate, target
+    ) / _sqnorm(target, dim=-1)[None, :]
+    s_target = scaling_factor[..., None] * target[None, :]
+    target_norm = _sqnorm(s_target, dim=-1)
+    denominator = _sqnorm(estimate[:, None] - s_target, dim=-1)
+    return -10 * torch.log10(target_norm / denominator)
+
+
+def _pairwise_signal_loss(pairwise_loss_fn, reduction):
+    """
+    Wraps a pairwise loss, that maps estimate and target (K, ..., T) to the
+    losses (K, K, ...), to the signature of `compute_pairwise_losses` and
+    reduces the remaining axes like the loss function does for a pair.
+    """
+    def wrapped(estimate, target, axis):
         assert estimate.shape == target.shape, (estimate.shape, target.shape)
+        sources = estimate.shape[axis]
+        loss = pairwise_loss_fn(
+            torch.movedim(estimate, axis, 0), torch.movedim(target, axis, 0))
+        loss = loss.reshape(sources, sources, -1)
+        if reduction == 'sum':
+            return loss.sum(dim=-1)
+        elif reduction == 'mean':
+            return loss.mean(dim=-1)
+        else:
+            raise ValueError(reduction)
+    return wrapped
+
+
+# Vectorized implementations of `compute_pairwise_losses` for the losses,
+# that are used with PIT. Each loss of the K x K pairs is computed in one
+# pass (broadcasting and einsum) instead of K^2 calls of the loss function.
+# Other loss functions fall back to the loop in `compute_pairwise_losses`.
+# The values take the arguments estimate, target and axis of
+# `compute_pairwise_losses` and return the (K, K) loss matrix.
+PAIRWISE_LOSS_FN_MAP = {
+    torch.nn.functional.mse_loss: _pairwise_signal_loss(
+        _pairwise_squared_error, 'mean'),
+    torch.nn.functional.cross_entropy: _pairwise_cross_entropy,
+    mse_loss: _pairwise_signal_loss(_pairwise_mse, 'sum'),
+    log_mse_loss: _pairwise_signal_loss(_pairwise_log_mse, 'sum'),
+    log1p_mse_loss: _pairwise_signal_loss(_pairwise_log1p_mse, 'sum'),
+    sdr_loss: _pairwise_signal_loss(_pairwise_sdr, 'mean'),
+    si_sdr_loss: _pairwise_signal_loss(_pairwise_si_sdr, 'mean'),
+}
+
+
+def _exhaustive_assignment(cost):
+    """
+    Minimum cost assignment for small K by evaluating all permutations.
+
+    Args:
+        cost: Shape (B, K, K)
+
+    Returns:
+        Shape (B, K), the column for each row.
+    """
+    sources = cost.shape[-1]
+    permutations = _get_permutations(sources, cost.device)
+    # (B, K!): Sum of cost[b, k, permutation[p, k]] over k
+    candidates = cost[:, torch.arange(sources), permutations].sum(dim=-1)
+    return permutations[torch.argmin(candidates, dim=-1)]
+
+
+def _hungarian_assignment(cost):
+    """
+    Minimum cost assignment with the Hungarian algorithm (shortest augmenting
+    paths with potentials, O(K^3)), vectorized over the batch axis.
+
+    Each row i needs at most i steps to find an augmenting path. The loops
+    run this maximum number of steps and mask the finished examples, hence
+    there is no synchronization with the device.
+
+    Args:
+        cost: Shape (B, K, K)
+
+    Returns:
+        Shape (B, K), the column for each row.
+    """
+    batch_size, sources, _ = cost.shape
+    device = cost.device
+    dtype = torch.float64
+    batch = torch.arange(batch_size, device=device)
+    inf = torch.tensor(float('inf'), dtype=dtype, device=device)
+
+    # Index 0 is an auxiliary row and column
+    a = torch.zeros(batch_size, sources + 1, sources + 1, dtype=dtype,
+                    device=device)
+    a[:, 1:, 1:] = cost.detach()
+    u = torch.zeros(batch_size, sources + 1, dtype=dtype, device=device)
+    v = torch.zeros(batch_size, sources + 1, dtype=dtype, device=device)
+    # p[b, j]: Row that is assigned to column j, 0 for unassigned
+    p = torch.zeros(batch_size, sources + 1, dtype=torch.long, device=device)
+    way = torch.zeros_like(p)
+
+    for i in range(1, sources + 1):
+        p[:, 0] = i
+        j0 = torch.zeros(batch_size, dtype=torch.long, device=device)
+        minv = torch.full((batch_size, sources + 1), float('inf'),
+                          dtype=dtype, device=device)
+        used = torch.zeros(batch_size, sources + 1, dtype=torch.bool,
+                           device=device)
+        active = torch.ones(batch_size, dtype=torch.bool, device=device)
+
+        # Search the shortest augmenting path
+        for _ in range(i):
+            used[batch, j0] |= active
+            i0 = p[batch, j0]
+            cur = a[batch, i0] - u[batch, i0, None] - v
+            free = ~used
+            update = free & (cur < minv) & active[:, None]
+            minv = torch.where(update, cur, minv)
+            way = torch.where(update, j0[:, None], way)
+            delta, j1 = torch.where(free, minv, inf).min(dim=-1)
+            delta = torch.where(active, delta, torch.zeros_like(delta))
+            u.scatter_add_(
+                1, p, torch.where(used, delta[:, None], torch.zeros_like(u)))
+            v = v - torch.where(used, delta[:, None], torch.zeros_like(v))
+            minv = torch.where(free, minv - delta[:, None], minv)
+            j0 = torch.where(active, j1, j0)
+            active = active & (p[batch, j0] != 0)
+
+        # Augment along the path
+        for _ in range(i):
+            active = j0 != 0
+            j1 = way[batch, j0]
+            p[batch, j0] = torch.where(active, p[batch, j1], p[batch, j0])
+            j0 = torch.where(active, j1, j0)
+
+    columns = torch.empty_like(p)
+    columns.scatter_(1, p, torch.arange(sources + 1, device=device).expand_as(p))
+    return columns[:, 1:] - 1
+
+
+def _batched_pit_loss_from_loss_matrix(
+        pair_wise_loss_matrix, reduction, algorithm, return_permutation,
+):
+    batch_size, sources, _ = pair_wise_loss_matrix.shape
+
+    if algorithm == 'optimal':
+        # The number of permutations grows with K!, the Hungarian algorithm
+        # with K^3 and the number of sequential steps with K^2. On the CPU,
+        # there is no device synchronization to avoid and scipy is faster
+        # than the many small operations of the batched Hungarian algorithm.
+        if sources <= 5:
+            algorithm = 'exhaustive'
+        elif pair_wise_loss_matrix.device.type == 'cpu':
+            algorithm = 'scipy'
+        else:
+            algorithm = 'hungarian'
 
-        indexer_e = [slice(None), ] * estimate.ndim
-        indexer_t = [slice(None), ] * target.ndim
-        pair_wise_loss_matrix = []
-        for i in range(sources):
-            indexer_e[axis] = i
-            for j in range(0, sources):
-                indexer_t[axis] = j
-                pair_wise_loss_matrix.append(loss_fn(
-                    estimate[tuple(indexer_e)],
-                    target[tuple(indexer_t)],
-                ))
-        return torch.stack(pair_wise_loss_matrix, 0).reshape(sources, sources)
+    # We have to detach here because pair_wise_loss_matrix should require grads
+    cost = pair_wise_loss_matrix.detach()
+    if algorithm == 'exhaustive':
+        col_ind = _exhaustive_assignment(cost)
+    elif algorithm == 'hungarian':
+        col_ind = _hungarian_assignment(cost)
+    elif algorithm == 'scipy':
+        import scipy.optimize
+        col_ind = torch.from_numpy(np.stack([
+            scipy.optimize.linear_sum_assignment(c)[1]
+            for c in cost.cpu().numpy()
+        ])).to(cost.device)
+    else:
+        raise ValueError(algorithm)
+
+    min_loss = torch.gather(pair_wise_loss_matrix, -1, col_ind[..., None])[..., 0]
+    if reduction is None:
+        pass
+    elif reduction == 'mean':
+        min_loss = min_loss.mean(dim=-1)
+    elif reduction == 'sum':
+        min_loss = min_loss.sum(dim=-1)
+    else:
+        raise ValueError(reduction)
+
+    if return_permutation:
+        return min_loss, col_ind
+    else:
+        return min_loss
 
 
 def pit_loss_from_loss_matrix(
         pair_wise_loss_matrix,
         *,
         reduction='mean',
-        algorithm: ['optimal', 'greedy'] = 'optimal',
+        algorithm: ['optimal', 'greedy', 'exhaustive', 'hungarian'] = 'optimal',
         return_permutation=False,
 ):
     """
     Calculates the PIT loss given a pair_wise_loss matrix.
+
+    A batch of matrices (B, K, K) stays on the device: The assignment is
+    found with an exhaustive search over all permutations for small K and
+    with a batched Hungarian algorithm for large K.
     
     Args:
-        pair_wise_loss_matrix: shape: (K, K)
+        pair_wise_loss_matrix: shape: (K, K) or (B, K, K)
         reduction: 'mean' or 'sum'
-        algorithm:
+        algorithm: 'optimal', 'hungarian' or 'greedy' for (K, K).
+            'optimal', 'exhaustive', 'hungarian' or 'scipy' for (B, K, K),
+            where 'optimal' selects 'exhaustive' for K <= 5, otherwise
+            'hungarian' on the GPU and 'scipy' on the CPU.
         return_permutation:
 
     Returns:
-        
+        The loss and, with `return_permutation`, the column (target) for
+        each row (estimate). For (B, K, K), the permutation is a tensor
+        (B, K) on the device of `pair_wise_loss_matrix`.
+
     >>> import numpy as np
     >>> score_matrix = np.array([[11., 10, 0],[4, 5, 10],[6, 0, 5]])
     >>> score_matrix
@@ -273,10 +585,22 @@ def pit_loss_from_loss_matrix(
     >>> pit_loss_from_loss_matrix(pair_wise_loss_matrix, reduction=None, algorithm='greedy')
     tensor([-11., -10.,  -0.], dtype=torch.float64)
 
+    >>> pit_loss_from_loss_matrix(
+    ...     torch.stack([pair_wise_loss_matrix, pair_wise_loss_matrix.T]),
+    ...     reduction='sum', return_permutation=True)
+    (tensor([-26., -26.], dtype=torch.float64), tensor([[0, 2, 1],
+            [2, 0, 1]]))
     """
     import scipy.optimize
     from padertorch.utils import to_numpy
 
+    if len(pair_wise_loss_matrix.shape) == 3:
+        assert pair_wise_loss_matrix.shape[-2] == pair_wise_loss_matrix.shape[-1], pair_wise_loss_matrix.shape
+        return _batched_pit_loss_from_loss_matrix(
+            pair_wise_loss_matrix, reduction=reduction, algorithm=algorithm,
+            return_permutation=return_permutation,
+        )
+
     assert len(pair_wise_loss_matrix.shape) == 2, pair_wise_loss_matrix.shape
     assert pair_wise_loss_matrix.shape[-2] == pair_wise_loss_matrix.shape[-1], pair_wise_loss_matrix.shape
     sources = pair_wise_loss_matrix.shape[-1]
@@ -1,7 +1,11 @@
+from . import indexing
+from . import jagged
 from . import pack_module
 from . import pointwise
 from . import reduction
 
+from .indexing import *
+from .jagged import *
 from .pack_module import *
 from .pointwise import *
 from .reduction import *
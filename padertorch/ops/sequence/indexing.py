@@ -0,0 +1,231 @@
+"""
+Index based operations on zero-padded batches of sequences with the shape
+(batch, time, ...). Instead of looping over the examples in python, the
+index tensors are computed once from the sequence lengths and each operation
+is a single gather or scatter, e.g.:
+
+    index = pack_index(sequence_lengths, total_length=T)
+    packed = pack_batch(x, index=index)
+    ...
+    x = unpack_batch(packed, sequence_lengths, index=index, total_length=T)
+"""
+import torch
+
+__all__ = [
+    'length_mask',
+    'reverse_index',
+    'reverse_sequence',
+    'pack_index',
+    'pack_batch',
+    'unpack_batch',
+    'packed_sequence_index',
+]
+
+
+def _as_lengths(sequence_lengths, device=None):
+    return torch.as_tensor(sequence_lengths, dtype=torch.long, device=device)
+
+
+def length_mask(sequence_lengths, total_length=None, device=None):
+    """
+    Boolean mask with the shape (batch, time) that is True for the frames
+    that are not padded.
+
+    >>> length_mask([3, 1], total_length=4)
+    tensor([[ True,  True,  True, False],
+            [ True, False, False, False]])
+
+    Args:
+        sequence_lengths: List or tensor with the length of each example.
+        total_length: Size of the time axis. Defaults to the maximum length.
+        device: Device of the mask. Defaults to the device of
+            `sequence_lengths`.
+
+    Returns:
+        Boolean tensor with the shape (batch, total_length)
+    """
+    sequence_lengths = _as_lengths(sequence_lengths, device)
+    if total_length is None:
+        total_length = int(sequence_lengths.max())
+    time = torch.arange(total_length, device=sequence_lengths.device)
+    return time < sequence_lengths[:, None]
+
+
+def reverse_index(sequence_lengths, total_length=None, device=None):
+    """
+    Index into the flattened batch and time axis of a tensor with the shape
+    (batch, total_length, ...), that reverses each example within its
+    length. Padded frames map to themselves.
+
+    >>> reverse_index([3, 1], total_length=4)
+    tensor([[2, 1, 0, 3],
+            [4, 5, 6, 7]])
+
+    Args:
+        sequence_lengths: List or tensor with the length of each example.
+        total_length: Size of the time axis. Defaults to the maximum length.
+        device: Device of the index. Defaults to the device of
+            `sequence_lengths`.
+
+    Returns:
+        Long tensor with the shape (batch, total_length)
+    """
+    sequence_lengths = _as_lengths(sequence_lengths, device)
+    if total_length is None:
+        total_length = int(sequence_lengths.max())
+    time = torch.arange(total_length, device=sequence_lengths.device)
+    lengths = sequence_lengths[:, None]
+    index = torch.where(time < lengths, lengths - 1 - time, time)
+    offset = torch.arange(
+        len(sequence_lengths), device=sequence_lengths.device
+    ) * total_length
+    return index + offset[:, None]
+
+
+def reverse_sequence(x, sequence_lengths=None, *, index=None, mask=None):
+    """
+    Reverses each example of the zero-padded tensor `x` with the shape
+    (batch, time, ...) within its length. The padded frames of the output
+    are zero.
+
+    >>> x = torch.arange(1., 5.).expand(2, 4)
+    >>> reverse_sequence(x, [3, 4])
+    tensor([[3., 2., 1., 0.],
+            [4., 3., 2., 1.]])
+    >>> reverse_sequence(reverse_sequence(x, [3, 4]), [3, 4])
+    tensor([[1., 2., 3., 0.],
+            [1., 2., 3., 4.]])
+
+    Args:
+        x: Tensor with the shape (batch, time, ...)
+        sequence_lengths: Length of each example. If None, all examples are
+            reversed along the whole time axis.
+        index: Precomputed `reverse_index(sequence_lengths, time)`.
+        mask: Precomputed `length_mask(sequence_lengths, time)`.
+
+    Returns:
+        Tensor with the shape of `x`
+    """
+    if sequence_lengths is None and index is None:
+        return x.flip(1)
+    B, T = x.shape[:2]
+    if index is None:
+        index = reverse_index(sequence_lengths, T, device=x.device)
+    if mask is None:
+        mask = length_mask(sequence_lengths, T, device=x.device)
+    x = x.reshape(B * T, *x.shape[2:]).index_select(0, index.reshape(-1))
+    x = x.reshape(B, T, *x.shape[1:])
+    mask = mask.reshape(B, T, *[1] * (x.dim() - 2))
+    return torch.where(mask, x, x.new_zeros(()))
+
+
+def pack_index(sequence_lengths, total_length=None, device=None):
+    """
+    Index of the non-padded frames in the flattened batch and time axis of a
+    tensor with the shape (batch, total_length, ...).
+
+    >>> pack_index([3, 1], total_length=4)
+    tensor([0, 1, 2, 4])
+
+    Args:
+        sequence_lengths: List or tensor with the length of each example.
+        total_length: Size of the time axis. Defaults to the maximum length.
+        device: Device of the index. Defaults to the device of
+            `sequence_lengths`.
+
+    Returns:
+        Long tensor with the shape (sum(sequence_lengths),)
+    """
+    mask = length_mask(sequence_lengths, total_length, device=device)
+    return mask.flatten().nonzero().squeeze(1)
+
+
+def pack_batch(x, sequence_lengths=None, *, index=None):
+    """
+    Concatenates the non-padded frames of the examples in `x`, i.e.
+    combines the batch (0) and time (1) axis and removes the padding.
+    In contrast to `pack_padded_sequence`, the time steps are not
+    interleaved. It can be reverted with `unpack_batch`.
+
+    >>> x = torch.arange(8).reshape(2, 4)
+    >>> pack_batch(x, [3, 1])
+    tensor([0, 1, 2, 4])
+
+    Args:
+        x: Tensor with the shape (batch, time, ...)
+        sequence_lengths: Length of each example.
+        index: Precomputed `pack_index(sequence_lengths, time)`.
+
+    Returns:
+        Tensor with the shape (sum(sequence_lengths), ...)
+    """
+    B, T = x.shape[:2]
+    if index is None:
+        index = pack_index(sequence_lengths, T, device=x.device)
+    return x.reshape(B * T, *x.shape[2:]).index_select(0, index)
+
+
+def unpack_batch(x, sequence_lengths, *, index=None, total_length=None):
+    """
+    Inverse of `pack_batch`. Scatters the frames of `x` into a zero-padded
+    tensor.
+
+    >>> unpack_batch(torch.tensor([0, 1, 2, 4]), [3, 1])
+    tensor([[0, 1, 2],
+            [4, 0, 0]])
+
+    Args:
+        x: Tensor with the shape (sum(sequence_lengths), ...)
+        sequence_lengths: Length of each example.
+        index: Precomputed `pack_index(sequence_lengths, total_length)`.
+        total_length: Size of the time axis of the output. Defaults to the
+            maximum length.
+
+    Returns:
+        Tensor with the shape (batch, total_length, ...)
+    """
+    if total_length is None:
+        total_length = int(_as_lengths(sequence_lengths).max())
+    if index is None:
+        index = pack_index(sequence_lengths, total_length, device=x.device)
+    B = len(sequence_lengths)
+    out = x.new_zeros(B * total_length, *x.shape[1:]).index_copy(0, index, x)
+    return out.reshape(B, total_length, *x.shape[1:])
+
+
+def packed_sequence_index(sequence_lengths, offsets=None):
+    """
+    Computes where the frames of the data of a `PackedSequence` are in the
+    concatenation of the sequences.
+
+    >>> index, batch_sizes, sorted_indices = packed_sequence_index([2, 3])
+    >>> index, batch_sizes, sorted_indices
+    (tensor([2, 0, 3, 1, 4]), tensor([2, 2, 1]), tensor([1, 0]))
+
+    Args:
+        sequence_lengths: List with the length of each sequence.
+        offsets: Start of each sequence in the concatenation. Defaults to
+            the cumulative sum of the lengths.
+
+    Returns:
+        index: `concatenation[index]` is the data of the `PackedSequence`
+        batch_sizes: `batch_sizes` of the `PackedSequence`
+        sorted_indices: `sorted_indices` of the `PackedSequence` or None,
+            when the lengths are already sorted in decreasing order.
+    """
+    # The lengths are known on the host, so the index is computed on the CPU
+    sequence_lengths = _as_lengths(sequence_lengths, device='cpu')
+    if offsets is None:
+        offsets = torch.cumsum(sequence_lengths, 0) - sequence_lengths
+    else:
+        offsets = _as_lengths(offsets, device='cpu')
+    sorted_lengths, sorted_indices = torch.sort(
+        sequence_lengths, descending=True, stable=True)
+    if torch.equal(sorted_lengths, sequence_lengths):
+        sorted_indices = None
+    else:
+        offsets = offsets[sorted_indices]
+    time = torch.arange(int(sorted_lengths[0]))[:, None]
+    mask = time < sorted_lengths
+    index = (offsets + time)[mask]
+    return index, mask.sum(1), sorted_indices
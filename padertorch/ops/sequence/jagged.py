@@ -0,0 +1,250 @@
+"""
+A batch of sequences with different lengths as one buffer of frames and the
+offsets of the sequences in that buffer. Compared to the other
+representations in `padertorch.ops.sequence`
+
+ - list of tensors,
+ - `PackedSequence` (interleaved time steps) and
+ - padded tensor with `sequence_lengths`,
+
+it stores no padding, and the frames of each sequence are contiguous, so
+the list view is free and elementwise operations act on a single tensor:
+
+>>> import padertorch as pt
+>>> x = JaggedTensor.from_list([torch.ones(3, 2), 2 * torch.ones(1, 2)])
+>>> x
+JaggedTensor(values=torch.Size([4, 2]), sequence_lengths=[3, 1])
+>>> pt.ops.sequence.log(x).to_padded()[..., 0]
+tensor([[0.0000, 0.0000, 0.0000],
+        [0.6931, 0.0000, 0.0000]])
+>>> pt.ops.sequence.sequence_reduction(torch.sum, x, axis=(1, 2))
+tensor([6., 4.])
+
+The axes of a `JaggedTensor` refer to the padded batch-first tensor, i.e.
+(batch, time, ...).
+"""
+import torch
+from torch.nn.utils.rnn import PackedSequence
+
+from padertorch.ops.sequence.indexing import length_mask
+from padertorch.ops.sequence.indexing import pack_index
+from padertorch.ops.sequence.indexing import packed_sequence_index
+
+__all__ = [
+    'JaggedTensor',
+]
+
+
+class JaggedTensor:
+    """
+    Args:
+        values: Tensor with the shape (sum(sequence_lengths), ...), i.e. the
+            frames of all sequences, one sequence after the other.
+        offsets: Long tensor with the shape (batch + 1,). Sequence `b`
+            is `values[offsets[b]:offsets[b + 1]]`.
+        sequence_lengths: Optional list with the length of each sequence.
+            Avoids the transfer of the offsets to the host, when the lengths
+            are known.
+    """
+    def __init__(self, values, offsets, sequence_lengths=None):
+        self.values = values
+        self.offsets = torch.as_tensor(
+            offsets, dtype=torch.long, device=values.device)
+        if sequence_lengths is not None:
+            sequence_lengths = [int(l) for l in sequence_lengths]
+            assert len(sequence_lengths) == len(self.offsets) - 1, (
+                sequence_lengths, self.offsets)
+        self._sequence_lengths = sequence_lengths
+
+    @classmethod
+    def from_lengths(cls, values, sequence_lengths):
+        """`values` with the sequences one after the other, e.g. the output
+        of `pack_batch`. Does not copy."""
+        lengths = torch.as_tensor(sequence_lengths, device=values.device)
+        offsets = torch.nn.functional.pad(torch.cumsum(lengths, 0), [1, 0])
+        if torch.is_tensor(sequence_lengths):
+            sequence_lengths = None
+        return cls(values, offsets, sequence_lengths)
+
+    @classmethod
+    def from_list(cls, list_of_tensors):
+        """
+        >>> JaggedTensor.from_list([torch.zeros(3), torch.ones(2)]).values
+        tensor([0., 0., 0., 1., 1.])
+        """
+        assert isinstance(list_of_tensors, (tuple, list)), type(list_of_tensors)
+        return cls.from_lengths(
+            torch.cat(list_of_tensors),
+            [len(t) for t in list_of_tensors],
+        )
+
+    @classmethod
+    def from_padded(cls, padded, sequence_lengths, batch_first=True):
+        """
+        Gathers the non-padded frames of `padded`. Does not copy, when
+        there is no padding and `padded` is batch first and contiguous.
+
+        >>> padded = torch.tensor([[1, 2, 3], [4, 0, 0]])
+        >>> JaggedTensor.from_padded(padded, [3, 1]).values
+        tensor([1, 2, 3, 4])
+        """
+        if not batch_first:
+            padded = padded.transpose(0, 1)
+        B, T = padded.shape[:2]
+        if torch.is_tensor(sequence_lengths):
+            # One transfer to the host
+            sequence_lengths = sequence_lengths.tolist()
+        assert len(sequence_lengths) == B, (len(sequence_lengths), B)
+        if all(l == T for l in sequence_lengths):
+            values = padded.reshape(B * T, *padded.shape[2:])
+        else:
+            index = pack_index(sequence_lengths, T, device=padded.device)
+            values = padded.reshape(
+                B * T, *padded.shape[2:]).index_select(0, index)
+        return cls.from_lengths(values, sequence_lengths)
+
+    @classmethod
+    def from_packed(cls, packed_sequence: PackedSequence):
+        """
+        Inverse of `to_packed`.
+
+        >>> from torch.nn.utils.rnn import pack_sequence
+        >>> packed = pack_sequence([torch.zeros(3), torch.ones(2)])
+        >>> JaggedTensor.from_packed(packed).values
+        tensor([0., 0., 0., 1., 1.])
+        """
+        batch_sizes = packed_sequence.batch_sizes
+        # Length of the b-th sequence in the sorted order
+        sorted_lengths = (
+            torch.arange(int(batch_sizes[0]))[:, None] < batch_sizes
+        ).sum(1)
+        sequence_lengths = sorted_lengths
+        if packed_sequence.unsorted_indices is not None:
+            sequence_lengths = sorted_lengths[
+                packed_sequence.unsorted_indices.cpu()]
+        index, _, _ = packed_sequence_index(sequence_lengths)
+        inverse = torch.empty_like(index)
+        inverse[index] = torch.arange(len(index))
+        data = packed_sequence.data
+        return cls.from_lengths(
+            data.index_select(0, inverse.to(data.device)),
+            sequence_lengths.tolist(),
+        )
+
+    @property
+    def sequence_lengths(self):
+        """List with the length of each sequence."""
+        if self._sequence_lengths is None:
+            self._sequence_lengths = torch.diff(self.offsets).tolist()
+        return self._sequence_lengths
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def device(self):
+        return self.values.device
+
+    @property
+    def requires_grad(self):
+        return self.values.requires_grad
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def dim(self):
+        """Number of dimensions of the padded tensor."""
+        return self.values.dim() + 1
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}(values={self.values.shape}, '
+            f'sequence_lengths={self.sequence_lengths})'
+        )
+
+    def with_values(self, values):
+        """New `JaggedTensor` with the offsets of `self`, e.g. for the output
+        of an elementwise operation on `self.values`."""
+        assert len(values) == len(self.values), (values.shape, self)
+        return self.__class__(values, self.offsets, self._sequence_lengths)
+
+    def to(self, *args, **kwargs):
+        values = self.values.to(*args, **kwargs)
+        return self.__class__(
+            values, self.offsets.to(values.device), self._sequence_lengths)
+
+    def to_list(self):
+        """
+        Views of the sequences, does not copy.
+
+        >>> JaggedTensor.from_list([torch.zeros(3), torch.ones(2)]).to_list()
+        [tensor([0., 0., 0.]), tensor([1., 1.])]
+        """
+        return list(self.values.split(self.sequence_lengths))
+
+    def mask(self, total_length=None):
+        """Boolean mask with the shape (batch, total_length) of the frames
+        of the padded tensor, see `to_padded`."""
+        if total_length is None:
+            total_length = max(self.sequence_lengths, default=0)
+        return length_mask(self.offsets.diff(), total_length)
+
+    def to_padded(self, total_length=None, batch_first=True):
+        """
+        Zero-padded tensor with the shape (batch, total_length, ...). Does not
+        copy, when all sequences have the length `total_length`.
+
+        >>> x = JaggedTensor.from_list([torch.ones(3), torch.ones(1)])
+        >>> x.to_padded()
+        tensor([[1., 1., 1.],
+                [1., 0., 0.]])
+        >>> x.to_padded(batch_first=False).shape
+        torch.Size([3, 2])
+        """
+        B = len(self)
+        if total_length is None:
+            total_length = max(self.sequence_lengths, default=0)
+        if all(l == total_length for l in self.sequence_lengths):
+            padded = self.values.view(B, total_length, *self.values.shape[1:])
+        else:
+            index = pack_index(
+                self.sequence_lengths, total_length, device=self.device)
+            padded = self.values.new_zeros(
+                B * total_length, *self.values.shape[1:]
+            ).index_copy(0, index, self.values).view(
+                B, total_length, *self.values.shape[1:])
+        if not batch_first:
+            padded = padded.transpose(0, 1)
+        return padded
+
+    def to_packed(self):
+        """
+        `PackedSequence`, where the sequences are sorted by length, when
+        necessary. The `unsorted_indices` restore the order.
+
+        >>> x = JaggedTensor.from_list([torch.zeros(2), torch.ones(3)])
+        >>> packed = x.to_packed()
+        >>> packed.data, packed.batch_sizes
+        (tensor([1., 0., 1., 0., 1.]), tensor([2, 2, 1]))
+        >>> JaggedTensor.from_packed(packed).values
+        tensor([0., 0., 1., 1., 1.])
+        """
+        index, batch_sizes, sorted_indices = packed_sequence_index(
+            self.sequence_lengths)
+        if sorted_indices is not None:
+            sorted_indices = sorted_indices.to(self.device)
+        return PackedSequence(
+            self.values.index_select(0, index.to(self.device)),
+            batch_sizes,
+            sorted_indices,
+        )
+
+    def batch_index(self):
+        """Index of the sequence of each frame, i.e. a long tensor with the
+        shape (sum(sequence_lengths),)."""
+        return torch.repeat_interleave(
+            torch.arange(len(self), device=self.device),
+            self.offsets.diff(),
+            output_size=len(self.values),
+        )
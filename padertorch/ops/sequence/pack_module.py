@@ -7,6 +7,7 @@ list of tensor
 # ToDo add contiguous to pack_padded_sequence if needed
 # TODO: Improve speed of pack_sequence by avoiding padding inbetween
 """
+import numpy as np
 import torch
 from torch.nn.utils.rnn import PackedSequence
 from torch.nn.utils.rnn import pad_packed_sequence
@@ -14,6 +15,8 @@ from torch.nn.utils.rnn import pack_padded_sequence
 from torch.nn.utils.rnn import pack_sequence
 from torch.nn.utils.rnn import pad_sequence
 
+from padertorch.ops.sequence.indexing import packed_sequence_index
+
 __all__ = [
     'pack_sequence',
     'unpack_sequence',
@@ -31,7 +34,12 @@ def unpack_sequence(packed_sequence: PackedSequence) -> list:
 
 
 def unpad_sequence(padded_sequence: torch.Tensor, lengths: list):
-    return [padded_sequence[:l, b, ...] for b, l in enumerate(lengths)]
+    if torch.is_tensor(lengths):
+        # One transfer to the host instead of one per example
+        lengths = lengths.tolist()
+    return [
+        sequence[:l] for sequence, l in zip(padded_sequence.unbind(1), lengths)
+    ]
 
 
 def pack_sequence_include_channel(list_of_tensors):
@@ -104,14 +112,13 @@ def pack_sequence_include_channel(list_of_tensors):
     """
     assert isinstance(list_of_tensors, (tuple, list))
 
-    sequences = [
-        sequence
-        for entry in list_of_tensors
-        # Assume splitting of the tensor entry is cheap enough and later
-        # the python loop efficient enough with the memcopy.
-        for sequence in entry
-    ]
-    return pack_sequence(sequences)
+    index, batch_sizes, sorted_indices = _channel_packed_sequence_index(
+        list_of_tensors)
+    data = torch.cat([
+        entry.reshape(-1, *entry.shape[2:]) for entry in list_of_tensors
+    ])
+    return PackedSequence(
+        data.index_select(0, index.to(data.device)), batch_sizes, sorted_indices)
 
 
 def unpack_sequence_include_channel_like(packed, like):
@@ -123,22 +130,27 @@ def unpack_sequence_include_channel_like(packed, like):
     """
     assert isinstance(like, (tuple, list))
 
-    padded_sequence, lengths = pad_packed_sequence(packed)
-    lengths = lengths.tolist()
+    index, batch_sizes, _ = _channel_packed_sequence_index(like)
+    assert torch.equal(batch_sizes, packed.batch_sizes), (
+        batch_sizes, packed.batch_sizes)
 
-    new = []
-    index = 0
+    # Invert the permutation of the frames
+    inverse = torch.empty_like(index)
+    inverse[index] = torch.arange(len(index))
+    data = packed.data.index_select(0, inverse.to(packed.data.device))
 
-    for entry in like:
-        channels = entry.shape[0]
-        ls, lengths = lengths[:channels], lengths[channels:]
-
-        assert len(set(ls)) == 1, ls
-        length = ls[0]
+    sizes = [entry.shape[0] * entry.shape[1] for entry in like]
+    return [
+        sequence.reshape(entry.shape[:2] + sequence.shape[1:])
+        for sequence, entry in zip(data.split(sizes), like)
+    ]
 
-        new.append(
-            padded_sequence[:length, index:index+channels].transpose(0, 1)
-        )
-        index = index + channels
 
-    return new
+def _channel_packed_sequence_index(list_of_tensors):
+    """`packed_sequence_index` for the channels of a list of tensors with the
+    shape (channel, sequence_length, ...), see
+    `pack_sequence_include_channel`.
+    """
+    channels = [entry.shape[0] for entry in list_of_tensors]
+    lengths = np.repeat([entry.shape[1] for entry in list_of_tensors], channels)
+    return packed_sequence_index(lengths)
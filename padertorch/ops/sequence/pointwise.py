@@ -2,6 +2,8 @@ import torch
 import torch.nn
 from functools import partial
 
+from padertorch.ops.sequence.jagged import JaggedTensor
+
 
 __all__ = [
     'sequence_elementwise',
@@ -18,12 +20,15 @@ __all__ = [
 
 
 def sequence_elementwise(function, x, *args, **kwargs):
-    """Expects the desired function and a `Tensor` or `PackedSequence`."""
+    """Expects the desired function and a `Tensor`, `PackedSequence` or
+    `JaggedTensor`."""
     if isinstance(x, torch.nn.utils.rnn.PackedSequence):
         return torch.nn.utils.rnn.PackedSequence(
             function(x.data, *args, **kwargs),
             x.batch_sizes
         )
+    elif isinstance(x, JaggedTensor):
+        return x.with_values(function(x.values, *args, **kwargs))
     else:
         return function(x, *args, **kwargs)
 
@@ -1,5 +1,15 @@
 import torch
 from padertorch.utils import normalize_axis
+from padertorch.ops.sequence.jagged import JaggedTensor
+
+# Reductions along time of a `JaggedTensor` with `torch.segment_reduce`
+_SEGMENT_REDUCE = {
+    torch.sum: 'sum',
+    torch.mean: 'mean',
+    torch.amax: 'max',
+    torch.amin: 'min',
+    torch.prod: 'prod',
+}
 
 
 def packed_batch_sizes_to_sequence_lengths(batch_sizes: list):
@@ -78,9 +88,26 @@ def sequence_reduction(function, x, *args, axis=None, keepdims=False, **kwargs):
     sequence_reduction(torch.sum, packed_x, axis=(0, 1, 3), keepdims=True)
 
 
+    The axes of a `JaggedTensor` refer to the padded batch-first tensor.
+    Reductions along time of a `JaggedTensor` with one of `torch.sum`,
+    `torch.mean`, `torch.amax`, `torch.amin` and `torch.prod` are a single
+    `torch.segment_reduce`, other functions loop over the sequences.
+
+    >>> x = JaggedTensor.from_list([torch.ones(3, 2), torch.ones(1, 2)])
+    >>> sequence_reduction(torch.sum, x, axis=1)
+    tensor([[3., 3.],
+            [1., 1.]])
+    >>> sequence_reduction(torch.sum, x, axis=1, keepdims=True)
+    JaggedTensor(values=torch.Size([2, 2]), sequence_lengths=[1, 1])
+    >>> sequence_reduction(torch.sum, x, axis=(0, 1, 2))
+    tensor(8.)
+
     TODO: May need to check for `batch_first` property of `PackedSequence`,
     TODO: but this is only known during creation time.
     """
+    if isinstance(x, JaggedTensor):
+        return _jagged_reduction(
+            function, x, *args, axis=axis, keepdims=keepdims, **kwargs)
     axis = normalize_axis(x, axis)
     if isinstance(x, torch.nn.utils.rnn.PackedSequence):
         # May need to respect `batch_first` property?
@@ -136,3 +163,56 @@ def sequence_reduction(function, x, *args, axis=None, keepdims=False, **kwargs):
                 )
     else:
         return function(x, *args, dim=axis, keepdim=keepdims, **kwargs)
+
+
+def _reduce(function, x, *args, dim, keepdim, **kwargs):
+    """`function(x, dim=dim)` for a list `dim`, also for `torch.prod`, which
+    only reduces a single axis."""
+    if function is torch.prod:
+        for d in sorted(dim, reverse=True):
+            x = function(x, *args, dim=d, keepdim=keepdim, **kwargs)
+        return x
+    return function(x, *args, dim=dim, keepdim=keepdim, **kwargs)
+
+
+def _jagged_reduction(function, x, *args, axis=None, keepdims=False, **kwargs):
+    if not isinstance(axis, (tuple, list)):
+        axis = (axis,)
+    axis = sorted({a % x.dim() for a in axis})
+    batch_axis, time_axis = 0, 1
+    # Axes of `x.values`, where batch and time are collapsed
+    value_axis = [a - 1 for a in axis if a != batch_axis]
+    if time_axis not in axis:
+        if batch_axis in axis:
+            raise NotImplementedError(
+                'It is not well defined how to reduce along batch axis '
+                'when not reducing along time.'
+            )
+        return x.with_values(_reduce(
+            function, x.values, *args, dim=value_axis, keepdim=keepdims,
+            **kwargs))
+    elif batch_axis in axis:
+        result = _reduce(
+            function, x.values, *args, dim=value_axis, keepdim=keepdims,
+            **kwargs)
+        if keepdims:
+            result = result.unsqueeze(0)
+        return result
+
+    other_axis = [a for a in value_axis if a != 0]
+    if function in _SEGMENT_REDUCE and not args and not kwargs:
+        values = x.values
+        if other_axis:
+            values = _reduce(function, values, dim=other_axis, keepdim=True)
+        result = torch.segment_reduce(
+            values, _SEGMENT_REDUCE[function], offsets=x.offsets, axis=0)
+    else:
+        result = torch.stack([
+            _reduce(
+                function, sequence, *args, dim=value_axis, keepdim=True,
+                **kwargs)
+            for sequence in x.to_list()
+        ]).squeeze(1)
+    if keepdims:
+        return JaggedTensor.from_lengths(result, [1] * len(x))
+    return result.squeeze(other_axis) if other_axis else result
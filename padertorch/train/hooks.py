@@ -312,6 +312,10 @@ class SummaryHook(TriggeredHook):
 
         for key, timing in self.compute_timings(trainer.train_timer).items():
             self.summary['timings'][key] = timing
+        # Stages of the data pipeline, see padertorch.data.profiler
+        for key, timing in pt.data.profiler.summarize_timings(
+                pt.data.profiler.pop_timings(self.summary_prefix)).items():
+            self.summary['timings'][key] = timing
         self.summary = trainer.model.modify_summary(self.summary)
         # Assert the intermediate types were converted in he modify summary
         assert len(self.summary['buffers']) == 0, "intermediate format buffers has to be converted during modify_summary"
@@ -501,6 +505,9 @@ class ValidationHook(SummaryHook):
         assert len(self.summary['timings']) == 0, self.summary['timings']
         for key, timing in self.compute_timings(trainer.validate_timer).items():
             self.summary['timings'][key] = timing
+        for key, timing in pt.data.profiler.summarize_timings(
+                pt.data.profiler.pop_timings(self.summary_prefix)).items():
+            self.summary['timings'][key] = timing
         try:
             self.summary = trainer.model.modify_summary(self.summary)
         except Exception as e:
@@ -23,6 +23,7 @@ import padertorch as pt
 from padertorch.configurable import Configurable
 from padertorch.train.optimizer import Optimizer, Adam
 from padertorch.train.runtime_tests import test_run
+from padertorch.data.shared_memory import SharedBatch
 from padertorch.train.hooks import *
 
 __all__ = [
@@ -541,7 +542,11 @@ class Trainer(Configurable):
         try:
             # TODO: Backup OutOfMemory
             with timer['time_per_to_device']:
-                example = model.example_to_device(example, device)
+                if isinstance(example, SharedBatch):
+                    example = example.to_device(
+                        device, model.example_to_device)
+                else:
+                    example = model.example_to_device(example, device)
             with timer['time_per_forward']:
                 model_out = model(example)
             with timer['time_per_review']:
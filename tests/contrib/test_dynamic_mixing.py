@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+import soundfile
+import torch
+
+import padertorch as pt
+from padertorch.contrib.data.dynamic_mixing import (
+    DynamicMixer, get_source_dataset, benchmark
+)
+
+
+@pytest.fixture
+def mixtures(tmp_path):
+    """Small wsj0-2mix like database with mixtures of two sources."""
+    rng = np.random.RandomState(0)
+    mixtures = {}
+    for i in range(6):
+        num_samples = rng.randint(500, 2000)
+        paths = []
+        for k in range(2):
+            path = str(tmp_path / f's{k + 1}_{i}.wav')
+            soundfile.write(
+                path, rng.uniform(-0.5, 0.5, num_samples), 8000,
+                subtype='FLOAT')
+            paths.append(path)
+        observation = str(tmp_path / f'mix_{i}.wav')
+        soundfile.write(
+            observation, sum(soundfile.read(p)[0] for p in paths), 8000,
+            subtype='FLOAT')
+        mixtures[str(i)] = {
+            'example_id': str(i),
+            'audio_path': {'observation': observation,
+                           'speech_source': paths},
+            'num_samples': num_samples,
+            'speaker_id': [f'spk{i % 3}', f'spk{i % 3 + 3}'],
+        }
+    return mixtures
+
+
+@pytest.mark.parametrize('length', [None, 1000])
+def test_mixture_is_sum_of_read_regions(mixtures, length):
+    sources = get_source_dataset(mixtures.values())
+    assert len(sources) == 12
+    mixer = DynamicMixer(sources, num_speakers=2, length=length,
+                         normalize=False)
+    for index in range(len(mixer)):
+        plan = mixer.plan(epoch=0, index=index)
+        example = mixer(plan)
+        assert example['s'].shape == (2, plan['num_samples'])
+        assert example['y'].shape == (plan['num_samples'],)
+        assert example['s'].dtype == example['y'].dtype == np.float32
+        assert len(set(example['speaker_id'])) == 2
+        np.testing.assert_allclose(example['y'], example['s'].sum(0),
+                                   rtol=1e-6)
+        np.testing.assert_allclose(np.sum(plan['log_weights']), 0, atol=1e-9)
+        for s, source, log_weight in zip(
+                example['s'], plan['sources'], plan['log_weights']):
+            expected = np.zeros(plan['num_samples'])
+            data = soundfile.read(source['audio_path'])[0]
+            region = data[source['start']:source['stop']]
+            expected[source['offset']:source['offset'] + len(region)] = region
+            np.testing.assert_allclose(
+                s, expected * 10 ** (log_weight / 20), rtol=1e-5, atol=1e-7)
+
+
+def test_epochs(mixtures):
+    mixer = DynamicMixer(get_source_dataset(mixtures.values()), length=400)
+    dataset = mixer.get_dataset()
+    epoch_0 = list(dataset)
+    epoch_1 = list(dataset)
+    assert len(epoch_0) == len(epoch_1) == len(mixer)
+    assert epoch_0 != epoch_1
+    assert epoch_0 == list(mixer.get_dataset(epoch=0))
+    assert epoch_1 == list(mixer.get_dataset(start_epoch=1))
+    assert mixer.get_dataset(epoch=1)[3] == epoch_1[3]
+
+
+def test_too_few_sources(mixtures):
+    sources = get_source_dataset(mixtures.values())[:1]
+    for distinct_speakers in [True, False]:
+        with pytest.raises(AssertionError, match='sources'):
+            DynamicMixer(sources, distinct_speakers=distinct_speakers)
+
+
+def test_prefetch(mixtures, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    mixer = DynamicMixer(get_source_dataset(mixtures.values()), length=400)
+    dataset = mixer.get_dataset().map(mixer)
+    expected = [example['y'] for example in mixer.get_dataset(0).map(mixer)]
+    prefetched = dataset.prefetch(2, 4, backend='concurrent_mp')
+    ys = [example['y'] for example in prefetched]
+    assert len(ys) == len(expected)
+    for y, y_expected in zip(ys, expected):
+        np.testing.assert_equal(y, y_expected)
+
+
+def test_batched_mix_on_torch(mixtures):
+    mixer = DynamicMixer(get_source_dataset(mixtures.values()), length=300)
+    dataset = mixer.get_dataset(0)
+    examples = list(dataset.map(mixer))
+    batch = pt.data.utils.collate_fn(list(dataset.map(mixer.read)))
+    batch = DynamicMixer.mix({
+        's': torch.tensor(np.stack(batch['s'])),
+        'log_weights': torch.tensor(batch['log_weights']),
+    })
+    assert batch['y'].shape == (len(examples), 300)
+    np.testing.assert_allclose(
+        batch['y'].numpy(), np.stack([ex['y'] for ex in examples]),
+        rtol=1e-5, atol=1e-6)
+
+
+def test_benchmark(tmp_path, mixtures):
+    import json
+    json_path = tmp_path / 'db.json'
+    with json_path.open('w') as fid:
+        json.dump({'datasets': {'train': mixtures}}, fid)
+    results = benchmark(json_path, 'train', length=400, num_examples=6)
+    assert results.keys() == {'premixed', 'dynamic'}
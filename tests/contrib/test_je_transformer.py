@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import torch
+
+from padertorch.contrib.je.modules.transformer import (
+    scaled_dot_product_attention, TransformerLayerStack
+)
+
+
+def scaled_dot_product_attention_ref(q, k, v, seq_len, bidirectional, mask):
+    y = q @ k.transpose(-2, -1) / np.sqrt(k.shape[-1])
+    if mask is not None:
+        y = y + torch.log((mask > 0).float())
+    if not bidirectional:
+        causal = torch.tril(
+            torch.ones_like(y), diagonal=(y.shape[-1] - y.shape[-2]))
+        y = y + torch.log(causal)
+    elif seq_len is not None:
+        key_mask = torch.arange(y.shape[-1]) < torch.tensor(seq_len)[
+            (slice(None),) + (None,) * (y.dim() - 1)]
+        y = y + torch.log(key_mask.float())
+    y = torch.softmax(y, dim=-1)
+    return y @ v, y
+
+
+@pytest.mark.parametrize('bidirectional', [True, False])
+@pytest.mark.parametrize('seq_len', [None, [7, 3]])
+@pytest.mark.parametrize('use_mask', [False, True])
+@pytest.mark.parametrize('shape', [(2, 7, 7), (2, 3, 7), (2, 1, 7), (2, 3, 5, 7)])
+def test_scaled_dot_product_attention(bidirectional, seq_len, use_mask, shape):
+    *batch, Tq, Tk = shape
+    q = torch.randn(*batch, Tq, 4, requires_grad=True)
+    k = torch.randn(*batch, Tk, 4, requires_grad=True)
+    v = torch.randn(*batch, Tk, 6, requires_grad=True)
+    mask = None
+    if use_mask:
+        mask = (torch.rand(Tq, Tk) > 0.3).float()
+        mask[:, 0] = 1
+    x_ref, w_ref = scaled_dot_product_attention_ref(
+        q, k, v, seq_len, bidirectional, mask)
+    grad = torch.randn_like(x_ref)
+    grads_ref = torch.autograd.grad(x_ref, (q, k, v), grad)
+    for need_weights in [True, False]:
+        x, w = scaled_dot_product_attention(
+            q, k, v, seq_len=seq_len, bidirectional=bidirectional, mask=mask,
+            need_weights=need_weights,
+        )
+        np.testing.assert_allclose(
+            x.detach().numpy(), x_ref.detach().numpy(), atol=1e-5)
+        if need_weights:
+            np.testing.assert_allclose(
+                w.detach().numpy(), w_ref.detach().numpy(), atol=1e-6)
+        else:
+            assert w is None
+        for g, g_ref in zip(
+                torch.autograd.grad(x, (q, k, v), grad), grads_ref):
+            np.testing.assert_allclose(g.numpy(), g_ref.numpy(), atol=1e-5)
+
+
+@pytest.mark.parametrize('cross_attention', [False, True])
+def test_incremental_decoding(cross_attention):
+    torch.manual_seed(0)
+    stack = TransformerLayerStack(
+        5, 8, 16, num_heads=2, num_layers=3, bidirectional=False,
+        cross_attention=cross_attention,
+    ).eval()
+    x = torch.randn(2, 9, 5)
+    m = torch.randn(2, 4, 8) if cross_attention else None
+    seq_len_m = [4, 2] if cross_attention else None
+    y_ref, _ = stack(x, seq_len=None, m=m, seq_len_m=seq_len_m)
+
+    ys, cache = [], None
+    for t in range(x.shape[1]):
+        y, cache = stack.step(
+            x[:, t:t + 1], cache=cache, m=m, seq_len_m=seq_len_m)
+        ys.append(y)
+    np.testing.assert_allclose(
+        torch.cat(ys, 1).detach().numpy(), y_ref.detach().numpy(), atol=1e-5)
+    assert len(cache) == 3
+    assert cache[0][0].shape == (2, 2, 9, 4)
+
+    # Chunks of several frames
+    y_0, cache = stack.step(x[:, :4], m=m, seq_len_m=seq_len_m)
+    y_1, cache = stack.step(x[:, 4:], cache=cache, m=m, seq_len_m=seq_len_m)
+    np.testing.assert_allclose(
+        torch.cat((y_0, y_1), 1).detach().numpy(), y_ref.detach().numpy(),
+        atol=1e-5,
+    )
@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+import pytest
+import soundfile
+
+pytest.importorskip('samplerate')
+from padertorch.contrib.je.data.transforms import AudioReader, LabelEncoder
+
+
+@pytest.fixture
+def examples(tmp_path):
+    rng = np.random.RandomState(0)
+    examples = []
+    for i in range(8):
+        path = str(tmp_path / f'{i}.wav')
+        data = rng.uniform(-0.5, 0.5, size=(rng.randint(100, 2000), 2)) * i
+        soundfile.write(path, data, 16000, subtype='FLOAT')
+        examples.append({
+            'example_id': str(i), 'dataset': f'd{i % 2}', 'audio_path': path,
+            'events': [f'e{i % 3}', f'e{i % 5}'],
+        })
+    return examples
+
+
+def _reference_norm(audio_reader, examples, normalization_type):
+    norms = {}
+    for example in examples:
+        audio = audio_reader._prenormalize(
+            audio_reader.load(example['audio_path']))
+        for key in [example['dataset'], 'global_norm']:
+            norms.setdefault(key, []).append(audio)
+    if normalization_type == 'power':
+        return {
+            key: np.sqrt(np.mean(np.concatenate(audio, -1) ** 2, -1, keepdims=True))
+            for key, audio in norms.items()
+        }
+    return {
+        key: np.abs(np.concatenate(audio, -1)).max(-1, keepdims=True)
+        for key, audio in norms.items()
+    }
+
+
+@pytest.mark.parametrize('normalization_type', ['power', 'max'])
+@pytest.mark.parametrize('num_workers', [0, 2])
+def test_initialize_norm(tmp_path, examples, normalization_type, num_workers):
+    audio_reader = AudioReader(
+        normalization_type=normalization_type,
+        normalization_domain='dataset', channelwise_norm=True,
+        storage_dir=str(tmp_path),
+    )
+    audio_reader.initialize_norm(examples[:5], num_workers=num_workers)
+    expected = _reference_norm(audio_reader, examples[:5], normalization_type)
+    assert audio_reader.norm.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_allclose(audio_reader.norm[key], expected[key])
+
+    # Restore, then update with appended examples
+    audio_reader.initialize_norm()
+    audio_reader.initialize_norm(examples, update=True)
+    expected = _reference_norm(audio_reader, examples, normalization_type)
+    with (tmp_path / 'audio_norm.json').open() as fid:
+        stored = json.load(fid)
+    for key in expected:
+        np.testing.assert_allclose(audio_reader.norm[key], expected[key])
+        np.testing.assert_allclose(stored[key], expected[key])
+
+
+def test_initialize_labels(tmp_path, examples):
+    encoder = LabelEncoder('events', storage_dir=str(tmp_path))
+    encoder.initialize_labels(dataset=examples[:2], num_workers=2)
+    assert list(encoder.label_mapping) == ['e0', 'e1']
+    encoder.initialize_labels(dataset=examples, update=True)
+    assert list(encoder.label_mapping) == ['e0', 'e1', 'e2', 'e3', 'e4']
+    with (tmp_path / 'events.json').open() as fid:
+        assert json.load(fid) == ['e0', 'e1', 'e2', 'e3', 'e4']
+
+
+def test_initialize_norm_ignores_stale_state(tmp_path, examples):
+    def reference_norm(normalization_type):
+        audio_reader = AudioReader(
+            normalization_type=normalization_type,
+            normalization_domain='global',
+        )
+        audio_reader.initialize_norm(examples)
+        return audio_reader.norm['global_norm']
+
+    audio_reader = AudioReader(
+        normalization_type='power', normalization_domain='global',
+        storage_dir=str(tmp_path),
+    )
+    audio_reader.initialize_norm(examples[:5], update=True)
+
+    # Without update, a recompute does not reuse the state
+    (tmp_path / 'audio_norm.json').unlink()
+    audio_reader.initialize_norm(examples)
+    np.testing.assert_allclose(
+        audio_reader.norm['global_norm'], reference_norm('power'))
+
+    # A state of another normalization type is discarded
+    audio_reader.normalization_type = 'max'
+    with pytest.warns(UserWarning, match='stale'):
+        audio_reader.initialize_norm(examples, update=True)
+    np.testing.assert_allclose(
+        audio_reader.norm['global_norm'], reference_norm('max'))
+
+
+def test_initialize_labels_without_labels(tmp_path, examples):
+    encoder = LabelEncoder('missing', storage_dir=str(tmp_path))
+    encoder.initialize_labels(dataset=[])
+    assert encoder.label_mapping == {}
+
+    for i, example in enumerate(examples):
+        example['class'] = i % 3
+    encoder = LabelEncoder('class', storage_dir=str(tmp_path))
+    encoder.initialize_labels(dataset=examples[:4], update=True)
+    encoder.initialize_labels(dataset=examples, update=True)
+    assert encoder.label_mapping == {0: 0, 1: 1, 2: 2}
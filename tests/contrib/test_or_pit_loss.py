@@ -0,0 +1,68 @@
+import functools
+
+import numpy as np
+import pytest
+import torch
+
+import padertorch as pt
+from padertorch.contrib.examples.source_separation.or_pit.model import (
+    one_and_rest_permutation_invariant_loss,
+    batched_one_and_rest_permutation_invariant_loss,
+)
+
+
+@pytest.mark.parametrize('fill_missing_with_zeros', [False, True])
+@pytest.mark.parametrize('loss_fn', [
+    pt.ops.losses.log_mse_loss, pt.ops.losses.mse_loss,
+])
+def test_batched_equals_loop(loss_fn, fill_missing_with_zeros):
+    rng = np.random.RandomState(0)
+    B, K_max, T = 7, 4, 50
+    num_targets = torch.tensor([0, 1, 2, 3, 4, 2, 4])
+    targets = torch.tensor(rng.randn(B, K_max, T))
+    for b, k in enumerate(num_targets):
+        targets[b, k:] = 0
+    inputs = torch.tensor(rng.randn(B, 2, T), requires_grad=True)
+
+    loss, perm = batched_one_and_rest_permutation_invariant_loss(
+        inputs, targets, num_targets,
+        functools.partial(loss_fn, reduction=None),
+        fill_missing_with_zeros=fill_missing_with_zeros,
+    )
+    loss.sum().backward()
+    grad, inputs.grad = inputs.grad, None
+
+    for b, k in enumerate(num_targets):
+        reference_loss, reference_perm = one_and_rest_permutation_invariant_loss(
+            inputs[b], targets[b, :k], loss_fn,
+            fill_missing_with_zeros=fill_missing_with_zeros,
+        )
+        np.testing.assert_allclose(
+            loss[b].detach(), reference_loss.detach().reshape(()), rtol=1e-7)
+        assert perm[b] == reference_perm
+        if reference_loss.requires_grad:
+            reference_loss.sum().backward()
+    if inputs.grad is None:
+        inputs.grad = torch.zeros_like(inputs)
+    np.testing.assert_allclose(grad, inputs.grad, rtol=1e-7)
+
+
+def test_sequence_lengths():
+    log_mse_loss = functools.partial(pt.ops.losses.log_mse_loss, reduction=None)
+
+    rng = np.random.RandomState(1)
+    B, K, T = 3, 3, 40
+    sequence_lengths = torch.tensor([40, 25, 10])
+    targets = torch.tensor(rng.randn(B, K, T))
+    inputs = torch.tensor(rng.randn(B, 2, T))
+    loss, perm = batched_one_and_rest_permutation_invariant_loss(
+        inputs, targets, torch.tensor([K] * B), log_mse_loss,
+        sequence_lengths=sequence_lengths,
+    )
+    for b, seq_len in enumerate(sequence_lengths):
+        reference_loss, reference_perm = batched_one_and_rest_permutation_invariant_loss(
+            inputs[b:b + 1, :, :seq_len], targets[b:b + 1, :, :seq_len],
+            torch.tensor([K]), log_mse_loss,
+        )
+        np.testing.assert_allclose(loss[b], reference_loss[0], rtol=1e-7)
+        assert perm[b] == reference_perm[0]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import soundfile
+
+from padertorch.contrib.data.packed_audio import (
+    PackedAudioWriter, PackedAudioReader, benchmark
+)
+
+
+@pytest.fixture
+def audio_files(tmp_path):
+    rng = np.random.RandomState(0)
+    files = []
+    for i, (channels, subtype, ext) in enumerate([
+        (1, 'PCM_16', 'wav'), (2, 'PCM_16', 'wav'), (1, 'FLOAT', 'wav'),
+        (2, 'PCM_16', 'flac'), (1, 'PCM_24', 'wav'), (2, 'PCM_32', 'wav'),
+        (1, 'DOUBLE', 'wav'),
+    ]):
+        path = str(tmp_path / f'{i}.{ext}')
+        data = rng.uniform(-0.5, 0.5, size=(rng.randint(100, 2000), channels))
+        soundfile.write(path, data, 16000, subtype=subtype)
+        files.append(path)
+    return files
+
+
+@pytest.mark.parametrize('format', ['pcm', 'encoded'])
+def test_packed_reads_equal_soundfile(tmp_path, audio_files, format):
+    output_dir = tmp_path / 'packed'
+    with PackedAudioWriter(output_dir, format, shard_size=4000) as writer:
+        writer.add_all(audio_files, num_workers=2)
+    assert len(writer.shards) > 1
+
+    reader = PackedAudioReader(output_dir / 'index.json')
+    assert len(reader) == len(audio_files)
+    for path in audio_files:
+        for start, stop in [(0, None), (10, 50), (-30, None)]:
+            for always_2d in [True, False]:
+                expected, sr = soundfile.read(
+                    path, start=start, stop=stop, always_2d=always_2d)
+                data, sample_rate = reader.read(
+                    path, start, stop, always_2d=always_2d)
+                assert sample_rate == sr == 16000
+                assert data.dtype == expected.dtype
+                np.testing.assert_equal(data, expected)
+
+
+def test_audio_reader(tmp_path, audio_files):
+    pytest.importorskip('samplerate')
+    from padertorch.contrib.je.data.transforms import AudioReader
+
+    output_dir = tmp_path / 'packed'
+    with PackedAudioWriter(output_dir) as writer:
+        writer.add_all(audio_files[:2])
+    for path in audio_files:
+        expected = AudioReader().load(path, 5, 80)
+        audio = AudioReader(
+            packed_audio=str(output_dir / 'index.json')).load(path, 5, 80)
+        np.testing.assert_equal(audio, expected)
+
+
+def test_benchmark(tmp_path, audio_files):
+    with PackedAudioWriter(tmp_path / 'packed') as writer:
+        writer.add_all(audio_files)
+    results = benchmark(
+        tmp_path / 'packed' / 'index.json', segment_length=50, num_reads=20)
+    assert set(results.keys()) == {'per_file', 'packed'}
+
+
+def test_add_all_bounds_reads_in_flight(tmp_path):
+    paths = []
+    for i in range(20):
+        paths.append(str(tmp_path / f'{i}.wav'))
+        soundfile.write(paths[-1], np.zeros(100), 16000)
+    num_started = []
+
+    class Writer(PackedAudioWriter):
+        def _read(self, path):
+            # Number of reads, whose data is not yet written
+            num_started.append(len(num_started) - len(self.entries))
+            return super()._read(path)
+
+    with Writer(tmp_path / 'packed') as writer:
+        writer.add_all(paths, num_workers=2)
+    assert len(writer.entries) == 20
+    assert max(num_started) < 4
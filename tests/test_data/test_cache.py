@@ -0,0 +1,139 @@
+import dataclasses
+import functools
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from padertorch.data.cache import FeatureCache, get_transform_config
+from padertorch.data.cache import _config_hash
+
+
+@dataclasses.dataclass
+class Features:
+    size: int = 100
+    calls: int = dataclasses.field(default=0, init=False, compare=False)
+
+    def __call__(self, example):
+        self.calls += 1
+        rng = np.random.RandomState(int(example['example_id']))
+        example['features'] = rng.randn(3, self.size).astype(np.float32)
+        example['num_frames'] = self.size
+        example['nested'] = {'mask': np.ones(self.size, dtype=bool)}
+        return example
+
+
+def _example(i):
+    return {'example_id': str(i), 'audio_path': f'{i}.wav'}
+
+
+def test_hit_is_zero_copy_view(tmp_path):
+    transform = Features()
+    cache = FeatureCache(transform, tmp_path)
+    expected = [cache(_example(i)) for i in range(5)]
+    assert transform.calls == 5
+
+    # A new instance (e.g. in the next run) reads the index from disk
+    cache = FeatureCache(transform, tmp_path)
+    for i in range(5):
+        example = cache(_example(i))
+        np.testing.assert_equal(example['features'], expected[i]['features'])
+        np.testing.assert_equal(
+            example['nested']['mask'], expected[i]['nested']['mask'])
+        assert example['num_frames'] == 100
+        assert example['audio_path'] == f'{i}.wav'
+        assert isinstance(example['features'].base, np.memmap)
+        assert not example['features'].flags.writeable
+        assert example['features'].ctypes.data % 64 == 0
+    assert transform.calls == 5
+    assert cache.statistics == {'hits': 5, 'misses': 0}
+
+
+def test_cache_keys(tmp_path):
+    cache = FeatureCache(Features(), tmp_path, cache_keys=['features'])
+    cache(_example(0))
+    example = cache({**_example(0), 'other': 1})
+    assert cache.statistics['hits'] == 1
+    assert set(example.keys()) == {
+        'example_id', 'audio_path', 'other', 'features'}
+
+
+def test_config_change_invalidates(tmp_path):
+    cache = FeatureCache(Features(size=10), tmp_path)
+    assert cache(_example(0))['features'].shape == (3, 10)
+    cache = FeatureCache(Features(size=20), tmp_path)
+    assert cache(_example(0))['features'].shape == (3, 20)
+    assert cache.statistics == {'hits': 0, 'misses': 1}
+    cache = FeatureCache(Features(size=10), tmp_path)
+    assert cache(_example(0))['features'].shape == (3, 10)
+    assert cache.statistics == {'hits': 1, 'misses': 0}
+
+
+@dataclasses.dataclass
+class Warped:
+    base: callable
+    warp: callable = np.sqrt
+
+    def __call__(self, example):
+        return self.base(example)
+
+
+def test_nested_transform_config():
+    def config_hash(transform):
+        return _config_hash(get_transform_config(transform))
+
+    assert config_hash(Warped(Features(10))) \
+        != config_hash(Warped(Features(20)))
+    assert config_hash(Warped(Features(10), np.log)) \
+        != config_hash(Warped(Features(10)))
+    assert config_hash(Warped(functools.partial(np.round, decimals=1))) \
+        != config_hash(Warped(functools.partial(np.round, decimals=2)))
+    assert config_hash(Warped(Features(10).__call__)) \
+        != config_hash(Warped(Features(20).__call__))
+    with pytest.raises(TypeError, match='lambda'):
+        config_hash(Warped(lambda example: example))
+
+
+def test_eviction(tmp_path):
+    shard_size = 4 * 3 * 1000 * 4
+    cache = FeatureCache(
+        Features(size=1000), tmp_path, shard_size=shard_size,
+        max_size=3 * shard_size,
+    )
+    for i in range(40):
+        cache(_example(i))
+    cache.evict()
+    total = sum(f.stat().st_size for f in tmp_path.glob('*/*.bin'))
+    assert total <= 3 * shard_size + 2 * shard_size
+    # Evicted entries are recomputed, recent entries are hits
+    cache = FeatureCache(Features(size=1000), tmp_path)
+    cache(_example(39))
+    cache(_example(0))
+    assert cache.statistics == {'hits': 1, 'misses': 1}
+
+
+def _fill(cache, indices):
+    for i in indices:
+        cache(_example(i))
+
+
+def test_concurrent_writers(tmp_path):
+    num_workers = 3
+    cache = FeatureCache(Features(), tmp_path)
+    ctx = multiprocessing.get_context('spawn')
+    processes = [
+        ctx.Process(target=_fill, args=(cache, range(i, 20, num_workers)))
+        for i in range(num_workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+    assert len(list(cache.storage_dir.glob('*.bin'))) == num_workers
+
+    transform = Features()
+    for i in range(20):
+        np.testing.assert_equal(
+            cache(_example(i))['features'], transform(_example(i))['features'])
+    assert cache.statistics == {'hits': 20, 'misses': 0}
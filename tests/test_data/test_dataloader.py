@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+import torch
+import lazy_dataset
+from lazy_dataset import FilterException
+
+from padertorch.data import as_dataloader, LengthBucketBatchSampler
+
+
+def _transform(example):
+    if example['index'] % 5 == 0:
+        raise FilterException()
+    return {
+        **example,
+        'noise': np.random.uniform(size=1),
+        'data': np.full(example['index'] % 7 + 1, example['index']),
+    }
+
+
+def _dataset(num_examples=40):
+    return lazy_dataset.new(
+        [{'index': i} for i in range(num_examples)]).map(_transform)
+
+
+def _expected_indices(num_examples=40):
+    return [i for i in range(num_examples) if i % 5 != 0]
+
+
+@pytest.mark.parametrize('num_workers', [0, 2])
+def test_map_style(num_workers):
+    dataloader = as_dataloader(
+        _dataset(), batch_size=4, shuffle=True, num_workers=num_workers,
+        seed=0,
+    )
+    batches = list(dataloader)
+    assert all(len(batch) <= 4 for batch in batches)
+    indices = [ex['index'] for batch in batches for ex in batch]
+    assert sorted(indices) == _expected_indices()
+    assert indices != sorted(indices)
+
+
+class _CountCalls:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, example):
+        worker_info = torch.utils.data.get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+        (self.directory / f'{example["index"]}_{worker_id}').touch()
+        return example
+
+
+@pytest.mark.parametrize('num_workers', [0, 3])
+def test_iterable(tmp_path, num_workers):
+    dataset = lazy_dataset.new(
+        [{'index': i} for i in range(40)]
+    ).map(_CountCalls(tmp_path)).map(_transform).catch()
+    assert not dataset.indexable
+    dataloader = as_dataloader(dataset, num_workers=num_workers)
+    indices = [ex['index'] for ex in dataloader]
+    assert sorted(indices) == _expected_indices()
+    # Each example is only transformed in one worker
+    assert len(list(tmp_path.iterdir())) == 40
+    with pytest.raises(AssertionError):
+        as_dataloader(dataset, batch_size=2)
+
+
+def test_iterable_without_indexable_prefix():
+    dataset = lazy_dataset.concatenate(
+        _dataset(20).catch(), _dataset(20).catch())
+    with pytest.warns(UserWarning, match='indexable prefix'):
+        dataloader = as_dataloader(dataset, num_workers=2)
+    indices = [ex['index'] for ex in dataloader]
+    assert sorted(indices) == sorted(2 * _expected_indices(20))
+
+
+def test_reproducible_seeding():
+    def noise(seed):
+        dataloader = as_dataloader(
+            _dataset(), batch_size=2, num_workers=2, seed=seed)
+        return [
+            [ex['noise'][0] for batch in dataloader for ex in batch]
+            for _ in range(2)
+        ]
+
+    first_epoch, second_epoch = noise(0)
+    assert first_epoch == noise(0)[0]
+    assert first_epoch != second_epoch
+    # The workers do not share the random state
+    assert len(set(first_epoch)) == len(first_epoch)
+
+
+def test_seed_without_workers():
+    def noise(seed):
+        dataloader = as_dataloader(_dataset(), batch_size=2, seed=seed)
+        return [
+            [ex['noise'][0] for batch in dataloader for ex in batch]
+            for _ in range(2)
+        ]
+
+    first_epoch, second_epoch = noise(0)
+    assert first_epoch == noise(0)[0]
+    assert first_epoch != second_epoch
+
+
+def _worker_init_fn(worker_id):
+    np.random.seed(1000 + worker_id)
+
+
+def test_worker_init_fn():
+    dataloader = as_dataloader(
+        _dataset(), batch_size=2, num_workers=2, seed=0,
+        worker_init_fn=_worker_init_fn,
+    )
+    noise = [ex['noise'][0] for batch in dataloader for ex in batch]
+    # The worker_init_fn of the user is called after the seeding
+    assert noise[0] == np.random.RandomState(1000).uniform(size=1)[0]
+
+
+def test_batch_sampler_and_tensors():
+    dataset = lazy_dataset.new(
+        [{'index': i} for i in range(1, 40)]).map(_transform)
+    lengths = [i % 7 + 1 for i in range(1, 40)]
+    sampler = LengthBucketBatchSampler(lengths, max_total_length=16, seed=0)
+
+    def collate(batch):
+        return {'data': np.concatenate([ex['data'] for ex in batch])}
+
+    dataloader = as_dataloader(
+        dataset, batch_sampler=sampler, collate_fn=collate, num_workers=2,
+        pin_memory=True,
+    )
+    batches = list(dataloader)
+    assert len(batches) == len(sampler)
+    assert all(isinstance(batch['data'], torch.Tensor) for batch in batches)
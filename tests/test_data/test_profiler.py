@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+import pytest
+import lazy_dataset
+
+import padertorch as pt
+from padertorch.data.profiler import DataProfiler, pop_timings
+
+
+def _load(example):
+    time.sleep(0.001)
+    return example
+
+
+def _feature(example):
+    return example * 2
+
+
+@pytest.mark.parametrize('backend', ['t', 'concurrent_mp'])
+def test_worker_timings_reach_main_process(backend, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    profiler = DataProfiler(flush_interval=0)
+    dataset = lazy_dataset.new(list(range(20)))
+    dataset = dataset.map(profiler('load', _load))
+    dataset = dataset.map(profiler('feature', _feature))
+    assert list(dataset.prefetch(2, 4, backend=backend)) == list(
+        range(0, 40, 2))
+
+    timings = {}
+    for _ in range(50):
+        for stage, durations in profiler.pop_timings().items():
+            timings[stage] = np.concatenate(
+                [timings.get(stage, []), durations])
+        if len(timings.get('feature', [])) == 20:
+            break
+        time.sleep(0.01)
+    assert len(timings['load']) == 20
+    assert np.all(timings['load'] >= 0.001)
+    assert len(timings['feature']) == 20
+
+
+def test_pending_worker_timings_are_flushed_at_exit(monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    # The interval is never reached, the workers only send at exit
+    profiler = DataProfiler(flush_interval=1000)
+    dataset = lazy_dataset.new(list(range(20))).map(profiler('load', _load))
+    assert len(list(dataset.prefetch(2, 4, backend='concurrent_mp'))) == 20
+
+    durations = []
+    for _ in range(50):
+        durations.extend(profiler.pop_timings().get('load', []))
+        if len(durations) == 20:
+            break
+        time.sleep(0.01)
+    assert len(durations) == 20
+
+
+def test_pop_timings_by_name():
+    pop_timings()
+    train_fn = DataProfiler()('stft', _feature)
+    validation_fn = DataProfiler(name='validation')('stft', _feature)
+    for i in range(3):
+        train_fn(i)
+    validation_fn(0)
+    assert len(pop_timings('validation')['stft']) == 1
+    assert len(pop_timings('training')['stft']) == 3
+    assert pop_timings() == {}
+
+
+class _SummaryWriter:
+    def __init__(self):
+        self.scalars = {}
+
+    def add_scalar(self, tag, scalar, iteration):
+        self.scalars[tag] = scalar
+
+
+class _Model(pt.Model):
+    def forward(self, inputs):
+        pass
+
+    def review(self, inputs, outputs):
+        pass
+
+
+def test_summary_hook():
+    pop_timings()
+    profiler = DataProfiler()
+    fn = profiler('stft', _feature)
+    for i in range(10):
+        fn(i)
+
+    class Trainer:
+        train_timer = pt.trainer.ContextTimerDict()
+        model = _Model()
+        writer = _SummaryWriter()
+        iteration = 0
+
+    hook = pt.train.hooks.SummaryHook((1, 'iteration'))
+    hook.finalize_summary(Trainer)
+    hook.dump_summary(Trainer)
+    assert Trainer.writer.scalars['training_timings/data/stft/count'] == 10
+    assert set(Trainer.writer.scalars) == {
+        f'training_timings/data/stft/{key}'
+        for key in ['count', 'mean', 'p50', 'p90', 'p99']
+    }
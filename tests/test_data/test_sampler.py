@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+import lazy_dataset
+
+from padertorch.data.sampler import LengthBucketBatchSampler
+
+
+@pytest.mark.parametrize('num_buckets', [1, 4, 13])
+@pytest.mark.parametrize('shuffle_within_buckets', [True, False])
+def test_budget_and_coverage(num_buckets, shuffle_within_buckets):
+    lengths = np.random.RandomState(0).randint(100, 1000, size=200)
+    sampler = LengthBucketBatchSampler(
+        lengths, max_total_length=4000, num_buckets=num_buckets,
+        shuffle_within_buckets=shuffle_within_buckets, seed=1,
+    )
+    batches = sampler.batches()
+    for batch in batches:
+        assert len(batch) * lengths[batch].max() <= 4000
+    assert sorted(np.concatenate(batches).tolist()) == list(range(200))
+    assert 0 <= sampler.padding_ratio < 1
+    assert sampler.statistics['num_batches'] == len(batches)
+
+
+def test_sorted_buckets_reduce_padding():
+    lengths = np.random.RandomState(0).randint(100, 1000, size=500)
+    sorted_sampler = LengthBucketBatchSampler(
+        lengths, max_total_length=4000, shuffle_within_buckets=False)
+    sorted_sampler.batches()
+    random_sampler = LengthBucketBatchSampler(
+        lengths, max_total_length=4000, num_buckets=1)
+    random_sampler.batches()
+    assert sorted_sampler.padding_ratio < random_sampler.padding_ratio
+
+
+def test_reproducible_and_reshuffled():
+    lengths = np.random.RandomState(0).randint(100, 1000, size=100)
+
+    def epochs(seed):
+        sampler = LengthBucketBatchSampler(
+            lengths, max_total_length=4000, seed=seed)
+        return [sampler.batches() for _ in range(2)]
+
+    first, second = epochs(0)
+    assert first == epochs(0)[0]
+    assert first != second
+
+
+def test_long_examples_and_batch_size_limits():
+    lengths = [10, 1, 1, 1, 1, 1]
+    sampler = LengthBucketBatchSampler(
+        lengths, max_total_length=5, max_batch_size=2, min_batch_size=2,
+        num_buckets=1, shuffle_within_buckets=False, shuffle_batches=False,
+    )
+    assert sampler.batches() == [[1, 2], [3, 4]]
+    sampler = LengthBucketBatchSampler(
+        lengths, max_total_length=5, num_buckets=1,
+        shuffle_within_buckets=False, shuffle_batches=False,
+    )
+    assert sampler.batches() == [[1, 2, 3, 4, 5], [0]]
+
+
+def test_apply_to_dataset():
+    examples = {
+        f'ex{i}': {'example_id': f'ex{i}', 'num_samples': n}
+        for i, n in enumerate([3, 8, 2, 7, 5, 1])
+    }
+    lengths = {k: v['num_samples'] for k, v in examples.items()}
+    ds = lazy_dataset.new(examples)
+    sampler = LengthBucketBatchSampler(lengths, max_total_length=10, seed=0)
+    batched = ds.apply(sampler, lazy=True)
+    for _ in range(2):
+        batches = list(batched)
+        assert sorted(
+            ex['example_id'] for batch in batches for ex in batch
+        ) == sorted(examples)
+        for batch in batches:
+            assert len(batch) * max(
+                ex['num_samples'] for ex in batch) <= 10
+
+
+def test_len_does_not_change_batches():
+    lengths = np.random.RandomState(0).randint(100, 1000, size=100)
+
+    def sampler():
+        return LengthBucketBatchSampler(
+            lengths, max_total_length=4000, seed=0)
+
+    expected = sampler().batches()
+    s = sampler()
+    assert len(s) == len(expected)
+    assert s.batches() == expected
+
+
+def test_batch_sampler_of_dataloader():
+    torch = pytest.importorskip('torch')
+    examples = [{'num_samples': n} for n in [3, 8, 2, 7, 5, 1]]
+    with pytest.raises(ValueError, match='dataset'):
+        list(LengthBucketBatchSampler('num_samples', max_total_length=10))
+    sampler = LengthBucketBatchSampler(
+        'num_samples', max_total_length=10, dataset=examples)
+    loader = torch.utils.data.DataLoader(
+        examples, batch_sampler=sampler, collate_fn=lambda batch: batch)
+    assert len(loader) == len(sampler)
+    batches = list(loader)
+    assert sorted(ex['num_samples'] for b in batches for ex in b) \
+        == [1, 2, 3, 5, 7, 8]
@@ -281,3 +281,108 @@ def test_length_mode():
             segmented = segmenter(ex)
             np.testing.assert_equal(segmented[0]['x'],
                                     np.arange(0, new_length[idx][mode]))
+
+
+def test_views_and_shared_values():
+    segmenter = Segmenter(length=32000, include_keys=('audio_data',),
+                          shift=16000)
+    ex = {'audio_data': {'x': np.arange(65000), 'y': np.arange(65000)},
+          'meta': {'speaker': ['a', 'b']}, 'gender': 'm'}
+    x = ex['audio_data']['x']
+    meta = ex['meta']
+    segmented = segmenter(ex)
+    assert len(segmented) == 3
+    for entry in segmented:
+        assert np.shares_memory(entry['audio_data']['x'], x)
+        assert entry['meta'] is segmented[0]['meta']
+        assert entry['meta']['speaker'] is meta['speaker']
+    assert segmented[0]['audio_data'] is not segmented[1]['audio_data']
+
+
+def test_padding_tail():
+    segmenter = Segmenter(length=950, shift=250, include_keys=('x', 'z'),
+                          padding=True)
+    array = np.random.randn(2, 16000)
+    ex = {'x': array, 'z': torch.tensor(array)}
+    segmented = segmenter(ex)
+    np.testing.assert_equal(segmented[-1]['x'][:, -200:], 0)
+    for entry in segmented:
+        assert entry['x'].shape == (2, 950)
+        np.testing.assert_equal(entry['x'], entry['z'].numpy())
+        start, stop = entry['segment_start'], entry['segment_stop']
+        np.testing.assert_equal(
+            entry['x'][:, :16000 - start], array[:, start:stop])
+
+
+def test_batched():
+    for padding in [True, False]:
+        kwargs = dict(length=950, shift=250,
+                      include_keys=('audio_data.x', 'audio_data.y'),
+                      axis={'audio_data.x': -1, 'audio_data.y': 0},
+                      padding=padding)
+        array = np.random.randn(3, 16000)
+        ex = {'audio_data': {'x': array, 'y': array.T}, 'gender': 'm'}
+        segmented = Segmenter(**kwargs)(ex)
+        batched = Segmenter(batched=True, **kwargs)(ex)
+        assert isinstance(batched, dict), type(batched)
+        assert batched['gender'] == 'm'
+        assert batched['audio_data']['x'].shape == (len(segmented), 3, 950)
+        assert batched['audio_data']['y'].shape == (len(segmented), 950, 3)
+        if not padding:
+            assert np.shares_memory(batched['audio_data']['x'], array)
+        for idx, entry in enumerate(segmented):
+            np.testing.assert_equal(
+                batched['audio_data']['x'][idx], entry['audio_data']['x'])
+            assert batched['segment_start'][idx] == entry['segment_start']
+            assert batched['segment_stop'][idx] == entry['segment_stop']
+
+
+def test_batched_without_segmentation():
+    array = np.random.randn(3, 1000)
+    batched = Segmenter(length=-1, include_keys='x', batched=True)(
+        {'x': array})
+    assert batched['x'].shape == (1, 3, 1000)
+    np.testing.assert_equal(batched['segment_start'], [0])
+    np.testing.assert_equal(batched['segment_stop'], [1000])
+
+
+def test_segment_again():
+    segmenter = Segmenter(length=1000, include_keys='x')
+    ex = {'x': np.arange(8000)}
+    for entry in segmenter(ex):
+        for sub_entry in Segmenter(length=500, include_keys='x')(entry):
+            assert sub_entry['segment_stop'] - sub_entry['segment_start'] \
+                == 500
+
+
+def test_plan_then_read(tmp_path):
+    import soundfile
+    import paderbox as pb
+
+    signals = np.random.uniform(-0.5, 0.5, size=(2, 20000))
+    paths = {}
+    for name, signal in zip(['observation', 'speech_source'], signals):
+        paths[name] = tmp_path / f'{name}.wav'
+        soundfile.write(str(paths[name]), signal, 8000, subtype='FLOAT')
+    ex = {'audio_path': paths, 'num_samples': 20000, 'example_id': 'a'}
+
+    def read(example):
+        start = example.get('audio_start_samples', 0)
+        stop = example.get('audio_stop_samples', None)
+        return {
+            key: pb.io.load_audio(path, start=start, stop=stop)
+            for key, path in example['audio_path'].items()
+        }
+
+    for anchor in ['left', 'random', 'centered_cutout']:
+        segmenter = Segmenter(length=4000, shift=3000, anchor=anchor,
+                              include_keys=('observation', 'speech_source'))
+        planned = segmenter.plan(ex, rng=np.random.RandomState(0))
+        segmented = segmenter(read(ex), rng=np.random.RandomState(0))
+        assert len(planned) == len(segmented)
+        for plan, expected in zip(planned, segmented):
+            assert plan['segment_start'] == expected['segment_start']
+            assert plan['segment_stop'] == expected['segment_stop']
+            audio = read(plan)
+            for key in ['observation', 'speech_source']:
+                np.testing.assert_equal(audio[key], expected[key])
@@ -0,0 +1,77 @@
+import pickle
+
+import numpy as np
+import pytest
+import torch
+import lazy_dataset
+
+from padertorch.data import example_to_device
+from padertorch.data.shared_memory import SharedMemoryTransport, SharedBatch
+
+
+def _batch(i, size=1000):
+    return {
+        'example_id': [f'{i}_a', f'{i}_b'],
+        'x': np.full((2, size), i, dtype=np.float32),
+        'num_frames': np.array([size, size - 1]),
+        'nested': {'y': np.arange(i, i + 6).reshape(2, 3)[:, ::2]},
+    }
+
+
+def _assert_equal(batch, expected):
+    assert batch['example_id'] == expected['example_id']
+    for key in ['x', 'num_frames']:
+        np.testing.assert_equal(batch[key].numpy(), expected[key])
+    np.testing.assert_equal(
+        batch['nested']['y'].numpy(), expected['nested']['y'])
+
+
+def test_handle_is_small_and_slab_is_recycled():
+    transport = SharedMemoryTransport(num_slabs=2, slab_size=2 ** 16)
+    handles = [transport(_batch(i)) for i in range(3)]
+    assert isinstance(handles[0], SharedBatch)
+    assert isinstance(handles[1], SharedBatch)
+    # No free slab: The batch is returned unchanged
+    assert isinstance(handles[2], dict)
+    assert len(pickle.dumps(handles[0])) < 1000
+
+    _assert_equal(example_to_device(handles[0]), _batch(0))
+    assert isinstance(transport(_batch(3)), SharedBatch)
+    transport.close()
+
+
+def test_cpu_tensors_do_not_share_the_slab():
+    transport = SharedMemoryTransport(num_slabs=1, slab_size=2 ** 16)
+    batch = example_to_device(transport(_batch(0)))
+    # The slab is reused for the next batch
+    example_to_device(transport(_batch(1)))
+    _assert_equal(batch, _batch(0))
+    transport.close()
+
+
+def test_allocate():
+    transport = SharedMemoryTransport(num_slabs=1, slab_size=2 ** 16)
+    x = transport.allocate((2, 1000), np.float32)
+    x[:] = 1
+    handle = transport({'x': x, 'y': np.ones(3)})
+    with handle as batch:
+        assert np.shares_memory(batch['x'], x)
+        np.testing.assert_equal(batch['x'], 1)
+    # Too large for the slab
+    x = transport.allocate((2 ** 16,), np.float32)
+    assert isinstance(transport({'x': x}), dict)
+    transport.close()
+
+
+@pytest.mark.parametrize('backend', ['t', 'concurrent_mp'])
+def test_prefetch(backend, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    transport = SharedMemoryTransport(num_slabs=4, slab_size=2 ** 16)
+    dataset = lazy_dataset.new(list(range(20))).map(_batch).map(transport)
+    num_shared = 0
+    for i, batch in enumerate(dataset.prefetch(2, 4, backend=backend)):
+        num_shared += isinstance(batch, SharedBatch)
+        _assert_equal(example_to_device(batch), _batch(i))
+    assert num_shared > 0
+    transport.close()
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import torch
+
+from padertorch.data.statistics import (
+    MeanVariance, Maximum, Counts, collect_statistics, load_statistics
+)
+from padertorch.modules.normalization import InputNormalization
+
+
+def _examples(num_examples, offset=0):
+    rng = np.random.RandomState(offset)
+    return [
+        {
+            'example_id': str(offset + i),
+            'x': rng.randn(3, rng.randint(10, 50)) + 5,
+            'labels': [f'l{i % 7}', f'l{(i + offset) % 3}'],
+        }
+        for i in range(num_examples)
+    ]
+
+
+def _statistics(example):
+    return {
+        'x': MeanVariance(axis=-1).update(example['x']),
+        'max': Maximum().update(np.abs(example['x'])),
+        'labels': Counts().update(example['labels']),
+    }
+
+
+def _assert_expected(statistics, examples):
+    x = np.concatenate([ex['x'] for ex in examples], axis=-1)
+    assert statistics['x'].count == x.shape[-1]
+    np.testing.assert_allclose(statistics['x'].mean, x.mean(-1, keepdims=True))
+    np.testing.assert_allclose(statistics['x'].var, x.var(-1, keepdims=True))
+    assert statistics['max'].value == np.abs(x).max()
+    labels = [label for ex in examples for label in ex['labels']]
+    assert statistics['labels'].value == {
+        label: labels.count(label) for label in set(labels)}
+
+
+@pytest.mark.parametrize('num_workers', [0, 2])
+def test_collect_statistics(num_workers):
+    examples = _examples(50)
+    statistics = collect_statistics(
+        examples, _statistics, num_workers=num_workers)
+    _assert_expected(statistics, examples)
+
+
+def test_incremental_update(tmp_path):
+    state_path = tmp_path / 'state.json'
+    examples = _examples(20)
+    collect_statistics(examples, _statistics, state_path=state_path)
+    new_examples = examples + _examples(10, offset=20)
+    statistics = collect_statistics(
+        new_examples, lambda ex: {'calls': Counts().update('call'),
+                                  **_statistics(ex)},
+        state_path=state_path,
+    )
+    assert statistics['calls'].value == {'call': 10}
+    _assert_expected(statistics, new_examples)
+
+    restored, keys = load_statistics(state_path)
+    assert sorted(keys) == sorted(ex['example_id'] for ex in new_examples)
+    _assert_expected(restored, new_examples)
+
+
+def test_initialize_input_normalization():
+    examples = _examples(20)
+    statistics = collect_statistics(examples, _statistics)
+    norm = InputNormalization(
+        data_format='bct', shape=(None, 3, None), statistics_axis='bt')
+    norm.initialize_running_stats(statistics['x'])
+    x = np.concatenate([ex['x'] for ex in examples], -1)[None]
+    np.testing.assert_allclose(
+        norm.running_mean, x.mean((0, 2), keepdims=True), rtol=1e-5)
+    np.testing.assert_allclose(
+        norm.running_power, (x ** 2).mean((0, 2), keepdims=True), rtol=1e-5)
+    assert (norm.num_tracked_values == x.shape[-1]).all()
+    norm.eval()
+    y = norm(torch.Tensor(x)).detach()
+    np.testing.assert_allclose(y.mean(-1), 0., atol=1e-4)
+
+
+def test_counts_keep_value_type(tmp_path):
+    state_path = tmp_path / 'state.json'
+    examples = [{'example_id': str(i), 'label': i % 3} for i in range(6)]
+    collect_statistics(
+        examples, lambda ex: {'labels': Counts().update(ex['label'])},
+        state_path=state_path,
+    )
+    restored, _ = load_statistics(state_path)
+    assert restored['labels'].value == {0: 2, 1: 2, 2: 2}
+
+    with pytest.raises(TypeError):
+        Counts().update([('a', 1)]).to_json()
+
+
+def test_discard_state_with_other_config(tmp_path):
+    state_path = tmp_path / 'state.json'
+    examples = _examples(10)
+    collect_statistics(
+        examples, _statistics, state_path=state_path, config={'a': 1})
+    with pytest.warns(UserWarning, match='stale'):
+        statistics = collect_statistics(
+            examples, lambda ex: {'max': Maximum().update(ex['x'])},
+            state_path=state_path, config={'a': 2},
+        )
+    assert list(statistics) == ['max']
+    with pytest.raises(ValueError):
+        load_statistics(state_path, config={'a': 1})
@@ -69,3 +69,139 @@ def test_outputs_and_grads():
             tc.assert_array_almost_equal(x.grad.numpy(), x_ref.grad.numpy(), decimal=4)
             tc.assert_array_almost_equal(gamma.grad.numpy(), gamma_ref.grad.numpy(), decimal=4)
             tc.assert_array_almost_equal(beta.grad.numpy(), beta_ref.grad.numpy(), decimal=4)
+
+
+def _check_against_apply_examplewise(norm, reference_norm, x, seq_len,
+                                     time_axis):
+    from padertorch.modules.dual_path_rnn import apply_examplewise
+    reference_norm.load_state_dict(norm.state_dict())
+    x_ref = x.clone().detach()
+    x_ref.requires_grad = True
+
+    y = norm(x, seq_len)
+    y_ref = apply_examplewise(reference_norm, x_ref, seq_len, time_axis)
+    tc.assert_allclose(y.detach(), y_ref.detach(), atol=1e-5)
+
+    grad = torch.randn_like(y)
+    y.backward(grad)
+    y_ref.backward(grad)
+    tc.assert_allclose(x.grad, x_ref.grad, atol=1e-4)
+    for p, p_ref in zip(norm.parameters(), reference_norm.parameters()):
+        tc.assert_allclose(p.grad, p_ref.grad, atol=1e-4)
+
+
+def test_masked_layer_norm():
+    from padertorch.modules.normalization import MaskedLayerNorm
+    norm = MaskedLayerNorm(4)
+    with torch.no_grad():
+        norm.weight.normal_()
+        norm.bias.normal_()
+    x = torch.randn((3, 7, 4), requires_grad=True)
+    _check_against_apply_examplewise(
+        norm, torch.nn.LayerNorm(4), x, torch.tensor([7, 4, 1]), 1)
+
+
+def test_masked_group_norm():
+    from padertorch.modules.normalization import MaskedGroupNorm
+    for num_groups in [1, 2, 6]:
+        norm = MaskedGroupNorm(num_groups, 6)
+        with torch.no_grad():
+            norm.weight.normal_()
+            norm.bias.normal_()
+        x = torch.randn((3, 6, 9), requires_grad=True)
+        _check_against_apply_examplewise(
+            norm, torch.nn.GroupNorm(num_groups, 6), x,
+            torch.tensor([9, 5, 2]), 2)
+    norm = MaskedGroupNorm(1, 6)
+    x = torch.randn((3, 6, 9))
+    tc.assert_allclose(
+        norm(x, torch.tensor([9, 9, 9])).detach(), norm(x).detach(),
+        atol=1e-5,
+    )
+
+
+def test_outputs_and_grads_bcft():
+    # Statistics axes with and without the sequence axis, batch axis after
+    # the sequence axis, and an example that is only padding
+    for statistics_axis, batch_axis, sequence_axis, seq_len in [
+        ([0, 2, 3], 0, 3, [6, 4, 1]),
+        ([2, 3], 0, 3, [6, 0, 1]),
+        ([0, 2], 0, 3, [6, 4, 1]),
+        ([1, 2], 3, 1, [4, 6, 2, 1, 3, 5]),
+        ([0, 2, 3], 0, 3, None),
+        # Statistics axes without the batch and the sequence axis
+        ([1, 2], 0, 3, [6, 4, 1]),
+        ([2], 3, 1, [4, 6, 2, 1, 3, 5]),
+    ]:
+        x = torch.randn((3, 4, 5, 6), dtype=torch.float64, requires_grad=True)
+        gamma = 1 + torch.randn(
+            (1, 4, 1, 1), dtype=torch.float64, requires_grad=True)
+        beta = torch.randn((1, 4, 1, 1), dtype=torch.float64,
+                           requires_grad=True)
+        if batch_axis == 3:
+            x = torch.randn(
+                (4, 6, 5, 6), dtype=torch.float64, requires_grad=True)
+            gamma = 1 + torch.randn(
+                (4, 1, 1, 1), dtype=torch.float64, requires_grad=True)
+            beta = torch.randn(
+                (4, 1, 1, 1), dtype=torch.float64, requires_grad=True)
+        for shift in [True, False]:
+            for scale in [True, False]:
+                args = (statistics_axis, batch_axis, sequence_axis, seq_len,
+                        shift, scale, 1e-3)
+                outs = normalize(x, gamma, beta, *args)
+                outs_ref = normalize_ref(x, gamma, beta, *args)
+                for out, out_ref in zip(outs, outs_ref):
+                    tc.assert_allclose(out.detach(), out_ref.detach(),
+                                       atol=1e-10)
+                grad = torch.randn_like(outs[0])
+                grads = torch.autograd.grad(
+                    outs[0], (x, gamma, beta), grad)
+                grads_ref = torch.autograd.grad(
+                    outs_ref[0], (x, gamma, beta), grad)
+                for g, g_ref in zip(grads, grads_ref):
+                    tc.assert_allclose(g, g_ref, atol=1e-10)
+                assert torch.autograd.gradcheck(
+                    lambda x, gamma, beta: normalize(
+                        x, gamma, beta, *args)[0],
+                    (x, gamma, beta),
+                )
+
+
+def test_large_offset():
+    # One pass over the data must not lose the variance to cancellation
+    x = 1e4 + torch.randn((4, 3, 100))
+    seq_len = [100, 70, 30, 5]
+    y, mean, _, _ = normalize(x, None, None, [0, 2], 0, 2, seq_len,
+                              True, True, 1e-5)
+    x64 = x.double()
+    _, mean_ref, _, _ = normalize_ref(x64, None, None, [0, 2], 0, 2, seq_len,
+                                      True, False, 1e-5)
+    mask = compute_mask(x64, seq_len, 0, 2)
+    var_ref = (((x64 - mean_ref) * mask) ** 2).sum(
+        (0, 2), keepdim=True) / mask.sum((0, 2), keepdim=True)
+    y_ref = (x64 - mean_ref) / torch.sqrt(var_ref + 1e-5) * mask
+    tc.assert_allclose(y.double(), y_ref, atol=1e-3)
+
+
+def test_statistics_axis_without_sequence_axis():
+    from padertorch.modules.normalization import (
+        Normalization, mask_and_compute_stats
+    )
+    norm = Normalization(
+        data_format='btc', shape=(None, None, 4), statistics_axis='c',
+        independent_axis=None,
+    )
+    x = torch.randn((2, 5, 4), dtype=torch.float64, requires_grad=True)
+    seq_len = [5, 3]
+    y = norm(x, seq_len)
+    _, mask, mean, power, _ = mask_and_compute_stats(
+        x, seq_len, norm.statistics_axis, norm.batch_axis, norm.sequence_axis)
+    y_ref = (x - mean) / torch.sqrt(power - mean ** 2 + norm.eps) * mask
+    tc.assert_allclose(y.detach(), y_ref.detach(), atol=1e-10)
+    grad = torch.randn_like(y)
+    tc.assert_allclose(
+        torch.autograd.grad(y, x, grad)[0],
+        torch.autograd.grad(y_ref, x, grad)[0],
+        atol=1e-10,
+    )
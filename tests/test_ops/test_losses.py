@@ -1,3 +1,4 @@
+import functools
 import unittest
 
 import numpy as np
@@ -150,6 +151,225 @@ class TestPermutationInvariantTrainingLoss(unittest.TestCase):
         self.check_toy_example([[[0], [1]]], [[[0], [1]]], 0)
 
 
+class TestBatchedPermutationInvariantTrainingLoss(unittest.TestCase):
+    def check_against_pit_loss(self, loss_fn, batched_loss_fn, sources):
+        rng = np.random.RandomState(sources)
+        target = torch.tensor(rng.randn(8, sources, 3, 20))
+        # Shuffle the estimates of each example
+        estimate = torch.stack([
+            t[rng.permutation(sources)] + 0.1 * torch.tensor(rng.randn(*t.shape))
+            for t in target
+        ])
+        estimate.requires_grad_(True)
+        loss, permutation = pt.ops.losses.batched_pit_loss(
+            estimate, target, batched_loss_fn, return_permutation=True)
+        loss.sum().backward()
+        grad, estimate.grad = estimate.grad, None
+
+        for b in range(len(target)):
+            reference_loss, reference_permutation = pt.ops.losses.pit_loss(
+                estimate[b], target[b], 0, loss_fn, return_permutation=True)
+            np.testing.assert_allclose(
+                loss[b].detach(), reference_loss.detach(), rtol=1e-10)
+            np.testing.assert_equal(
+                permutation[b].numpy(), reference_permutation)
+            reference_loss.backward()
+        np.testing.assert_allclose(grad, estimate.grad, rtol=1e-10)
+
+    def test_mse(self):
+        for sources in range(1, 6):
+            self.check_against_pit_loss(
+                torch.nn.functional.mse_loss,
+                functools.partial(pt.ops.losses.mse_loss, reduction=None),
+                sources,
+            )
+
+    def test_si_sdr(self):
+        def si_sdr_loss(estimate, target):
+            return pt.ops.losses.si_sdr_loss(
+                estimate.flatten(-2), target.flatten(-2))
+
+        for sources in range(2, 5):
+            self.check_against_pit_loss(
+                si_sdr_loss,
+                functools.partial(pt.ops.losses.si_sdr_loss, reduction=None),
+                sources,
+            )
+
+
+class TestComputePairwiseLosses(unittest.TestCase):
+    def check_against_loop(self, loss_fn, estimate, target, axis):
+        from padertorch.ops.losses.source_separation import (
+            compute_pairwise_losses, PAIRWISE_LOSS_FN_MAP
+        )
+        assert loss_fn in PAIRWISE_LOSS_FN_MAP, loss_fn
+        estimate = torch.tensor(estimate, requires_grad=True)
+        target = torch.tensor(target)
+
+        loss = compute_pairwise_losses(estimate, target, axis, loss_fn)
+        loss.backward(torch.arange(loss.numel()).reshape(loss.shape))
+        grad, estimate.grad = estimate.grad, None
+
+        # The lambda is not in the map and falls back to the loop
+        reference = compute_pairwise_losses(
+            estimate, target, axis, lambda e, t: loss_fn(e, t))
+        reference.backward(torch.arange(loss.numel()).reshape(loss.shape))
+
+        np.testing.assert_allclose(
+            loss.detach(), reference.detach(), rtol=1e-10)
+        np.testing.assert_allclose(grad, estimate.grad, rtol=1e-8)
+
+    def test_signal_losses(self):
+        rng = np.random.RandomState(0)
+        for loss_fn in [
+            torch.nn.functional.mse_loss,
+            pt.ops.losses.mse_loss,
+            pt.ops.losses.log_mse_loss,
+            pt.ops.losses.log1p_mse_loss,
+            pt.ops.losses.sdr_loss,
+            pt.ops.losses.si_sdr_loss,
+        ]:
+            for shape, axis in [
+                ((3, 20), 0),
+                ((4, 3, 20), 1),
+                ((2, 5, 20), -2),
+                ((2, 3, 2, 20), 0),
+            ]:
+                with self.subTest(loss_fn=loss_fn.__name__, shape=shape):
+                    self.check_against_loop(
+                        loss_fn, rng.randn(*shape), rng.randn(*shape), axis)
+
+    def test_cross_entropy(self):
+        from padertorch.ops.losses.source_separation import (
+            compute_pairwise_losses
+        )
+        rng = np.random.RandomState(1)
+        N, K, T = 4, 3, 6
+        estimate = torch.tensor(rng.randn(N, K, T))
+        target = torch.tensor(rng.randint(K, size=(N, T)))
+        loss = compute_pairwise_losses(
+            estimate, target, 1, torch.nn.functional.cross_entropy)
+        np.testing.assert_allclose(
+            pt.ops.losses.source_separation.pit_loss_from_loss_matrix(
+                loss, reduction='sum'),
+            pt.ops.losses.pit_loss(
+                estimate, target, 1, torch.nn.functional.cross_entropy),
+            rtol=1e-10,
+        )
+
+
+class TestBatchedAssignment(unittest.TestCase):
+    def check_against_scipy(self, cost, algorithm):
+        import scipy.optimize
+        from padertorch.ops.losses.source_separation import (
+            pit_loss_from_loss_matrix
+        )
+        loss, permutation = pit_loss_from_loss_matrix(
+            torch.tensor(cost), reduction='sum', algorithm=algorithm,
+            return_permutation=True,
+        )
+        assert permutation.shape == cost.shape[:-1], permutation.shape
+        for b in range(len(cost)):
+            row_ind, col_ind = scipy.optimize.linear_sum_assignment(cost[b])
+            np.testing.assert_equal(
+                np.sort(permutation[b].numpy()), np.arange(cost.shape[-1]))
+            np.testing.assert_allclose(
+                cost[b, row_ind, permutation[b].numpy()].sum(),
+                cost[b, row_ind, col_ind].sum(),
+            )
+            np.testing.assert_allclose(loss[b], cost[b, row_ind, col_ind].sum())
+
+    def test_random(self):
+        rng = np.random.RandomState(0)
+        for sources in range(1, 13):
+            cost = rng.randn(16, sources, sources)
+            algorithms = ['optimal', 'hungarian', 'scipy']
+            if sources <= 6:
+                algorithms.append('exhaustive')
+            for algorithm in algorithms:
+                with self.subTest(sources=sources, algorithm=algorithm):
+                    self.check_against_scipy(cost, algorithm)
+
+    def test_ties(self):
+        rng = np.random.RandomState(1)
+        for sources in [3, 5, 8]:
+            cost = rng.randint(3, size=(16, sources, sources)).astype(float)
+            for algorithm in ['optimal', 'hungarian']:
+                with self.subTest(sources=sources, algorithm=algorithm):
+                    self.check_against_scipy(cost, algorithm)
+
+    def test_gradient(self):
+        from padertorch.ops.losses.source_separation import (
+            pit_loss_from_loss_matrix
+        )
+        cost = torch.tensor(np.random.RandomState(2).randn(4, 7, 7),
+                            requires_grad=True)
+        pit_loss_from_loss_matrix(
+            cost, reduction='sum', algorithm='hungarian').sum().backward()
+        # One selected entry per row and column
+        np.testing.assert_equal(cost.grad.sum(dim=-1).numpy(), 1)
+        np.testing.assert_equal(cost.grad.sum(dim=-2).numpy(), 1)
+
+
+class TestSequenceLengths(unittest.TestCase):
+    def check_against_slices(self, loss_fn, **kwargs):
+        rng = np.random.RandomState(0)
+        B, K, T = 4, 3, 50
+        sequence_lengths = torch.tensor([50, 31, 17, 2])
+        estimate = torch.tensor(rng.randn(B, K, T), requires_grad=True)
+        target = torch.tensor(rng.randn(B, K, T))
+
+        loss = loss_fn(estimate, target, reduction=None,
+                       sequence_lengths=sequence_lengths, **kwargs)
+        assert loss.shape == (B, K), loss.shape
+        loss.sum().backward()
+        grad, estimate.grad = estimate.grad, None
+
+        for b, seq_len in enumerate(sequence_lengths):
+            reference = loss_fn(
+                estimate[b, :, :seq_len], target[b, :, :seq_len],
+                reduction=None, **kwargs
+            )
+            np.testing.assert_allclose(
+                loss[b].detach(), reference.detach(), rtol=1e-10)
+            reference.sum().backward()
+        np.testing.assert_allclose(grad, estimate.grad, rtol=1e-10, atol=1e-15)
+        np.testing.assert_equal(grad[3, :, 2:].numpy(), 0)
+
+    def test_losses(self):
+        for loss_fn, kwargs in [
+            (pt.ops.losses.mse_loss, {}),
+            (pt.ops.losses.log_mse_loss, {}),
+            (pt.ops.losses.log_mse_loss, {'soft_sdr_max': 20}),
+            (pt.ops.losses.log1p_mse_loss, {}),
+            (pt.ops.losses.sdr_loss, {}),
+            (pt.ops.losses.sdr_loss, {'soft_sdr_max': 20}),
+            (pt.ops.losses.si_sdr_loss, {}),
+            (pt.ops.losses.si_sdr_loss, {'offset_invariant': True}),
+            (pt.ops.losses.si_sdr_loss, {'grad_stop': True}),
+        ]:
+            with self.subTest(loss_fn=loss_fn.__name__, **kwargs):
+                self.check_against_slices(loss_fn, **kwargs)
+
+    def test_batched_pit_loss(self):
+        rng = np.random.RandomState(1)
+        B, K, T = 3, 2, 40
+        sequence_lengths = torch.tensor([40, 25, 10])
+        estimate = torch.tensor(rng.randn(B, K, T))
+        target = torch.tensor(rng.randn(B, K, T))
+        loss = pt.ops.losses.batched_pit_loss(
+            estimate, target, functools.partial(
+                pt.ops.losses.si_sdr_loss, reduction=None,
+                sequence_lengths=sequence_lengths,
+            ),
+        )
+        for b, seq_len in enumerate(sequence_lengths):
+            np.testing.assert_allclose(loss[b], pt.ops.losses.pit_loss(
+                estimate[b, :, :seq_len], target[b, :, :seq_len], 0,
+                pt.ops.losses.si_sdr_loss,
+            ), rtol=1e-10)
+
+
 class TestKLLoss(unittest.TestCase):
     def test_against_multivariate_multivariate(self):
         B = 500
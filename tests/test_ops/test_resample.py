@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import torch
+
+import padertorch as pt
+
+
+def _tones(num_samples, sample_rate, frequencies, phase=0.):
+    t = np.arange(num_samples) / sample_rate
+    return sum(
+        np.sin(2 * np.pi * f * t + phase * i)
+        for i, f in enumerate(frequencies)
+    ) / len(frequencies)
+
+
+def _snr(estimate, reference):
+    return 10 * np.log10(
+        np.sum(reference ** 2) / np.sum((estimate - reference) ** 2))
+
+
+@pytest.mark.parametrize('orig,target', [
+    (44100, 16000), (16000, 8000), (8000, 16000), (22050, 16000),
+])
+@pytest.mark.parametrize('relative_frequency', [0.05, 0.3, 0.6, 0.75])
+def test_quality_parity_with_samplerate(orig, target, relative_frequency):
+    samplerate = pytest.importorskip('samplerate')
+    frequency = relative_frequency * min(orig, target) / 2
+    x = _tones(orig, orig, [frequency])
+    expected = _tones(target, target, [frequency])
+    border = target // 50  # Ignore the filter transients at the borders
+
+    current = samplerate.resample(x, target / orig, 'sinc_fastest')
+    y = pt.ops.resample(torch.from_numpy(x), orig, target).numpy()
+    assert y.shape == expected.shape
+    snr = _snr(y[border:-border], expected[border:-border])
+    snr_current = _snr(
+        current[border:-border], expected[border:len(current) - border])
+    if relative_frequency <= 0.6:
+        assert snr > 90, (snr, snr_current)
+    else:
+        # Close to the cutoff, the current path is worse
+        assert snr > snr_current, (snr, snr_current)
+
+
+def test_padded_batch_equals_single_examples():
+    orig, target = 44100, 16000
+    lengths = [30000, 44100, 12345]
+    signals = [
+        _tones(n, orig, [440 * (i + 1), 3000], phase=i)
+        for i, n in enumerate(lengths)
+    ]
+    batch = np.zeros((3, 2, max(lengths)))
+    for i, s in enumerate(signals):
+        batch[i, :, :len(s)] = s
+    y = pt.ops.resample(
+        torch.from_numpy(batch), orig, target, sequence_lengths=lengths)
+    new_lengths = pt.ops.get_resampled_lengths(lengths, orig, target)
+    for i, s in enumerate(signals):
+        single = pt.ops.resample(torch.from_numpy(s), orig, target)
+        assert single.shape[-1] == new_lengths[i]
+        np.testing.assert_allclose(y[i, 0, :new_lengths[i]], single, atol=1e-10)
+        np.testing.assert_allclose(y[i, 1, :new_lengths[i]], single, atol=1e-10)
+        assert torch.all(y[i, :, new_lengths[i]:] == 0)
+
+
+def test_kernel_cache_and_dtype():
+    x = torch.randn(2, 1000)
+    y = pt.ops.resample(x, 48000, 16000)
+    assert y.dtype == torch.float32 and y.shape == (2, 334)
+    from padertorch.ops._resample import get_resample_kernel
+    assert get_resample_kernel(3, 1) is get_resample_kernel(3, 1)
+    assert pt.ops.resample(x, 16000, 16000) is x
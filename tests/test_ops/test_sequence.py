@@ -63,3 +63,191 @@ class TestPackModule(unittest.TestCase):
         actual = pts.ops.pack_padded_sequence(self.padded, self.lengths)
         assert isinstance(actual, type(self.packed))
         np.testing.assert_equal(actual.data.numpy(), self.packed.data.numpy())
+
+
+class TestIndexing(unittest.TestCase):
+    def setUp(self):
+        self.sequence_lengths = [7, 3, 10, 1]
+        self.x = torch.randn(4, 10, 3)
+        self.mask = pts.ops.length_mask(self.sequence_lengths, 10)
+        self.x = torch.where(self.mask[..., None], self.x, torch.zeros(()))
+
+    def test_reverse_sequence(self):
+        actual = pts.ops.reverse_sequence(self.x, self.sequence_lengths)
+        for x, x_hat, l in zip(self.x, actual, self.sequence_lengths):
+            np.testing.assert_equal(x_hat[:l].numpy(), x[:l].flip(0).numpy())
+            np.testing.assert_equal(x_hat[l:].numpy(), 0)
+        np.testing.assert_equal(
+            pts.ops.reverse_sequence(actual, self.sequence_lengths).numpy(),
+            self.x.numpy(),
+        )
+
+    def test_pack_batch(self):
+        actual = pts.ops.pack_batch(self.x, self.sequence_lengths)
+        expected = torch.cat(
+            [x[:l] for x, l in zip(self.x, self.sequence_lengths)])
+        np.testing.assert_equal(actual.numpy(), expected.numpy())
+        np.testing.assert_equal(
+            pts.ops.unpack_batch(
+                actual, self.sequence_lengths,
+                index=pts.ops.pack_index(self.sequence_lengths, 10),
+            ).numpy(),
+            self.x.numpy(),
+        )
+
+    def test_unpack_batch_gradient(self):
+        packed = torch.randn(sum(self.sequence_lengths), 3, requires_grad=True)
+        pts.ops.unpack_batch(packed, self.sequence_lengths).sum().backward()
+        np.testing.assert_equal(packed.grad.numpy(), 1)
+
+    def test_unpad_sequence_tensor_lengths(self):
+        padded = self.x.transpose(0, 1)
+        actual = pts.ops.unpad_sequence(
+            padded, torch.tensor(self.sequence_lengths))
+        for x, x_hat, l in zip(self.x, actual, self.sequence_lengths):
+            np.testing.assert_equal(x_hat.numpy(), x[:l].numpy())
+
+    def test_pack_sequence_include_channel(self):
+        shapes = [(2, 4, 5), (3, 7, 5), (1, 4, 5), (2, 1, 5)]
+        list_of_tensors = [torch.randn(shape) for shape in shapes]
+        actual = pts.ops.pack_sequence_include_channel(list_of_tensors)
+        expected = torch.nn.utils.rnn.pack_sequence(
+            [channel for entry in list_of_tensors for channel in entry],
+            enforce_sorted=False,
+        )
+        np.testing.assert_equal(actual.data.numpy(), expected.data.numpy())
+        np.testing.assert_equal(
+            actual.batch_sizes.numpy(), expected.batch_sizes.numpy())
+        np.testing.assert_equal(
+            actual.sorted_indices.numpy(), expected.sorted_indices.numpy())
+
+        unpacked = pts.ops.unpack_sequence_include_channel_like(
+            actual, like=list_of_tensors)
+        for t, t_hat in zip(list_of_tensors, unpacked):
+            np.testing.assert_equal(t_hat.numpy(), t.numpy())
+
+
+class TestJaggedTensor(unittest.TestCase):
+    def setUp(self):
+        self.sequence_lengths = [4, 6, 1, 6]
+        self.sequence = [torch.randn(l, 3, 2) for l in self.sequence_lengths]
+        self.jagged = pts.ops.JaggedTensor.from_list(self.sequence)
+
+    def assert_sequence_equal(self, actual):
+        assert len(actual) == len(self.sequence)
+        for actual_, reference_ in zip(actual, self.sequence):
+            np.testing.assert_equal(actual_.numpy(), reference_.numpy())
+
+    def test_list(self):
+        self.assertEqual(self.jagged.sequence_lengths, self.sequence_lengths)
+        actual = self.jagged.to_list()
+        self.assert_sequence_equal(actual)
+        # Views, no copies
+        assert actual[1].data_ptr() == (
+            self.jagged.values.data_ptr()
+            + 4 * self.jagged.values[0].numel() * 4
+        )
+
+    def test_padded(self):
+        padded = self.jagged.to_padded()
+        expected = pts.ops.pad_sequence(self.sequence, batch_first=True)
+        np.testing.assert_equal(padded.numpy(), expected.numpy())
+        np.testing.assert_equal(
+            self.jagged.to_padded(batch_first=False).numpy(),
+            pts.ops.pad_sequence(self.sequence).numpy(),
+        )
+        self.assert_sequence_equal(pts.ops.JaggedTensor.from_padded(
+            padded, torch.tensor(self.sequence_lengths)).to_list())
+        self.assert_sequence_equal(pts.ops.JaggedTensor.from_padded(
+            expected.transpose(0, 1), self.sequence_lengths, batch_first=False
+        ).to_list())
+        np.testing.assert_equal(
+            self.jagged.mask().numpy(),
+            pts.ops.length_mask(self.sequence_lengths).numpy(),
+        )
+
+    def test_padded_without_padding_does_not_copy(self):
+        padded = torch.randn(3, 5, 2)
+        jagged = pts.ops.JaggedTensor.from_padded(padded, [5, 5, 5])
+        assert jagged.values.data_ptr() == padded.data_ptr()
+        assert jagged.to_padded().data_ptr() == padded.data_ptr()
+
+    def test_packed(self):
+        packed = self.jagged.to_packed()
+        expected = torch.nn.utils.rnn.pack_sequence(
+            self.sequence, enforce_sorted=False)
+        np.testing.assert_equal(packed.data.numpy(), expected.data.numpy())
+        np.testing.assert_equal(
+            packed.batch_sizes.numpy(), expected.batch_sizes.numpy())
+        np.testing.assert_equal(
+            packed.unsorted_indices.numpy(),
+            expected.unsorted_indices.numpy(),
+        )
+        self.assert_sequence_equal(
+            pts.ops.JaggedTensor.from_packed(expected).to_list())
+
+    def test_elementwise(self):
+        actual = pts.ops.sequence.exp(self.jagged)
+        assert isinstance(actual, pts.ops.JaggedTensor)
+        for actual_, reference_ in zip(actual.to_list(), self.sequence):
+            np.testing.assert_allclose(
+                actual_.numpy(), reference_.exp().numpy(), rtol=1e-6)
+
+    def test_reduction(self):
+        for function in [torch.sum, torch.mean, torch.amax, torch.std]:
+            for axis in [1, (1, 2), (1, 3), -1, (0, 1, 2, 3)]:
+                actual = pts.ops.sequence.sequence_reduction(
+                    function, self.jagged, axis=axis)
+                if 0 in pts.utils.to_list(axis):
+                    expected = function(self.jagged.values)
+                elif 1 in pts.utils.to_list(axis):
+                    dim = [a - 1 for a in pts.utils.to_list(axis)]
+                    expected = torch.stack([
+                        function(s, dim=dim) for s in self.sequence])
+                else:
+                    actual = actual.to_padded()
+                    expected = function(
+                        self.jagged.to_padded(), dim=axis)
+                np.testing.assert_allclose(
+                    actual.numpy(), expected.numpy(), rtol=1e-5, atol=1e-6,
+                    err_msg=f'{function} {axis}',
+                )
+
+    def test_segment_reduce_over_time_and_features(self):
+        from padertorch.ops.sequence.reduction import _SEGMENT_REDUCE
+
+        def reduce(function, x, dim):
+            for d in sorted(dim, reverse=True):
+                x = function(x, dim=d)
+            return x
+
+        for function in _SEGMENT_REDUCE:
+            for axis in [(1, 2), (1, 3), (1, 2, 3), -1, (0, 1, 2, 3)]:
+                actual = pts.ops.sequence.sequence_reduction(
+                    function, self.jagged, axis=axis)
+                axis = [a % 4 for a in pts.utils.to_list(axis)]
+                if 0 in axis:
+                    expected = reduce(function, self.jagged.values, [0, 1, 2])
+                elif 1 in axis:
+                    expected = torch.stack([
+                        reduce(function, s, [a - 1 for a in axis])
+                        for s in self.sequence
+                    ])
+                else:
+                    actual = actual.values
+                    expected = reduce(
+                        function, self.jagged.values, [a - 1 for a in axis])
+                np.testing.assert_allclose(
+                    actual.numpy(), expected.numpy(), rtol=1e-5, atol=1e-6,
+                    err_msg=f'{function} {axis}',
+                )
+
+    def test_reduction_gradient(self):
+        values = self.jagged.values.clone().requires_grad_()
+        jagged = self.jagged.with_values(values)
+        pts.ops.sequence.sequence_reduction(
+            torch.mean, jagged, axis=(1, 2, 3)).sum().backward()
+        expected = torch.cat([
+            torch.full_like(s, 1 / s.numel()) for s in self.sequence])
+        np.testing.assert_allclose(
+            values.grad.numpy(), expected.numpy(), rtol=1e-6)
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 import numpy as np
@@ -16,6 +17,7 @@ class TestSTFTMethods(unittest.TestCase):
     window = 'blackman'
     fading = 'full'
     complex = 'concat'
+    backend = 'conv'
 
     def setUp(self):
         path = get_file_path("sample.wav")
@@ -26,7 +28,7 @@ class TestSTFTMethods(unittest.TestCase):
         self.stft = STFT(size=self.size, shift=self.shift,
                          window_length=self.window_length, fading=self.fading,
                          complex_representation=self.complex,
-                         window=self.window)
+                         window=self.window, backend=self.backend)
         self.fbins = self.stft.size // 2 + 1
         if self.complex == 'concat':
             self.num_features = self.fbins * 2
@@ -163,3 +165,129 @@ class TestSmallerSTFTMethods(TestSTFTMethods):
         x = torch.rand(size=[1021])
         X = stft(x)
         tc.assert_equal(X.shape, (53, self.fbins * 2))
+
+
+class TestFFTSTFTMethods(TestSTFTMethods):
+    backend = 'fft'
+
+
+class TestFFTSTFTComplexMethods(TestSTFTComplexMethods):
+    backend = 'fft'
+
+
+class TestFFTSmallerSTFTMethods(TestSmallerSTFTMethods):
+    backend = 'fft'
+
+
+def test_fft_backend_equals_conv_backend():
+    x = torch.randn(3, 2, 1237, dtype=torch.float64, requires_grad=True)
+    for size, shift, window_length in [(512, 128, None), (256, 100, 200)]:
+        for fading in ['full', 'half', False]:
+            for pad in [True, False]:
+                kwargs = dict(
+                    window_length=window_length, fading=fading, pad=pad,
+                    complex_representation='stacked',
+                )
+                X_conv = STFT(size, shift, backend='conv', **kwargs)(x)
+                X_fft = STFT(size, shift, backend='fft', **kwargs)(x)
+                tc.assert_equal(X_fft.shape, X_conv.shape)
+                tc.assert_almost_equal(
+                    X_fft.detach().numpy(), X_conv.detach().numpy())
+                grad_conv, = torch.autograd.grad(X_conv.square().sum(), x)
+                grad_fft, = torch.autograd.grad(X_fft.square().sum(), x)
+                tc.assert_almost_equal(grad_fft.numpy(), grad_conv.numpy())
+
+
+def test_kernels_are_shared_and_cached():
+    stft_1 = STFT(512, 128, window='hann')
+    stft_2 = STFT(512, 128, window='hann')
+    assert stft_1.stft_kernel is stft_2.stft_kernel
+    assert stft_1.istft_kernel_real is stft_2.istft_kernel_real
+    assert STFT(512, 64, window='hann').istft_kernel_real is not \
+        stft_1.istft_kernel_real
+
+    x = torch.randn(2, 1000)
+    X = stft_1(x)
+    kernel = stft_1._get_kernel('stft_kernel', x)
+    assert kernel.dtype == torch.float32
+    assert stft_1._get_kernel('stft_kernel', x) is kernel
+    stft_1.inverse(X)
+    assert len(stft_1._device_kernels) == 3
+
+    # The kernels are not pickled, e.g. when sent to a worker
+    stft_3 = pickle.loads(pickle.dumps(stft_1))
+    assert stft_3._device_kernels == {}
+    tc.assert_equal(stft_3(x).numpy(), X.numpy())
+
+
+
+def test_fft_inverse_equals_numpy_istft():
+    X = torch.randn(3, 2, 40, 257, 2, dtype=torch.float64, requires_grad=True)
+    X_numpy = X.detach().numpy()
+    X_numpy = X_numpy[..., 0] + 1j * X_numpy[..., 1]
+    for shift, window_length in [(128, None), (100, 400), (20, 40)]:
+        for fading in ['full', 'half', False]:
+            kwargs = dict(
+                window_length=window_length, fading=fading,
+                complex_representation='stacked',
+            )
+            x_conv = STFT(512, shift, backend='conv', **kwargs).inverse(X)
+            x_fft = STFT(512, shift, backend='fft', **kwargs).inverse(X)
+            x_numpy = istft(
+                X_numpy, 512, shift, window_length=window_length,
+                fading=fading,
+            )
+            tc.assert_equal(x_fft.shape, x_numpy.shape)
+            tc.assert_allclose(x_fft.detach().numpy(), x_numpy, atol=1e-12)
+            grad_conv, = torch.autograd.grad(x_conv.square().sum(), X)
+            grad_fft, = torch.autograd.grad(x_fft.square().sum(), X)
+            tc.assert_almost_equal(grad_fft.numpy(), grad_conv.numpy())
+
+
+def test_fft_backend_reconstruction():
+    x = torch.randn(2, 5000)
+    stft = STFT(512, 128, backend='fft', complex_representation='concat')
+    x_hat = stft.inverse(stft(x))[..., :x.shape[-1]]
+    tc.assert_allclose(x_hat.numpy(), x.numpy(), atol=1e-5)
+
+
+def test_streaming_stft_equals_offline():
+    rng = np.random.RandomState(0)
+    x = torch.randn(3, 2, 1500)
+    for size, shift, window_length in [(512, 128, None), (256, 60, 200)]:
+        for fading in ['full', 'half', False]:
+            for pad in [True, False]:
+                for complex_representation in ['complex', 'stacked']:
+                    stft = STFT(
+                        size, shift, window_length=window_length,
+                        fading=fading, pad=pad, backend='fft',
+                        complex_representation=complex_representation,
+                    )
+                    frame_axis = -3 if complex_representation == 'stacked' else -2
+                    streaming = stft.streaming()
+                    # Random block sizes, including empty blocks
+                    splits = np.cumsum(rng.randint(0, 2 * shift, size=50))
+                    splits = splits[splits < x.shape[-1]]
+                    X = torch.cat([
+                        streaming(block)
+                        for block in np.split(x, splits, axis=-1)
+                    ] + [streaming.flush()], dim=frame_axis)
+                    X_offline = stft(x)
+                    tc.assert_equal(X.shape, X_offline.shape)
+                    assert torch.equal(X, X_offline)
+
+                    splits = np.cumsum(rng.randint(0, 4, size=100))
+                    splits = splits[splits < X.shape[frame_axis]]
+                    x_hat = torch.cat([
+                        streaming.inverse(frames)
+                        for frames in np.split(X, splits, axis=frame_axis)
+                    ] + [streaming.flush_inverse()], dim=-1)
+                    x_offline = stft.inverse(X)
+                    tc.assert_equal(x_hat.shape, x_offline.shape)
+                    assert torch.equal(x_hat, x_offline)
+
+                    # The state is reset after the flush
+                    assert torch.equal(
+                        streaming(x[..., :shift * 4]),
+                        X.narrow(frame_axis, 0, streaming._num_consumed // shift),
+                    )